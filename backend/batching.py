@@ -0,0 +1,80 @@
+"""Micro-batching of concurrent single-patient predictions"""
+
+import asyncio
+import logging
+from typing import Any, Callable, List, Optional, Sequence, Set, Tuple
+
+logger = logging.getLogger("cvd_api")
+
+
+class MicroBatcher:
+    """Coalesce concurrent ``submit`` calls into one call of ``batch_fn``.
+
+    Items are collected until ``max_batch_size`` is reached or ``max_wait_ms``
+    has passed since the first item of the batch arrived, whichever comes
+    first. ``batch_fn`` receives the list of items and must return one result
+    per item, in the same order; each caller gets back its own result.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Any]], Sequence[Any]],
+                 max_batch_size: int = 64, max_wait_ms: float = 2.0, executor=None):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max(max_wait_ms, 0.0) / 1000.0
+        self.executor = executor
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def pending(self) -> int:
+        """Items waiting for the current batch to be flushed."""
+        return len(self._pending)
+
+    async def submit(self, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.ensure_future(self._run(batch))
+        # keep a reference so the task is not garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]):
+        items = [item for item, _ in batch]
+        try:
+            loop = asyncio.get_running_loop()
+            results = await loop.run_in_executor(self.executor, self.batch_fn, items)
+            if len(results) != len(items):
+                raise RuntimeError(f"batch_fn returned {len(results)} results for {len(items)} items")
+        except Exception as e:
+            logger.error(f"Coalesced batch of {len(items)} failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            # the caller may have gone away (client disconnect -> cancelled)
+            if not future.done():
+                future.set_result(result)
+
+    async def close(self):
+        """Flush anything still queued and wait for in-flight batches."""
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,6 @@
+"""Reproducible inference benchmarks for the CVD API
+
+Run from backend/ with ``python -m benchmarks run`` (see ``--help``); results
+are written as JSON and ``python -m benchmarks compare`` fails when
+throughput regresses against a saved baseline.
+"""
@@ -0,0 +1,90 @@
+"""CLI: ``python -m benchmarks run ...`` and ``python -m benchmarks compare BASELINE CURRENT``"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+from benchmarks.data import BACKEND_DIR  # noqa: E402  (puts backend/ on sys.path)
+from benchmarks.report import compare, format_comparison, write_results  # noqa: E402
+
+
+def _ints(text: str):
+    return [int(x) for x in text.split(',') if x.strip()]
+
+
+def cmd_run(args) -> int:
+    results = []
+    if not args.skip_inference:
+        from benchmarks.inference import bench_inference
+        results += bench_inference(args.models_dir, args.sizes, single_iterations=args.single_iterations,
+                                   min_seconds=args.min_seconds)
+    if args.cascade:
+        from benchmarks.cascade import bench_cascade
+        results += bench_cascade(args.models_dir, single_iterations=args.single_iterations,
+                                 min_seconds=args.min_seconds)
+    if args.url:
+        from benchmarks.http_load import bench_http
+        results += bench_http(args.url, args.concurrency, args.requests, args.batch_sizes, args.stream_rows)
+    settings = {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items() if k != 'func'}
+    path = write_results(args.output, results, settings)
+    print(f"Wrote {len(results)} results to {path}")
+    if args.baseline:
+        return cmd_compare(argparse.Namespace(baseline=args.baseline, current=path, threshold=args.threshold))
+    return 0
+
+
+def cmd_compare(args) -> int:
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    rows = compare(baseline, current, args.threshold)
+    print(format_comparison(rows))
+    regressions = [r for r in rows if r['regressed']]
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) lost more than {args.threshold:.0%} throughput")
+        return 1
+    print(f"No throughput regressions beyond {args.threshold:.0%} ({len(rows)} benchmarks compared)")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help='run the benchmarks and write a JSON result file')
+    run.add_argument('--models-dir', type=Path, default=BACKEND_DIR / 'models')
+    run.add_argument('--sizes', type=_ints, default=[1, 100, 10000, 100000],
+                     help='batch sizes in rows for the in-process suite (up to 1000000)')
+    run.add_argument('--single-iterations', type=int, default=1000,
+                     help='single-row calls per stage for latency percentiles (0 skips)')
+    run.add_argument('--min-seconds', type=float, default=0.5, help='minimum timing window per batch benchmark')
+    run.add_argument('--skip-inference', action='store_true', help='only run the HTTP suite')
+    run.add_argument('--cascade', action='store_true',
+                     help='also compare cascade mode with the full ensemble on heart.csv')
+    run.add_argument('--url', help='base URL of a running API, e.g. http://localhost:8000, enables the HTTP suite')
+    run.add_argument('--concurrency', type=_ints, default=[1, 8, 32], help='concurrent HTTP clients')
+    run.add_argument('--requests', type=int, default=500, help='requests per /predict load level')
+    run.add_argument('--batch-sizes', type=_ints, default=[10, 100, 1000], help='/batch-predict sizes')
+    run.add_argument('--stream-rows', type=_ints, default=[10000], help='/upload-csv/stream file sizes')
+    run.add_argument('--output', type=Path, default=BACKEND_DIR / 'benchmarks' / 'results' / 'latest.json')
+    run.add_argument('--baseline', type=Path, help='compare against this result file after the run')
+    run.add_argument('--threshold', type=float, default=0.10, help='allowed throughput drop, as a fraction')
+    run.set_defaults(func=cmd_run)
+
+    cmp = sub.add_parser('compare', help='compare two result files; exits 1 on a throughput regression')
+    cmp.add_argument('baseline', type=Path)
+    cmp.add_argument('current', type=Path)
+    cmp.add_argument('--threshold', type=float, default=0.10, help='allowed throughput drop, as a fraction')
+    cmp.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""Per-call allocation counts for the benchmark suite: NumPy array buffers and the tracemalloc peak"""
+
+import ctypes
+import tracemalloc
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+try:
+    from numpy._core import _multiarray_umath
+except ImportError:  # NumPy 1.x
+    from numpy.core import _multiarray_umath
+
+# PyDataMem_SetHandler / PyDataMem_GetHandler in NumPy's C-API table (NEP 49, fixed since 1.22)
+_SET_HANDLER, _GET_HANDLER = 304, 305
+
+_MALLOC = ctypes.CFUNCTYPE(ctypes.c_void_p, ctypes.c_void_p, ctypes.c_size_t)
+_CALLOC = ctypes.CFUNCTYPE(ctypes.c_void_p, ctypes.c_void_p, ctypes.c_size_t, ctypes.c_size_t)
+_REALLOC = ctypes.CFUNCTYPE(ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_size_t)
+_FREE = ctypes.CFUNCTYPE(None, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_size_t)
+
+
+class _Allocator(ctypes.Structure):
+    _fields_ = [('ctx', ctypes.c_void_p), ('malloc', _MALLOC), ('calloc', _CALLOC),
+                ('realloc', _REALLOC), ('free', _FREE)]
+
+
+class _Handler(ctypes.Structure):
+    _fields_ = [('name', ctypes.c_char * 127), ('version', ctypes.c_uint8), ('allocator', _Allocator)]
+
+
+class ArrayAllocationCounter:
+    """Counts the NumPy data buffers allocated in this thread while entered.
+
+    Installs a NumPy memory handler that forwards to the default one and
+    counts each malloc / calloc / realloc, temporaries inside ufuncs and
+    0-d arrays for scalars included. Frees go straight to the default
+    handler's C function, so arrays that outlive the count never call back
+    into Python. NumPy keeps the handler per context, so other threads'
+    allocations are not counted. Use the ``array_counter()`` singleton: the
+    handler must stay alive as long as arrays it allocated.
+    """
+
+    def __init__(self):
+        api = ctypes.pythonapi
+        api.PyCapsule_GetPointer.restype = ctypes.c_void_p
+        api.PyCapsule_GetPointer.argtypes = [ctypes.py_object, ctypes.c_char_p]
+        api.PyCapsule_New.restype = ctypes.py_object
+        api.PyCapsule_New.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_void_p]
+        table = ctypes.cast(api.PyCapsule_GetPointer(_multiarray_umath._ARRAY_API, None),
+                            ctypes.POINTER(ctypes.c_void_p))
+        self._set = ctypes.PYFUNCTYPE(ctypes.py_object, ctypes.py_object)(table[_SET_HANDLER])
+        get = ctypes.PYFUNCTYPE(ctypes.py_object)(table[_GET_HANDLER])
+        default = _Handler.from_address(api.PyCapsule_GetPointer(get(), b'mem_handler')).allocator
+        self._default = default
+        self.count = 0
+
+        def counted(allocate):
+            def call(ctx, *args):
+                self.count += 1
+                return allocate(default.ctx, *args)
+            return call
+
+        self._handler = _Handler(b'benchmark_counting', 1,
+                                 _Allocator(default.ctx, _MALLOC(counted(default.malloc)),
+                                            _CALLOC(counted(default.calloc)), _REALLOC(counted(default.realloc)),
+                                            default.free))
+        self._capsule = api.PyCapsule_New(ctypes.addressof(self._handler), b'mem_handler', None)
+        self._previous = None
+
+    def __enter__(self) -> 'ArrayAllocationCounter':
+        self.count = 0
+        self._previous = self._set(self._capsule)
+        return self
+
+    def __exit__(self, *exc):
+        self._set(self._previous)
+        self._previous = None
+
+
+_counter: Optional[ArrayAllocationCounter] = None
+
+
+def array_counter() -> Optional[ArrayAllocationCounter]:
+    """The process-wide counter, or None when this NumPy build does not expose the handler API"""
+    global _counter
+    if _counter is None:
+        try:
+            _counter = ArrayAllocationCounter()
+        except (AttributeError, ValueError, OSError):
+            return None
+    return _counter
+
+
+def allocations(fn: Callable[[], object], repeats: int = 5) -> Dict[str, Optional[int]]:
+    """What one warm call of ``fn`` allocates (median of ``repeats``).
+
+    ``arrays`` counts the NumPy array buffers it allocates, including those
+    freed before it returns; ``peak_bytes`` is the most memory (Python
+    objects and array data, as tracemalloc sees them) it held at once above
+    what was live before the call.
+    """
+    fn()
+    counter = array_counter()
+    counts, peaks = [], []
+    tracemalloc.start()
+    try:
+        for _ in range(repeats):
+            start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            if counter is None:
+                fn()
+            else:
+                with counter:
+                    fn()
+                counts.append(counter.count)
+            peaks.append(tracemalloc.get_traced_memory()[1] - start)
+    finally:
+        tracemalloc.stop()
+    return {'arrays': int(np.median(counts)) if counts else None, 'peak_bytes': int(np.median(peaks))}
@@ -0,0 +1,58 @@
+"""Cascade mode against the full ensemble on heart.csv: cost saved and risk-level agreement"""
+
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks.data import HEART_CSV, load_heart
+from benchmarks.inference import load_bundle, result, time_calls
+
+
+def bench_cascade(models_dir: Path, heart_path: Path = HEART_CSV, single_iterations: int = 1000,
+                  min_seconds: float = 0.5, log=print) -> List[Dict]:
+    """Time ``CompiledEnsemble.predict`` and ``CascadeScorer.predict`` on every heart.csv patient.
+
+    ``batch`` scores all rows in one call, ``single`` one patient per call
+    (as /predict does). The cascade entries also report how many rows
+    exited after the first stage, the mean number of models run per row and
+    whether every risk level matched the full ensemble's.
+    """
+    import main
+
+    bundle = load_bundle(models_dir)
+    X = load_heart(heart_path).to_numpy(dtype=np.float64)
+    n = X.shape[0]
+    full = bundle.ensemble.predict(X).ensemble.copy()
+    scored, ran = bundle.cascade.predict(X)
+    levels = [main.risk_level(p) for p in full.tolist()]
+    agreement = float(np.mean([main.risk_level(p) == level for p, level in zip(scored.ensemble.tolist(), levels)]))
+    quality = {'source': 'heart.csv', 'first_stage': list(bundle.cascade.plan.first),
+               'plan': bundle.cascade.plan.info.get('method'),
+               'exit_rate': round(float(np.mean(~ran.all(axis=1))), 4),
+               'mean_models_run': round(float(ran.sum(axis=1).mean()), 4), 'risk_level_agreement': agreement}
+
+    results = []
+    batch = {'full': time_calls(lambda: bundle.ensemble.predict(X), min_seconds=min_seconds),
+             'cascade': time_calls(lambda: bundle.cascade.predict(X), min_seconds=min_seconds)}
+    single = {'full': [], 'cascade': []}
+    # alternate the two per patient so drift in machine load hits both alike
+    for i in range(max(single_iterations, 1)):
+        row = X[i % n:i % n + 1]
+        for name, fn in (('full', bundle.ensemble.predict), ('cascade', bundle.cascade.predict)):
+            started = time.perf_counter()
+            fn(row)
+            single[name].append(time.perf_counter() - started)
+
+    for kind, samples, size in (('batch', batch, n), ('single', single, 1)):
+        saved = 1.0 - np.mean(samples['cascade']) / np.mean(samples['full'])
+        results.append({**result('cascade/full', kind, size, samples['full'], source='heart.csv'),
+                        'suite': 'cascade'})
+        results.append({**result('cascade/cascade', kind, size, samples['cascade'], **quality,
+                                 cost_saved=round(float(saved), 4)), 'suite': 'cascade'})
+        log(f"{'cascade':32s} {kind:6s} {size:>8d} rows  mean {np.mean(samples['cascade']) * 1000:.3f} ms vs "
+            f"{np.mean(samples['full']) * 1000:.3f} ms full ({saved:.1%} saved)")
+    log(f"{'cascade':32s} first stage {quality['first_stage']}: {quality['exit_rate']:.1%} of rows exit early, "
+        f"{quality['mean_models_run']:.2f} models per row, risk level agreement {agreement:.2%}")
+    return results
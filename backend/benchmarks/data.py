@@ -0,0 +1,40 @@
+"""Benchmark inputs: heart.csv rows, topped up with the synthetic generator"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+HEART_CSV = BACKEND_DIR.parent / 'heart.csv'
+
+sys.path.insert(0, str(BACKEND_DIR))
+from config import FEATURE_NAMES  # noqa: E402
+from tabular import read_frame  # noqa: E402
+from scripts.generate_sample_data import make_cvd_dataset  # noqa: E402
+
+
+def load_heart(path: Path = HEART_CSV) -> pd.DataFrame:
+    return read_frame(path, columns=FEATURE_NAMES)[FEATURE_NAMES]
+
+
+def feature_frame(n_rows: int, heart_path: Path = HEART_CSV, seed: int = 42) -> pd.DataFrame:
+    """``n_rows`` patients: the real heart.csv rows first, synthetic ones after.
+
+    Deterministic for a given ``n_rows`` and ``seed`` so runs are comparable.
+    """
+    real = load_heart(heart_path) if heart_path.exists() else pd.DataFrame(columns=FEATURE_NAMES)
+    if n_rows <= len(real):
+        return real.iloc[:n_rows].reset_index(drop=True)
+    synthetic = make_cvd_dataset(n_rows - len(real), seed=seed)[FEATURE_NAMES]
+    return pd.concat([real, synthetic], ignore_index=True)
+
+
+def feature_matrix(n_rows: int, **kwargs) -> np.ndarray:
+    return feature_frame(n_rows, **kwargs).to_numpy(dtype=np.float64)
+
+
+def source_of(n_rows: int, heart_path: Path = HEART_CSV) -> str:
+    n_real = len(load_heart(heart_path)) if heart_path.exists() else 0
+    return 'heart.csv' if n_rows <= n_real else f'heart.csv+synthetic({n_rows - n_real})'
@@ -0,0 +1,113 @@
+"""Closed-loop HTTP load generator for a running API (stdlib only)"""
+
+import http.client
+import json
+import threading
+import time
+from typing import Dict, List, Sequence
+from urllib.parse import urlsplit
+
+from benchmarks.data import feature_frame, source_of
+from benchmarks.inference import latency_summary
+from wire import PACKED_MEDIA_TYPE, encode_packed_features
+
+
+def _connection(url: str) -> http.client.HTTPConnection:
+    parts = urlsplit(url)
+    cls = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+    return cls(parts.hostname, parts.port, timeout=300)
+
+
+def run_load(url: str, path: str, bodies: Sequence[bytes], content_type: str, concurrency: int,
+             total_requests: int) -> Dict:
+    """``concurrency`` keep-alive clients send ``total_requests`` POSTs back to back.
+
+    Bodies are used round-robin. Returns wall time, per-request latencies
+    and a count per status code (connection errors count as status 0).
+    """
+    prefix = urlsplit(url).path.rstrip('/')
+    next_index = iter(range(total_requests))
+    lock = threading.Lock()
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+
+    def worker():
+        conn = _connection(url)
+        while True:
+            with lock:
+                i = next(next_index, None)
+            if i is None:
+                break
+            body = bodies[i % len(bodies)]
+            started = time.perf_counter()
+            try:
+                conn.request('POST', prefix + path, body=body, headers={'Content-Type': content_type})
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = _connection(url)
+                status = 0
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+        conn.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(max(concurrency, 1))]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {'wall_seconds': time.perf_counter() - started, 'latencies': latencies, 'statuses': statuses}
+
+
+def _result(name: str, rows_per_request: int, concurrency: int, run: Dict, source: str) -> Dict:
+    n = len(run['latencies'])
+    ok = run['statuses'].get(200, 0)
+    wall = run['wall_seconds']
+    return {'suite': 'http', 'name': name, 'kind': 'load', 'rows': rows_per_request, 'concurrency': concurrency,
+            'requests': n, 'ok': ok, 'statuses': {str(k): v for k, v in sorted(run['statuses'].items())},
+            'requests_per_second': round(ok / wall, 2) if wall > 0 else None,
+            'rows_per_second': round(ok * rows_per_request / wall, 2) if wall > 0 else None,
+            'latency_ms': latency_summary(run['latencies']) if n else {}, 'source': source}
+
+
+def bench_http(url: str, concurrency_levels: Sequence[int], requests: int, batch_sizes: Sequence[int],
+               stream_rows: Sequence[int], log=print) -> List[Dict]:
+    """/predict at each concurrency level, /batch-predict (JSON and packed) per batch size and /upload-csv/stream per file size."""
+    results = []
+    patients = feature_frame(max(requests, 1)).to_dict('records')
+    single_bodies = [json.dumps(p).encode() for p in patients]
+    for c in concurrency_levels:
+        run = run_load(url, '/predict', single_bodies, 'application/json', c, requests)
+        results.append(_result('/predict', 1, c, run, source_of(len(patients))))
+        log(f"/predict               c={c:<4d} {results[-1]['requests_per_second']:>10,.1f} req/s"
+            f"  p50 {results[-1]['latency_ms'].get('p50', 0):.2f} ms  p99 {results[-1]['latency_ms'].get('p99', 0):.2f} ms"
+            f"  statuses {results[-1]['statuses']}")
+
+    for size in batch_sizes:
+        body = json.dumps(feature_frame(size).to_dict('records')).encode()
+        n_requests = max(3, min(requests, 1_000_000 // max(size, 1)))
+        for c in concurrency_levels:
+            run = run_load(url, '/batch-predict', [body], 'application/json', c, n_requests)
+            results.append(_result('/batch-predict', size, c, run, source_of(size)))
+            log(f"/batch-predict {size:>7d}  c={c:<4d} {results[-1]['rows_per_second']:>12,.0f} rows/s"
+                f"  p50 {results[-1]['latency_ms'].get('p50', 0):.2f} ms  statuses {results[-1]['statuses']}")
+
+        packed = encode_packed_features(feature_frame(size).to_numpy(dtype=float))
+        for c in concurrency_levels:
+            run = run_load(url, '/batch-predict/columnar', [packed], PACKED_MEDIA_TYPE, c, n_requests)
+            results.append(_result('/batch-predict/columnar', size, c, run, source_of(size)))
+            log(f"/batch-predict/columnar {size:>7d}  c={c:<4d} {results[-1]['rows_per_second']:>12,.0f} rows/s"
+                f"  p50 {results[-1]['latency_ms'].get('p50', 0):.2f} ms  statuses {results[-1]['statuses']}")
+
+    for size in stream_rows:
+        body = feature_frame(size).to_csv(index=False).encode()
+        run = run_load(url, '/upload-csv/stream?format=ndjson', [body], 'text/csv', 1, 3)
+        results.append(_result('/upload-csv/stream', size, 1, run, source_of(size)))
+        log(f"/upload-csv/stream {size:>8d} rows {results[-1]['rows_per_second']:>12,.0f} rows/s"
+            f"  statuses {results[-1]['statuses']}")
+    return results
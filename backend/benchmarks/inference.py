@@ -0,0 +1,107 @@
+"""In-process throughput and latency of each model, the ensemble and the response pipeline"""
+
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+from benchmarks.allocations import allocations
+from benchmarks.data import feature_matrix, source_of
+from config import FEATURE_NAMES
+
+# ``request`` entries hold one PatientData per row; past this many rows that
+# costs more memory than the batch itself is worth timing
+REQUEST_MAX_ROWS = 100000
+
+
+def time_calls(fn: Callable[[], object], min_seconds: float = 0.5, min_repeats: int = 3,
+               max_repeats: int = 10000) -> List[float]:
+    """Call ``fn`` until ``min_seconds`` have passed (and at least ``min_repeats`` times)."""
+    samples = []
+    deadline = time.perf_counter() + min_seconds
+    while len(samples) < max_repeats and (len(samples) < min_repeats or time.perf_counter() < deadline):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def latency_summary(samples_seconds: Sequence[float]) -> Dict[str, float]:
+    ms = np.asarray(samples_seconds) * 1000.0
+    p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+    return {'p50': round(float(p50), 4), 'p90': round(float(p90), 4), 'p99': round(float(p99), 4),
+            'mean': round(float(ms.mean()), 4), 'max': round(float(ms.max()), 4)}
+
+
+def result(name: str, kind: str, rows: int, samples: Sequence[float], **extra) -> Dict:
+    median = float(np.median(samples))
+    return {'suite': 'inference', 'name': name, 'kind': kind, 'rows': rows, 'repeats': len(samples),
+            'seconds_median': median, 'rows_per_second': round(rows / median, 2) if median > 0 else None,
+            'latency_ms': latency_summary(samples), **extra}
+
+
+def load_bundle(models_dir: Path):
+    import main
+    from registry import artifact_fingerprint
+    return main.build_bundle(Path(models_dir), artifact_fingerprint(Path(models_dir)))
+
+
+def bench_inference(models_dir: Path, sizes: Sequence[int], single_iterations: int = 1000,
+                    min_seconds: float = 0.5, log=print) -> List[Dict]:
+    """Batch throughput per size and single-row latency percentiles for every stage.
+
+    ``model/<name>`` entries time one model on pre-scaled input (as the
+    sklearn/Keras artifacts expect); ``ensemble`` is CompiledEnsemble on raw
+    input and ``pipeline`` adds building the response dicts, i.e. what an
+    endpoint pays per call minus HTTP. ``request`` starts one step earlier,
+    from validated ``PatientData``, so it includes assembling the feature
+    matrix. Every entry also carries ``allocations`` (see ``allocations``).
+    """
+    import main
+    from ensemble import positive_probability
+
+    bundle = load_bundle(models_dir)
+    results = []
+
+    def stages(X):
+        scaled = bundle.scaler.transform(X)
+        out = bundle.ensemble.allocate(X.shape[0])
+        entries = [(f'model/{name}', lambda m=model: positive_probability(m, scaled))
+                   for name, model in bundle.models.items()]
+        entries.append(('ensemble', lambda: bundle.ensemble.predict(X, out=out)))
+        entries.append(('pipeline', lambda: main.ensemble_predict_matrix(X, bundle)))
+        if X.shape[0] <= REQUEST_MAX_ROWS:
+            patients = [main.PatientData(**dict(zip(FEATURE_NAMES, row))) for row in X.tolist()]
+            dtype = bundle.ensemble.input_dtype
+            entries.append(('request', lambda: main.ensemble_predict_matrix(main.patients_to_matrix(patients, dtype),
+                                                                            bundle)))
+        return entries
+
+    for n in sizes:
+        X = feature_matrix(n)
+        for name, fn in stages(X):
+            samples = time_calls(fn, min_seconds=min_seconds, min_repeats=1 if n >= 100000 else 3)
+            allocated = allocations(fn, repeats=1 if n >= 100000 else 5)
+            results.append(result(name, 'batch', n, samples, source=source_of(n), allocations=allocated))
+            log(f"{name:32s} batch {n:>8d} rows  {results[-1]['rows_per_second']:>14,.0f} rows/s"
+                f"  {allocated['arrays']} arrays, peak {allocated['peak_bytes'] / 1024:,.1f} KiB")
+
+    if single_iterations > 0:
+        rows = feature_matrix(min(single_iterations, 1000))
+        # different patients per call, so per-row caches cannot flatter the numbers
+        per_row = [dict(stages(rows[i:i + 1])) for i in range(len(rows))]
+        for name in per_row[0]:
+            fns = [entries[name] for entries in per_row]
+            samples = []
+            for i in range(single_iterations):
+                fn = fns[i % len(fns)]
+                started = time.perf_counter()
+                fn()
+                samples.append(time.perf_counter() - started)
+            allocated = allocations(fns[0])
+            results.append(result(name, 'single', 1, samples, source=source_of(len(rows)), allocations=allocated))
+            log(f"{name:32s} single         p50 {results[-1]['latency_ms']['p50']:.3f} ms"
+                f"  p99 {results[-1]['latency_ms']['p99']:.3f} ms"
+                f"  {allocated['arrays']} arrays, peak {allocated['peak_bytes'] / 1024:.1f} KiB")
+    return results
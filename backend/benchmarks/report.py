@@ -0,0 +1,77 @@
+"""Benchmark result files: run metadata, JSON output and baseline comparison"""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+
+def run_metadata() -> Dict:
+    import numpy as np
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=Path(__file__).resolve().parent, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'git_commit': commit,
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'env': {k: v for k, v in sorted(os.environ.items()) if k.startswith('CVD_')},
+    }
+
+
+def write_results(path: Path, results: List[Dict], settings: Dict) -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'meta': run_metadata(), 'settings': settings, 'results': results}, f, indent=2)
+    return path
+
+
+def _key(entry: Dict) -> Tuple:
+    return entry['suite'], entry['name'], entry['kind'], entry['rows'], entry.get('concurrency')
+
+
+def _arrays(entry: Dict):
+    return (entry.get('allocations') or {}).get('arrays')
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> List[Dict]:
+    """Per shared benchmark, the relative throughput change and whether it regressed.
+
+    A benchmark regresses when its rows/s falls more than ``threshold``
+    (a fraction, e.g. 0.1) below the baseline. Array allocations per call
+    are carried along when both runs recorded them (informational only).
+    """
+    base = {_key(e): e for e in baseline['results'] if e.get('rows_per_second')}
+    rows = []
+    for entry in current['results']:
+        before = base.get(_key(entry))
+        if before is None or not entry.get('rows_per_second'):
+            continue
+        change = entry['rows_per_second'] / before['rows_per_second'] - 1.0
+        rows.append({'key': _key(entry), 'baseline': before['rows_per_second'], 'current': entry['rows_per_second'],
+                     'change': change, 'regressed': change < -threshold,
+                     'arrays': (_arrays(before), _arrays(entry))})
+    return rows
+
+
+def format_comparison(rows: List[Dict]) -> str:
+    lines = [f"{'benchmark':58s} {'baseline':>14s} {'current':>14s} {'change':>8s} {'arrays/call':>14s}"]
+    for r in rows:
+        suite, name, kind, n, concurrency = r['key']
+        label = f"{suite}:{name} {kind} rows={n}" + (f" c={concurrency}" if concurrency else '')
+        flag = '  REGRESSION' if r['regressed'] else ''
+        before, after = r.get('arrays', (None, None))
+        arrays = f"{before} -> {after}" if before is not None and after is not None else ''
+        lines.append(f"{label:58s} {r['baseline']:>14,.0f} {r['current']:>14,.0f} {r['change']:>+8.1%} "
+                     f"{arrays:>14s}{flag}")
+    return '\n'.join(lines)
@@ -0,0 +1,103 @@
+"""Bounded LRU + TTL cache for per-patient prediction results"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Sequence
+
+import numpy as np
+
+
+def feature_keys(model_version: str, X: np.ndarray) -> List[Hashable]:
+    """One cache key per row of a raw (n, 13) feature matrix.
+
+    Rows are canonicalised to contiguous float64 with -0.0 folded into 0.0,
+    so ``{"age": 54}`` and ``{"age": 54.0}`` share an entry; the model
+    version keeps results from different artifacts apart.
+    """
+    canonical = np.ascontiguousarray(X, dtype=np.float64) + 0.0
+    return [(model_version, row.tobytes()) for row in canonical]
+
+
+class PredictionCache:
+    """Thread-safe LRU cache whose entries also expire ``ttl_seconds`` after insertion.
+
+    ``max_entries`` <= 0 disables caching (every lookup is a miss and
+    nothing is stored); ``ttl_seconds`` <= 0 means entries never expire.
+    """
+
+    def __init__(self, max_entries: int = 4096, ttl_seconds: float = 300.0, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_many(self, keys: Sequence[Hashable]) -> List[Optional[Dict]]:
+        """Cached value per key, or None on a miss; hits move to the MRU end."""
+        if not self.enabled:
+            with self._lock:
+                self.misses += len(keys)
+            return [None] * len(keys)
+        now = self._clock()
+        found: List[Optional[Dict]] = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and self.ttl_seconds > 0 and now - entry[0] > self.ttl_seconds:
+                    del self._entries[key]
+                    self.expirations += 1
+                    entry = None
+                if entry is None:
+                    self.misses += 1
+                    found.append(None)
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    found.append(entry[1])
+        return found
+
+    def put_many(self, keys: Sequence[Hashable], values: Sequence[Dict]):
+        if not self.enabled:
+            return
+        now = self._clock()
+        with self._lock:
+            for key, value in zip(keys, values):
+                self._entries[key] = (now, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry (e.g. after the models were reloaded)."""
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,175 @@
+"""Early-exit scoring: run the cheap models first, the rest only near a risk boundary"""
+
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Sequence, Tuple, Union
+
+import numpy as np
+
+# Used without a models/cascade.json: the tree models first, as the cheap stage
+# of the uncompiled artifacts (sklearn SVC and Keras are the slow ones there)
+DEFAULT_FIRST_STAGE = ('random_forest', 'gradient_boosting')
+# keeps float rounding in the interval sums from flipping a decision at a boundary
+SCORE_EPSILON = 1e-9
+
+
+@dataclass(frozen=True)
+class CascadePlan:
+    """Which models run first and how far the others can still move the blend.
+
+    The blend's linear score is ``intercept + partial + R`` where ``partial``
+    sums ``weights[m] * p_m`` over the ``first`` stage and ``R`` over the
+    remaining models. ``R`` is bounded by ``[estimate + residual_low,
+    estimate + residual_high]`` with ``estimate = intercept + sum(coef[m] *
+    p_m)`` over the first stage; the trainer calibrates those on out-of-fold
+    predictions (``models/cascade.json``). Calibrated bounds are empirical:
+    they cover the rows they were fitted on, and a new row whose residual
+    falls outside them can exit in a different band than the full ensemble
+    would give. Every bound is also clipped to the range ``R`` can take with
+    probabilities in [0, 1], so the uncalibrated plan (``hard``) is a strict
+    guarantee on its own. ``full`` runs every model in the first stage.
+    """
+    first: Tuple[str, ...]
+    coef: Dict[str, float] = field(default_factory=dict)
+    intercept: float = 0.0
+    residual_low: float = -np.inf
+    residual_high: float = np.inf
+    info: Dict = field(default_factory=dict)
+
+    @classmethod
+    def hard(cls, first: Sequence[str] = DEFAULT_FIRST_STAGE) -> 'CascadePlan':
+        return cls(first=tuple(first), info={'method': 'hard'})
+
+    @classmethod
+    def full(cls, names: Sequence[str], reason: str = '') -> 'CascadePlan':
+        return cls(first=tuple(names), info={'method': 'full', **({'reason': reason} if reason else {})})
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'CascadePlan':
+        return cls(first=tuple(data['first']), coef={name: float(c) for name, c in data.get('coef', {}).items()},
+                   intercept=float(data.get('intercept', 0.0)),
+                   residual_low=_bound(data.get('residual_low'), -np.inf),
+                   residual_high=_bound(data.get('residual_high'), np.inf), info=dict(data.get('info', {})))
+
+    def to_dict(self) -> Dict:
+        # JSON has no infinity; an unbounded side is written as null
+        return {'first': list(self.first), 'coef': dict(self.coef), 'intercept': self.intercept,
+                'residual_low': self.residual_low if np.isfinite(self.residual_low) else None,
+                'residual_high': self.residual_high if np.isfinite(self.residual_high) else None,
+                'info': self.info}
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> 'CascadePlan':
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def save(self, path: Union[str, Path]):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+def _bound(value, unbounded: float) -> float:
+    return unbounded if value is None else float(value)
+
+
+def risk_bands(prob: np.ndarray, thresholds: Sequence[float]) -> np.ndarray:
+    """0 (low), 1 (moderate), 2 (high) per probability, as ``main.risk_level`` assigns them"""
+    bands = np.zeros(np.shape(prob), dtype=np.int8)
+    for t in thresholds:
+        bands += prob >= t
+    return bands
+
+
+class CascadeScorer:
+    """A ``CompiledEnsemble`` run as a two-stage cascade.
+
+    Every row is scored by the ``plan.first`` models. A row exits there when
+    both ends of its possible blend probability fall in the same risk band
+    (``thresholds`` are the band boundaries), so its risk level is the one
+    the full ensemble would give; its ensemble probability is the plan's
+    estimate, kept inside that interval. The remaining models score only the
+    other rows, which are then blended exactly as ``CompiledEnsemble.predict``
+    does.
+    """
+
+    def __init__(self, ensemble, plan: CascadePlan, thresholds: Sequence[float]):
+        names = ensemble.model_names
+        unknown = [name for name in plan.first if name not in names]
+        if unknown:
+            raise ValueError(f"Cascade first stage has unknown models: {unknown}")
+        self.ensemble = ensemble
+        self.plan = plan
+        self.thresholds = tuple(thresholds)
+        self.first = np.array([j for j, name in enumerate(names) if name in plan.first], dtype=np.intp)
+        self.rest = np.array([j for j, name in enumerate(names) if name not in plan.first], dtype=np.intp)
+        rest_weights = ensemble.weights[self.rest]
+        self.hard_low = float(np.minimum(rest_weights, 0).sum())
+        self.hard_high = float(np.maximum(rest_weights, 0).sum())
+        self.coef = np.array([plan.coef.get(names[j], 0.0) for j in self.first], dtype=np.float64)
+        self.calibrated = bool(np.isfinite(plan.residual_low) and np.isfinite(plan.residual_high))
+
+    def exits_possible(self) -> bool:
+        """Whether any first-stage probabilities let a row exit.
+
+        Always True for a calibrated plan, whose interval moves with its
+        estimate. The hard interval has a fixed width in score space, so an
+        uncalibrated plan exits only if some risk band, within the range the
+        first stage can reach, is wider than the remaining models' weights.
+        """
+        if self.calibrated or not self.rest.size:
+            return True
+        ensemble = self.ensemble
+        weights = ensemble.weights[self.first]
+        reach_low = ensemble.intercept + float(np.minimum(weights, 0).sum())
+        reach_high = ensemble.intercept + float(np.maximum(weights, 0).sum())
+        edges = np.asarray(self.thresholds, dtype=np.float64)
+        if ensemble.logistic:
+            edges = np.log(edges / (1 - edges))
+        edges = np.concatenate([[-np.inf], edges, [np.inf]])
+        for band_low, band_high in zip(edges[:-1], edges[1:]):
+            # partial + hard_low >= band_low and partial + hard_high < band_high, as in decide
+            start = max(band_low - self.hard_low + SCORE_EPSILON, reach_low)
+            if start <= reach_high and start < band_high - self.hard_high - SCORE_EPSILON:
+                return True
+        return False
+
+    def decide(self, first_proba: np.ndarray):
+        """(exits, probability) per row from its (n, len(first)) first-stage probabilities"""
+        ensemble = self.ensemble
+        partial = ensemble.intercept + first_proba @ ensemble.weights[self.first]
+        estimate = self.plan.intercept + first_proba @ self.coef
+        high = np.minimum(estimate + self.plan.residual_high, self.hard_high)
+        low = np.minimum(np.maximum(estimate + self.plan.residual_low, self.hard_low), high)
+        exits = (risk_bands(ensemble.link(partial + low - SCORE_EPSILON), self.thresholds)
+                 == risk_bands(ensemble.link(partial + high + SCORE_EPSILON), self.thresholds))
+        # an uncalibrated plan has no estimate to offer; report the middle of the interval
+        point = np.clip(estimate, low, high) if self.calibrated else (low + high) / 2
+        return exits, ensemble.link(partial + point)
+
+    def predict(self, X: np.ndarray):
+        """(EnsembleOutput, ran) for an (n, 13) raw matrix; ``ran[i, j]`` is whether model j scored row i.
+
+        Probabilities of models that did not run are NaN in ``per_model``.
+        """
+        ensemble = self.ensemble
+        n = X.shape[0]
+        out = ensemble.allocate(n)
+        ran = np.zeros((n, len(ensemble.model_names)), dtype=bool)
+        if n == 0:
+            return out, ran
+        if not self.rest.size:
+            ran[:] = True
+            return ensemble.predict(X, out=out), ran
+        out.per_model.fill(np.nan)
+        first_proba = ensemble.score_models(X, self.first)
+        out.per_model[:, self.first] = first_proba
+        ran[:, self.first] = True
+        exits, out.ensemble[:] = self.decide(first_proba)
+
+        pending = np.flatnonzero(~exits)
+        if pending.size and self.rest.size:
+            out.per_model[np.ix_(pending, self.rest)] = ensemble.score_models(X[pending], self.rest)
+            ran[np.ix_(pending, self.rest)] = True
+            out.ensemble[pending] = ensemble.blend_scores(out.per_model[pending])
+        return out, ran
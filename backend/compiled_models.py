@@ -0,0 +1,574 @@
+"""NumPy re-implementations of the trained models for low-overhead inference
+
+Each class is built once from the fitted estimator (or from the arrays the
+trainer exports next to the pickles) and exposes the same ``predict_proba``
+contract as scikit-learn, so it can stand in for the original in a
+``registry.ModelBundle``.
+"""
+
+import os
+from pathlib import Path
+from typing import Dict
+
+import joblib
+import numpy as np
+from scipy.special import expit
+
+# Rows traversed per block; bounds the (rows x trees) index matrices
+TREE_BLOCK_ROWS = 8192
+
+
+def _replace_atomically(path, write):
+    """Call ``write(partial)`` on a temporary sibling of ``path``, then rename it over ``path``.
+
+    The API may serve the exports memory-mapped (CVD_MMAP_MODELS): rewriting
+    a mapped file in place changes the arrays a live model version reads,
+    and truncating it kills the process with SIGBUS. A rename leaves the old
+    file's pages to whoever still maps them.
+    """
+    path = Path(path)
+    partial = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    try:
+        write(partial)
+        os.replace(partial, path)
+    finally:
+        if partial.exists():
+            partial.unlink()
+
+
+def dump_arrays(arrays: Dict[str, np.ndarray], path):
+    """``joblib.dump`` an array export (``to_arrays()``) so readers see the old file or the new one, never a mix"""
+    _replace_atomically(path, lambda partial: joblib.dump(arrays, partial))
+
+
+class CompiledForest:
+    """All trees of a binary RandomForest / (Hist)GradientBoosting in packed arrays.
+
+    Nodes of every tree are concatenated into flat ``feature``, ``threshold``,
+    ``left``, ``right`` and ``value`` arrays, ``roots`` holding each tree's
+    first node. Leaves point to themselves, so every row can be pushed down
+    every tree for ``max_depth`` vectorized steps without branching. Children
+    are also interleaved as ``children[2 * node + went_right]`` so each step
+    needs a single gather to move down.
+
+    Probabilities are bit-identical to scikit-learn's: inputs are compared as
+    float32 like sklearn's tree code does, leaf values are normalised with the
+    same operations, and trees are summed sequentially in estimator order.
+    HistGradientBoosting compares in float64, so its forests keep
+    ``input_dtype=float64``; NaN always goes right (the API never passes NaN,
+    HGB routes it per node).
+
+    ``cover`` is each node's training weight (sample count), kept for the
+    path-dependent TreeSHAP in ``explain``; scoring never reads it.
+    """
+
+    KINDS = ('random_forest', 'gradient_boosting')
+
+    def __init__(self, kind: str, feature, threshold, left, right, value, roots, max_depth: int,
+                 n_features: int, init: float = 0.0, input_dtype=np.float32, children=None, cover=None):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown forest kind: {kind}")
+        self.kind = kind
+        self.feature = np.asarray(feature, dtype=np.intp)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.intp)
+        self.right = np.asarray(right, dtype=np.intp)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.init = float(init)
+        self.input_dtype = np.dtype(input_dtype)
+        self.children = (np.column_stack([self.left, self.right]).ravel() if children is None
+                         else np.asarray(children, dtype=np.intp))
+        self.cover = None if cover is None else np.asarray(cover, dtype=np.float64)
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @classmethod
+    def from_sklearn(cls, model) -> 'CompiledForest':
+        classes = getattr(model, 'classes_', None)
+        if classes is None or len(classes) != 2:
+            raise ValueError("Only fitted binary classifiers can be compiled")
+
+        if hasattr(model, '_predictors'):
+            return cls._from_hist_gradient_boosting(model)
+        if hasattr(model, 'learning_rate'):
+            kind = 'gradient_boosting'
+            trees = [est.tree_ for est in model.estimators_[:, 0]]
+            init = float(model._raw_predict_init(np.zeros((1, model.n_features_in_), dtype=np.float32))[0, 0])
+        else:
+            kind = 'random_forest'
+            trees = [est.tree_ for est in model.estimators_]
+            init = 0.0
+
+        features, thresholds, lefts, rights, values, roots, covers = [], [], [], [], [], [], []
+        offset = 0
+        for tree in trees:
+            idx = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+            if kind == 'random_forest':
+                # same normalisation as DecisionTreeClassifier.predict_proba
+                proba = tree.value[:, 0, :2]
+                normalizer = proba.sum(axis=1)
+                normalizer[normalizer == 0.0] = 1.0
+                leaf_value = proba[:, 1] / normalizer
+            else:
+                # predict_stages adds learning_rate * value per stage
+                leaf_value = model.learning_rate * tree.value[:, 0, 0]
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            lefts.append(np.where(is_leaf, idx, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, idx, tree.children_right) + offset)
+            values.append(leaf_value)
+            covers.append(tree.weighted_n_node_samples)
+            roots.append(offset)
+            offset += tree.node_count
+
+        return cls(kind=kind,
+                   feature=np.concatenate(features), threshold=np.concatenate(thresholds),
+                   left=np.concatenate(lefts), right=np.concatenate(rights),
+                   value=np.concatenate(values), roots=np.array(roots),
+                   max_depth=max(tree.max_depth for tree in trees),
+                   n_features=model.n_features_in_, init=init, cover=np.concatenate(covers))
+
+    @classmethod
+    def _from_hist_gradient_boosting(cls, model) -> 'CompiledForest':
+        # node values already include the learning rate; raw = baseline + sum of leaves
+        trees = [predictors[0].nodes for predictors in model._predictors]
+        if any(nodes['is_categorical'].any() for nodes in trees):
+            raise ValueError("Categorical HistGradientBoosting splits cannot be compiled")
+        features, thresholds, lefts, rights, values, roots, covers = [], [], [], [], [], [], []
+        offset = 0
+        for nodes in trees:
+            idx = np.arange(len(nodes))
+            is_leaf = nodes['is_leaf'].astype(bool)
+            features.append(np.where(is_leaf, 0, nodes['feature_idx']))
+            thresholds.append(np.where(is_leaf, np.inf, nodes['num_threshold']))
+            lefts.append(np.where(is_leaf, idx, nodes['left']) + offset)
+            rights.append(np.where(is_leaf, idx, nodes['right']) + offset)
+            values.append(nodes['value'])
+            covers.append(nodes['count'])
+            roots.append(offset)
+            offset += len(nodes)
+
+        return cls(kind='gradient_boosting',
+                   feature=np.concatenate(features), threshold=np.concatenate(thresholds),
+                   left=np.concatenate(lefts), right=np.concatenate(rights),
+                   value=np.concatenate(values), roots=np.array(roots),
+                   max_depth=max(int(nodes['depth'].max()) for nodes in trees),
+                   n_features=model.n_features_in_, init=float(np.ravel(model._baseline_prediction)[0]),
+                   input_dtype=np.float64, cover=np.concatenate(covers))
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {
+            'kind': np.array(self.kind),
+            # runtime dtypes, so a memory-mapped load is used without a copy
+            'feature': self.feature,
+            'threshold': self.threshold,
+            'left': self.left,
+            'right': self.right,
+            'children': self.children,
+            'value': self.value,
+            'roots': self.roots,
+            'max_depth': np.array(self.max_depth),
+            'n_features': np.array(self.n_features),
+            'init': np.array(self.init),
+            'input_dtype': np.array(self.input_dtype.str),
+        }
+        if self.cover is not None:
+            arrays['cover'] = self.cover
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'CompiledForest':
+        return cls(kind=str(arrays['kind']), feature=arrays['feature'], threshold=arrays['threshold'],
+                   left=arrays['left'], right=arrays['right'], value=arrays['value'], roots=arrays['roots'],
+                   max_depth=int(arrays['max_depth']), n_features=int(arrays['n_features']),
+                   init=float(arrays['init']), children=arrays.get('children'), cover=arrays.get('cover'),
+                   input_dtype=np.dtype(str(arrays['input_dtype'])) if 'input_dtype' in arrays else np.float32)
+
+    def fold_scaler(self, mean: np.ndarray, scale: np.ndarray, dtype=np.float64) -> 'CompiledForest':
+        """Copy that takes unscaled ``dtype`` input, with thresholds in raw units.
+
+        sklearn tests ``float32((x - mean) / scale) <= t`` (float64 for HGB). That map is
+        monotone in x, so it equals ``x <= c`` for the largest float64 ``c``
+        that still passes; ``_raw_cutoffs`` finds it by bisection. Decisions,
+        and therefore probabilities, stay bit-identical (a plain
+        ``t * scale + mean`` would misroute inputs that sit exactly on a split).
+        The cutoffs stay float64; float32 input is compared after exact widening.
+        """
+        threshold = self.threshold.copy()
+        internal = np.isfinite(threshold)
+        f = self.feature[internal]
+        threshold[internal] = _raw_cutoffs(threshold[internal], mean[f], scale[f], self.input_dtype)
+        return CompiledForest(kind=self.kind, feature=self.feature, threshold=threshold, left=self.left,
+                              right=self.right, value=self.value, roots=self.roots, max_depth=self.max_depth,
+                              n_features=self.n_features, init=self.init, input_dtype=dtype,
+                              children=self.children, cover=self.cover)
+
+    def leaf_values(self, X: np.ndarray) -> np.ndarray:
+        """(n, n_trees) leaf value reached by each row in each tree.
+
+        The level loop works in scratch arrays allocated once per call and
+        reused at every depth (``take`` with ``mode='clip'``, which is not
+        buffered; every index is in range anyway).
+        """
+        X = np.ascontiguousarray(X, dtype=self.input_dtype)
+        n = X.shape[0]
+        out = np.empty((n, self.n_trees), dtype=np.float64)
+        shape = (min(n, TREE_BLOCK_ROWS), self.n_trees)
+        nodes, index = np.empty(shape, dtype=np.intp), np.empty(shape, dtype=np.intp)
+        x, cut = np.empty(shape, dtype=self.input_dtype), np.empty(shape, dtype=np.float64)
+        went_right = np.empty(shape, dtype=bool)
+        row_base = (np.arange(shape[0]) * self.n_features)[:, None]
+        for start in range(0, n, TREE_BLOCK_ROWS):
+            block = X[start:start + TREE_BLOCK_ROWS]
+            m = block.shape[0]
+            flat = block.ravel()
+            nodes_m, index_m, x_m, cut_m, right_m = nodes[:m], index[:m], x[:m], cut[:m], went_right[:m]
+            nodes_m[...] = self.roots
+            for _ in range(self.max_depth):
+                np.take(self.feature, nodes_m, out=index_m, mode='clip')
+                index_m += row_base[:m]
+                np.take(flat, index_m, out=x_m, mode='clip')
+                np.take(self.threshold, nodes_m, out=cut_m, mode='clip')
+                # written as not(x <= t) so NaN goes right, as in sklearn
+                np.less_equal(x_m, cut_m, out=right_m)
+                np.logical_not(right_m, out=right_m)
+                np.multiply(nodes_m, 2, out=index_m)
+                index_m += right_m
+                np.take(self.children, index_m, out=nodes_m, mode='clip')
+            np.take(self.value, nodes_m, out=out[start:start + m], mode='clip')
+        return out
+
+    def predict_positive(self, X: np.ndarray) -> np.ndarray:
+        values = self.leaf_values(X)
+        if self.kind == 'random_forest':
+            # cumsum adds strictly left to right, matching sklearn's per-tree accumulation
+            return np.cumsum(values, axis=1)[:, -1] / self.n_trees
+        values[:, 0] += self.init
+        return expit(np.cumsum(values, axis=1)[:, -1])
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        p = self.predict_positive(X)
+        return np.column_stack([1.0 - p, p])
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return (self.predict_positive(X) > 0.5).astype(int)
+
+
+def _raw_cutoffs(t: np.ndarray, mean: np.ndarray, scale: np.ndarray, dtype=np.float32) -> np.ndarray:
+    """Largest float64 x with ``dtype((x - mean) / scale) <= t``, elementwise."""
+    def passes(x):
+        return ((x - mean) / scale).astype(dtype) <= t
+
+    guess = t * scale + mean
+    delta = 1e-6 * (np.abs(guess) + scale)
+    lo, hi = guess - delta, guess + delta
+    while not (passes(lo).all() and not passes(hi).any()):
+        delta *= 16
+        lo = np.where(passes(lo), lo, guess - delta)
+        hi = np.where(passes(hi), guess + delta, hi)
+    # bisect until lo and hi are adjacent doubles; lo always passes, hi never does
+    while True:
+        mid = lo + (hi - lo) / 2
+        open_gap = (mid != lo) & (mid != hi)
+        if not open_gap.any():
+            return lo
+        ok = passes(mid)
+        lo = np.where(open_gap & ok, mid, lo)
+        hi = np.where(open_gap & ~ok, mid, hi)
+
+
+_ACTIVATIONS = {
+    'relu': lambda z: np.maximum(z, 0, out=z),
+    'sigmoid': lambda z: expit(z, out=z),
+    'tanh': lambda z: np.tanh(z, out=z),
+    'linear': lambda z: z,
+}
+
+
+class NumpyMLP:
+    """Forward pass of the trainer's Keras dense network in plain NumPy.
+
+    Holds one (kernel, bias, activation) triple per Dense layer; Dropout is
+    the identity at inference time and is simply not exported. Computation is
+    in float32 like Keras, so outputs agree with ``model.predict`` to ~1e-6.
+    """
+
+    def __init__(self, kernels, biases, activations, dtype=np.float32):
+        if not (len(kernels) == len(biases) == len(activations)):
+            raise ValueError("kernels, biases and activations must have the same length")
+        unknown = set(activations) - set(_ACTIVATIONS)
+        if unknown:
+            raise ValueError(f"Unsupported activations: {sorted(unknown)}")
+        self.dtype = np.dtype(dtype)
+        self.kernels = [np.ascontiguousarray(k, dtype=self.dtype) for k in kernels]
+        self.biases = [np.ascontiguousarray(b, dtype=self.dtype) for b in biases]
+        self.activations = [str(a) for a in activations]
+
+    @classmethod
+    def from_keras(cls, model) -> 'NumpyMLP':
+        kernels, biases, activations = [], [], []
+        for layer in model.layers:
+            weights = layer.get_weights()
+            if not weights:
+                continue  # Dropout / InputLayer
+            if len(weights) != 2 or not hasattr(layer, 'activation'):
+                raise ValueError(f"Unsupported layer for NumPy export: {layer.name}")
+            kernels.append(weights[0])
+            biases.append(weights[1])
+            activations.append(layer.activation.__name__)
+        return cls(kernels, biases, activations)
+
+    def fold_scaler(self, mean: np.ndarray, scale: np.ndarray, dtype=np.float64) -> 'NumpyMLP':
+        """Copy that takes unscaled input: the scaler is absorbed into layer one.
+
+        ``((x - mean) / scale) @ W + b == x @ (W / scale[:, None]) + (b - (mean / scale) @ W)``
+        """
+        w0 = self.kernels[0].astype(np.float64)
+        kernels = [w0 / scale[:, None]] + self.kernels[1:]
+        biases = [self.biases[0] - (mean / scale) @ w0] + self.biases[1:]
+        # float64 by default so the refactored first layer does not add float32
+        # rounding on top of what the exported weights already carry
+        return NumpyMLP(kernels, biases, self.activations, dtype=dtype)
+
+    def save(self, path):
+        arrays = {'activations': np.array(self.activations)}
+        for i, (k, b) in enumerate(zip(self.kernels, self.biases)):
+            arrays[f'kernel_{i}'] = k
+            arrays[f'bias_{i}'] = b
+
+        def write(partial):
+            # a file object, so savez does not append .npz to the temporary name
+            with open(partial, 'wb') as f:
+                np.savez(f, **arrays)
+        _replace_atomically(path, write)
+
+    @classmethod
+    def load(cls, path) -> 'NumpyMLP':
+        with np.load(path) as data:
+            activations = [str(a) for a in data['activations']]
+            kernels = [data[f'kernel_{i}'] for i in range(len(activations))]
+            biases = [data[f'bias_{i}'] for i in range(len(activations))]
+        return cls(kernels, biases, activations)
+
+    def predict_positive(self, X: np.ndarray) -> np.ndarray:
+        h = np.asarray(X, dtype=self.dtype)
+        for kernel, bias, activation in zip(self.kernels, self.biases, self.activations):
+            h = h @ kernel
+            h += bias
+            h = _ACTIVATIONS[activation](h)
+        return h[:, 0].astype(np.float64)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        p = self.predict_positive(X)
+        return np.column_stack([1.0 - p, p])
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return (self.predict_positive(X) > 0.5).astype(int)
+
+    def max_abs_error(self, keras_model, X: np.ndarray) -> float:
+        """Largest deviation from the Keras model on X, for export verification."""
+        expected = np.asarray(keras_model.predict(np.asarray(X, dtype=np.float32), verbose=0)).reshape(-1)
+        return float(np.max(np.abs(self.predict_positive(X) - expected))) if len(expected) else 0.0
+
+
+# Rows per kernel block; bounds the (rows x support vectors) kernel matrix
+SVM_BLOCK_ROWS = 4096
+
+
+class NumpySVM:
+    """RBF ``SVC(probability=True)`` evaluated with BLAS instead of libsvm.
+
+    The kernel between a block of rows and all support vectors is one matrix
+    product, ``exp(-gamma * (|x|^2 + |sv|^2 - 2 x.sv))``. Probabilities follow
+    libsvm exactly: Platt's sigmoid with ``probA_`` / ``probB_`` on the libsvm
+    decision value, clipped to [1e-7, 1 - 1e-7], then libsvm's iterative
+    pairwise coupling, which for two classes stops within 0.0025 of the plain
+    sigmoid rather than returning it (so skipping it would be off by up to
+    ~0.004). ``float32=True`` halves memory traffic for the kernel at a cost
+    of ~1e-6 in the output. ``feature_weights`` turns the distance into
+    ``sum(w * (x - sv)^2)``, which is how ``fold_scaler`` absorbs a
+    StandardScaler.
+
+    ``from_kernel_approximation`` loads a ``Nystroem -> SGDClassifier(log_loss)``
+    pipeline into the same form: the landmarks act as support vectors and
+    the probability is the plain logistic of the decision value
+    (``pairwise_coupling=False``).
+    """
+
+    MIN_PROB = 1e-7
+
+    def __init__(self, support_vectors, dual_coef, intercept: float, gamma: float, prob_a: float,
+                 prob_b: float, float32: bool = False, feature_weights=None, pairwise_coupling: bool = True):
+        self.dtype = np.dtype(np.float32 if float32 else np.float64)
+        self.support_vectors = np.ascontiguousarray(support_vectors, dtype=self.dtype)
+        self.dual_coef = np.ascontiguousarray(np.asarray(dual_coef).reshape(-1), dtype=self.dtype)
+        self.intercept = float(intercept)
+        self.gamma = float(gamma)
+        self.prob_a = float(prob_a)
+        self.prob_b = float(prob_b)
+        self.pairwise_coupling = bool(pairwise_coupling)
+        self.feature_weights = None if feature_weights is None else np.asarray(feature_weights, dtype=self.dtype)
+        self.weighted_sv = (self.support_vectors if self.feature_weights is None
+                            else self.support_vectors * self.feature_weights)
+        self.sv_sq_norms = np.einsum('ij,ij->i', self.weighted_sv, self.support_vectors)
+
+    @classmethod
+    def from_sklearn(cls, model, float32: bool = False) -> 'NumpySVM':
+        if hasattr(model, 'named_steps'):
+            return cls.from_kernel_approximation(model, float32=float32)
+        if getattr(model, 'kernel', None) != 'rbf':
+            raise ValueError("Only RBF-kernel SVC models can be compiled")
+        if len(model.classes_) != 2 or not getattr(model, 'probability', False):
+            raise ValueError("Only binary SVC(probability=True) models can be compiled")
+        return cls(support_vectors=model.support_vectors_, dual_coef=model.dual_coef_[0],
+                   intercept=model.intercept_[0], gamma=model._gamma,
+                   prob_a=model.probA_[0], prob_b=model.probB_[0], float32=float32)
+
+    @classmethod
+    def from_kernel_approximation(cls, pipeline, float32: bool = False) -> 'NumpySVM':
+        """``Pipeline([Nystroem(kernel='rbf'), SGDClassifier(loss='log_loss')])`` as a kernel expansion.
+
+        Nystroem maps ``x`` to ``K(x, landmarks) @ normalization.T``, so the
+        linear model's ``w.phi(x) + b`` equals ``K(x, landmarks) @ alpha + b``
+        with ``alpha = normalization.T @ w``.
+        """
+        if len(pipeline.steps) != 2:
+            raise ValueError("Expected a two-step Nystroem -> linear classifier pipeline")
+        nystroem, linear = (step for _, step in pipeline.steps)
+        if getattr(nystroem, 'kernel', None) != 'rbf' or not hasattr(nystroem, 'normalization_'):
+            raise ValueError("Only fitted RBF Nystroem feature maps can be compiled")
+        if len(linear.classes_) != 2 or getattr(linear, 'loss', None) != 'log_loss':
+            raise ValueError("Only binary log-loss linear classifiers can be compiled")
+        gamma = nystroem.gamma if nystroem.gamma is not None else 1.0 / nystroem.components_.shape[1]
+        return cls(support_vectors=nystroem.components_, dual_coef=nystroem.normalization_.T @ linear.coef_[0],
+                   intercept=linear.intercept_[0], gamma=gamma, prob_a=-1.0, prob_b=0.0, float32=float32,
+                   pairwise_coupling=False)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            'support_vectors': self.support_vectors.astype(np.float64),
+            'dual_coef': self.dual_coef.astype(np.float64),
+            'intercept': np.array(self.intercept),
+            'gamma': np.array(self.gamma),
+            'prob_a': np.array(self.prob_a),
+            'prob_b': np.array(self.prob_b),
+            'pairwise_coupling': np.array(self.pairwise_coupling),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], float32: bool = False) -> 'NumpySVM':
+        return cls(support_vectors=arrays['support_vectors'], dual_coef=arrays['dual_coef'],
+                   intercept=float(arrays['intercept']), gamma=float(arrays['gamma']),
+                   prob_a=float(arrays['prob_a']), prob_b=float(arrays['prob_b']), float32=float32,
+                   pairwise_coupling=bool(arrays.get('pairwise_coupling', True)))
+
+    def fold_scaler(self, mean: np.ndarray, scale: np.ndarray, dtype=np.float64) -> 'NumpySVM':
+        """Copy that takes unscaled input.
+
+        ``|(x - mean) / scale - sv|^2 == sum((x - (mean + scale * sv))^2 / scale^2)``,
+        so support vectors move to raw units and 1 / scale^2 becomes the
+        per-feature distance weight. Float32 input (``dtype``) switches the
+        kernel to float32 as well; float64 keeps this SVM's precision.
+        """
+        svm = NumpySVM(support_vectors=mean + scale * self.support_vectors.astype(np.float64),
+                       dual_coef=self.dual_coef, intercept=self.intercept, gamma=self.gamma,
+                       prob_a=self.prob_a, prob_b=self.prob_b,
+                       float32=self.dtype == np.float32 or np.dtype(dtype) == np.float32,
+                       feature_weights=1.0 / (scale * scale), pairwise_coupling=self.pairwise_coupling)
+        return svm
+
+    def decision_function(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=self.dtype)
+        out = np.empty(X.shape[0], dtype=np.float64)
+        for start in range(0, X.shape[0], SVM_BLOCK_ROWS):
+            block = X[start:start + SVM_BLOCK_ROWS]
+            sq_dist = block @ self.weighted_sv.T
+            sq_dist *= -2
+            if self.feature_weights is None:
+                sq_dist += np.einsum('ij,ij->i', block, block)[:, None]
+            else:
+                sq_dist += ((block * block) @ self.feature_weights)[:, None]
+            sq_dist += self.sv_sq_norms
+            np.maximum(sq_dist, 0, out=sq_dist)
+            sq_dist *= -self.gamma
+            kernel = np.exp(sq_dist, out=sq_dist)
+            out[start:start + block.shape[0]] = kernel @ self.dual_coef
+        out += self.intercept
+        return out
+
+    def predict_positive(self, X: np.ndarray) -> np.ndarray:
+        if not self.pairwise_coupling:
+            # logistic link of a kernel-approximation linear model, as SGDClassifier.predict_proba
+            return expit(self.decision_function(X))
+        # libsvm's decision value has the opposite sign of sklearn's for binary SVC
+        f_apb = -self.decision_function(X) * self.prob_a + self.prob_b
+        with np.errstate(over='ignore'):
+            r01 = np.where(f_apb >= 0, np.exp(-f_apb) / (1.0 + np.exp(-f_apb)), 1.0 / (1 + np.exp(f_apb)))
+        r01 = np.minimum(np.maximum(r01, self.MIN_PROB), 1 - self.MIN_PROB)
+        return 1.0 - _pairwise_coupling_two_class(r01)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        p = self.predict_positive(X)
+        return np.column_stack([1.0 - p, p])
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return (self.decision_function(X) > 0).astype(int)
+
+
+def _pairwise_coupling_two_class(r01: np.ndarray) -> np.ndarray:
+    """libsvm ``multiclass_probability`` for k=2, vectorized across rows.
+
+    Same update order, eps=0.005/k and max_iter=100 as the C loop (see
+    ``_pairwise_coupling_one``), so results match ``SVC.predict_proba`` to
+    rounding error. Rows that have converged are frozen while the others keep
+    iterating. Tiny inputs use the scalar version, which avoids the per-call
+    overhead of ~20 small array operations per iteration.
+    """
+    if r01.shape[0] <= 8:
+        return np.array([_pairwise_coupling_one(r) for r in r01.tolist()], dtype=np.float64)
+    r10 = 1 - r01
+    q = ((r10 * r10, -r10 * r01), (-r10 * r01, r01 * r01))
+    p = [np.full_like(r01, 0.5), np.full_like(r01, 0.5)]
+    active = np.ones(r01.shape, dtype=bool)
+    for _ in range(100):
+        qp = [q[0][0] * p[0] + q[0][1] * p[1], q[1][0] * p[0] + q[1][1] * p[1]]
+        pqp = p[0] * qp[0] + p[1] * qp[1]
+        active &= np.maximum(np.abs(qp[0] - pqp), np.abs(qp[1] - pqp)) >= 0.005 / 2
+        if not active.any():
+            break
+        new_p = list(p)
+        for t in range(2):
+            diff = (-qp[t] + pqp) / q[t][t]
+            new_p[t] = new_p[t] + diff
+            pqp = (pqp + diff * (diff * q[t][t] + 2 * qp[t])) / (1 + diff) / (1 + diff)
+            for j in range(2):
+                qp[j] = (qp[j] + diff * q[t][j]) / (1 + diff)
+                new_p[j] = new_p[j] / (1 + diff)
+        p = [np.where(active, new_p[j], p[j]) for j in range(2)]
+    return p[0]
+
+
+def _pairwise_coupling_one(r01: float) -> float:
+    """Direct transliteration of libsvm's ``multiclass_probability`` for k=2."""
+    r10 = 1 - r01
+    q = ((r10 * r10, -r10 * r01), (-r10 * r01, r01 * r01))
+    p = [0.5, 0.5]
+    for _ in range(100):
+        qp = [q[0][0] * p[0] + q[0][1] * p[1], q[1][0] * p[0] + q[1][1] * p[1]]
+        pqp = p[0] * qp[0] + p[1] * qp[1]
+        if max(abs(qp[0] - pqp), abs(qp[1] - pqp)) < 0.005 / 2:
+            break
+        for t in range(2):
+            diff = (-qp[t] + pqp) / q[t][t]
+            p[t] += diff
+            pqp = (pqp + diff * (diff * q[t][t] + 2 * qp[t])) / (1 + diff) / (1 + diff)
+            for j in range(2):
+                qp[j] = (qp[j] + diff * q[t][j]) / (1 + diff)
+                p[j] /= (1 + diff)
+    return p[0]
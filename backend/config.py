@@ -3,6 +3,14 @@
 import os
 from pathlib import Path
 
+
+def _env_bool(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
 # Base directory
 BASE_DIR = Path(__file__).resolve().parent
 
@@ -10,7 +18,8 @@ BASE_DIR = Path(__file__).resolve().parent
 MODEL_DIR = os.path.join(BASE_DIR, "models")
 SCALER_PATH = os.path.join(MODEL_DIR, "scaler.pkl")
 
-# Model weights for ensemble
+# Fallback ensemble weights, used when models/ensemble.json (the blend the
+# trainer fits on out-of-fold predictions) is missing
 ENSEMBLE_WEIGHTS = {
     'svm': 0.25,
     'random_forest': 0.25,
@@ -25,11 +34,110 @@ RISK_THRESHOLDS = {
     'high': 1.0
 }
 
+# Input schema: the single source of valid ranges for every feature, used by
+# main.PatientData, validation.validate_columns and
+# DataPreprocessor.validate_input. Order matches the model input columns.
+FEATURE_SCHEMA = {
+    'age':      {'type': float, 'ge': 0,   'le': 120},
+    'sex':      {'type': int,   'ge': 0,   'le': 1},
+    'cp':       {'type': int,   'ge': 0,   'le': 3},
+    'trestbps': {'type': float, 'ge': 50,  'le': 300},
+    'chol':     {'type': float, 'ge': 50,  'le': 1000},
+    'fbs':      {'type': int,   'ge': 0,   'le': 1},
+    'restecg':  {'type': int,   'ge': 0,   'le': 2},
+    'thalach':  {'type': float, 'ge': 20,  'le': 300},
+    'exang':    {'type': int,   'ge': 0,   'le': 1},
+    'oldpeak':  {'type': float, 'ge': 0.0, 'le': 10.0},
+    'slope':    {'type': int,   'ge': 0,   'le': 2},
+    'ca':       {'type': int,   'ge': 0,   'le': 4},
+    'thal':     {'type': int,   'ge': 0,   'le': 3},
+}
+
 # Feature names
-FEATURE_NAMES = [
-    'age', 'sex', 'cp', 'trestbps', 'chol', 'fbs', 'restecg',
-    'thalach', 'exang', 'oldpeak', 'slope', 'ca', 'thal'
-]
+FEATURE_NAMES = list(FEATURE_SCHEMA)
+
+# Score the RF / GB models with compiled_models.CompiledForest instead of
+# sklearn's predict_proba (identical probabilities, far lower per-call cost)
+COMPILED_TREES = _env_bool("CVD_COMPILED_TREES", True)
+
+# Score the SVM with compiled_models.NumpySVM (batched BLAS kernel +
+# libsvm-exact Platt scaling); SVM_FLOAT32 computes the kernel in float32
+COMPILED_SVM = _env_bool("CVD_COMPILED_SVM", True)
+SVM_FLOAT32 = _env_bool("CVD_SVM_FLOAT32", False)
+
+# dtype of the feature matrices requests are assembled into (features.py) and
+# that the compiled models are folded to take. float32 halves the matrices and
+# runs the folded MLP and SVM in float32 (~1e-6), but a value float32 cannot
+# hold, such as oldpeak=2.3, may fall on the other side of a tree split. So
+# each model version is checked on probe patients at load: if any probability
+# moves by more than FLOAT32_TOLERANCE, or any risk level changes, against
+# float64 scoring, that version is served in float64 (exact) instead
+FEATURE_DTYPE = os.getenv("CVD_FEATURE_DTYPE", "float32").strip().lower()
+if FEATURE_DTYPE not in ("float32", "float64"):
+    raise ValueError(f"CVD_FEATURE_DTYPE must be float32 or float64, got {FEATURE_DTYPE!r}")
+FLOAT32_TOLERANCE = float(os.getenv("CVD_FLOAT32_TOLERANCE", "5e-5"))
+
+# Neural network runtime: "numpy" serves nn_weights.npz through
+# compiled_models.NumpyMLP without importing TensorFlow; "keras" loads
+# nn_model.h5 (kept for verification)
+NN_BACKEND = os.getenv("CVD_NN_BACKEND", "numpy").strip().lower()
+
+# Cascaded scoring for /predict and /batch-predict: the first-stage models of
+# models/cascade.json score every patient and the rest run only when their
+# contribution could still change the risk level (see cascade.py); requests
+# override it with ?cascade=true|false
+CASCADE_ENABLED = _env_bool("CVD_CASCADE", False)
+
+# explain=true on /predict and /batch-predict (see explain.py): a request
+# stops starting new rows once EXPLAIN_BUDGET_MS is spent and the rest come
+# back without an explanation; the SVM and MLP are explained against the
+# first EXPLAIN_BACKGROUND_ROWS reference patients of models/background.joblib
+EXPLAIN_BUDGET_MS = float(os.getenv("CVD_EXPLAIN_BUDGET_MS", "250"))
+EXPLAIN_BACKGROUND_ROWS = int(os.getenv("CVD_EXPLAIN_BACKGROUND_ROWS", "8"))
+
+# Request coalescing for /predict: concurrent single predictions are
+# collected for up to COALESCE_WINDOW_MS (or COALESCE_MAX_BATCH requests)
+# and scored in one vectorized ensemble pass
+COALESCE_ENABLED = _env_bool("CVD_COALESCE_ENABLED", False)
+COALESCE_WINDOW_MS = float(os.getenv("CVD_COALESCE_WINDOW_MS", "2"))
+COALESCE_MAX_BATCH = int(os.getenv("CVD_COALESCE_MAX_BATCH", "64"))
+
+# Inference thread pool: INFERENCE_WORKERS tasks run at once and up to
+# INFERENCE_MAX_QUEUE more may wait; beyond that requests get a 503
+INFERENCE_WORKERS = int(os.getenv("CVD_INFERENCE_WORKERS", str(min(4, os.cpu_count() or 1))))
+INFERENCE_MAX_QUEUE = int(os.getenv("CVD_INFERENCE_MAX_QUEUE", "32"))
+
+# Rows parsed, validated and scored per chunk by /upload-csv/stream
+STREAM_CHUNK_ROWS = int(os.getenv("CVD_STREAM_CHUNK_ROWS", "1000"))
+
+# Per-patient result cache in front of /predict and /batch-predict: LRU
+# bounded to PREDICTION_CACHE_SIZE rows (0 disables), entries expire after
+# PREDICTION_CACHE_TTL_SECONDS (0 = never); cleared whenever models reload
+PREDICTION_CACHE_SIZE = int(os.getenv("CVD_CACHE_SIZE", "4096"))
+PREDICTION_CACHE_TTL_SECONDS = float(os.getenv("CVD_CACHE_TTL_SECONDS", "300"))
+
+# Model loading: BACKGROUND_LOAD starts serving immediately (scoring answers
+# 503 and /ready reports not-ready until the ensemble is built); artifacts
+# load on MODEL_LOAD_WORKERS threads; MMAP_MODELS memory-maps the array
+# exports read-only so worker processes share their pages
+BACKGROUND_LOAD = _env_bool("CVD_BACKGROUND_LOAD", True)
+MODEL_LOAD_WORKERS = int(os.getenv("CVD_MODEL_LOAD_WORKERS", "4"))
+MMAP_MODELS = _env_bool("CVD_MMAP_MODELS", True)
+
+# Hot reload: poll MODEL_DIR every MODEL_WATCH_SECONDS (0 = off) and swap in
+# new artifacts once they stop changing; POST /admin/reload does the same on
+# demand, requires the X-Admin-Token header and is disabled (403) while
+# ADMIN_TOKEN is unset
+MODEL_WATCH_SECONDS = float(os.getenv("CVD_MODEL_WATCH_SECONDS", "0"))
+ADMIN_TOKEN = os.getenv("CVD_ADMIN_TOKEN") or None
+
+# Warm-up before a model version goes live (startup and every reload): each
+# batch size is scored WARMUP_ROUNDS times with synthetic in-range rows so
+# lazy initialisation is paid before the first real request. An empty
+# CVD_WARMUP_BATCH_SIZES skips the warm-up but still scores one probe row
+# once, so a broken artifact set fails before it replaces a working one
+WARMUP_BATCH_SIZES = [int(s) for s in os.getenv("CVD_WARMUP_BATCH_SIZES", "1,16,256").split(",") if s.strip()]
+WARMUP_ROUNDS = int(os.getenv("CVD_WARMUP_ROUNDS", "2"))
 
 # API settings
 API_TITLE = "CVD Detection System"
@@ -0,0 +1,228 @@
+"""Fused scaler + four-model + weighted-blend scorer for the API hot path"""
+
+import json
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+from scipy.special import expit
+
+
+@dataclass(frozen=True)
+class Blend:
+    """How per-model probabilities combine: ``link(intercept + sum(weights[m] * p_m))``.
+
+    ``link`` is ``identity`` for a weighted average and ``logistic`` for a
+    logistic-regression meta-learner. The trainer fits it on out-of-fold
+    probabilities and saves it as ``models/ensemble.json``; ``info`` carries
+    how it was fitted and is only reported, never used for scoring.
+    """
+    weights: Dict[str, float]
+    intercept: float = 0.0
+    link: str = 'identity'
+    info: Dict = field(default_factory=dict)
+
+    LINKS = ('identity', 'logistic')
+
+    def __post_init__(self):
+        if self.link not in self.LINKS:
+            raise ValueError(f"Unknown blend link {self.link!r}; expected one of {self.LINKS}")
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Blend':
+        return cls(weights={name: float(w) for name, w in data['weights'].items()},
+                   intercept=float(data.get('intercept', 0.0)), link=data.get('link', 'identity'),
+                   info=dict(data.get('info', {})))
+
+    def to_dict(self) -> Dict:
+        return {'weights': dict(self.weights), 'intercept': self.intercept, 'link': self.link, 'info': self.info}
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> 'Blend':
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def save(self, path: Union[str, Path]):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def combine(self, per_model: np.ndarray, model_names: Sequence[str], out: Optional[np.ndarray] = None):
+        """Blend an (n, len(model_names)) probability matrix; names missing from ``weights`` count 0."""
+        weights = np.array([self.weights.get(name, 0.0) for name in model_names], dtype=np.float64)
+        out = np.dot(per_model, weights, out=out)
+        if self.intercept:
+            out += self.intercept
+        if self.link == 'logistic':
+            expit(out, out=out)
+        return out
+
+
+@dataclass
+class EnsembleOutput:
+    """Output buffers for ``CompiledEnsemble.predict``.
+
+    ``per_model[:, j]`` holds P(class=1) of ``model_names[j]`` and
+    ``ensemble`` the blend. Allocate once with
+    ``CompiledEnsemble.allocate`` and reuse across calls of up to
+    ``capacity`` rows; ``predict`` returns views trimmed to the batch size.
+    """
+    model_names: Sequence[str]
+    per_model: np.ndarray
+    ensemble: np.ndarray
+
+    @property
+    def capacity(self) -> int:
+        return self.ensemble.shape[0]
+
+    def view(self, n: int) -> 'EnsembleOutput':
+        return EnsembleOutput(self.model_names, self.per_model[:n], self.ensemble[:n])
+
+    def model_probabilities(self) -> Dict[str, np.ndarray]:
+        return {name: self.per_model[:, j] for j, name in enumerate(self.model_names)}
+
+
+class CompiledEnsemble:
+    """Scores raw (unscaled) feature matrices with every model and blends them.
+
+    Built once from the loaded models, scaler and ``Blend`` (a plain weights
+    dict is a weighted average). StandardScaler's
+    ``mean_`` / ``scale_`` are folded into the first stage of every model
+    that supports it (``fold_scaler`` on the compiled_models classes), so the
+    common case never materialises a scaled copy of the input. Models that
+    cannot fold (sklearn / Keras / mocks) share one scaled matrix computed
+    with ``scaler.transform``; a failure there is raised, never skipped.
+
+    Folded stages take ``input_dtype`` (float64 unless asked otherwise), so a
+    C-contiguous matrix of that dtype reaches each of them as is; any other
+    input is converted once per call, not once per model.
+
+    ``observe_stage(stage, seconds, model)`` is called with the time spent
+    scaling, in each model and blending when given (see ``metrics``).
+    """
+
+    def __init__(self, models: Dict[str, object], blend: Union[Blend, Dict[str, float]], scaler=None,
+                 observe_stage: Optional[Callable[..., None]] = None, input_dtype=np.float64):
+        self.blend = blend if isinstance(blend, Blend) else Blend(weights=dict(blend))
+        weights = self.blend.weights
+        # blend in weight order so the dot product sums in the same order as before
+        self.model_names: List[str] = ([k for k in weights if k in models]
+                                       + [k for k in models if k not in weights])
+        self.weights = np.array([weights.get(name, 0.0) for name in self.model_names], dtype=np.float64)
+        self.intercept = self.blend.intercept
+        self.logistic = self.blend.link == 'logistic'
+        self.scaler = scaler
+        self.observe_stage = observe_stage
+        self.input_dtype = np.dtype(input_dtype)
+        mean, scale = self._scaler_params(scaler)
+
+        self.stages = []  # (model, takes_raw_input)
+        for name in self.model_names:
+            model = models[name]
+            if mean is not None and hasattr(model, 'fold_scaler'):
+                self.stages.append((model.fold_scaler(mean, scale, dtype=self.input_dtype), True))
+            elif scaler is None:
+                self.stages.append((model, True))
+            else:
+                self.stages.append((model, False))
+        self.needs_scaled_input = not all(raw for _, raw in self.stages)
+
+    @staticmethod
+    def _scaler_params(scaler):
+        """(mean, scale) of a StandardScaler-like object, identity for none."""
+        if scaler is None:
+            return None, None
+        if not (hasattr(scaler, 'mean_') and hasattr(scaler, 'scale_') and hasattr(scaler, 'with_mean')):
+            return None, None
+        n_features = scaler.n_features_in_
+        mean = scaler.mean_ if scaler.with_mean else None
+        scale = scaler.scale_ if scaler.with_std else None
+        mean = np.zeros(n_features) if mean is None else np.asarray(mean, dtype=np.float64)
+        scale = np.ones(n_features) if scale is None else np.asarray(scale, dtype=np.float64)
+        return mean, scale
+
+    def allocate(self, n: int) -> EnsembleOutput:
+        return EnsembleOutput(model_names=self.model_names,
+                              per_model=np.empty((n, len(self.model_names)), dtype=np.float64),
+                              ensemble=np.empty(n, dtype=np.float64))
+
+    def predict(self, X: np.ndarray, out: Optional[EnsembleOutput] = None) -> EnsembleOutput:
+        """Score an (n, 13) raw feature matrix into ``out`` (allocated if None)."""
+        X = np.ascontiguousarray(X, dtype=self.input_dtype)
+        n = X.shape[0]
+        if out is None or out.capacity < n:
+            out = self.allocate(n)
+        out = out.view(n)
+        if n == 0:
+            return out
+
+        observe = self.observe_stage
+        if observe is None:
+            scaled = self.scaler.transform(X) if self.needs_scaled_input else None
+            for j, (model, raw_input) in enumerate(self.stages):
+                out.per_model[:, j] = positive_probability(model, X if raw_input else scaled)
+            self._blend(out)
+            return out
+
+        clock = time.perf_counter
+        scaled = None
+        if self.needs_scaled_input:
+            started = clock()
+            scaled = self.scaler.transform(X)
+            observe('scaling', clock() - started)
+        for j, (model, raw_input) in enumerate(self.stages):
+            started = clock()
+            out.per_model[:, j] = positive_probability(model, X if raw_input else scaled)
+            observe('model', clock() - started, self.model_names[j])
+        started = clock()
+        self._blend(out)
+        observe('blending', clock() - started)
+        return out
+
+    def score_models(self, X: np.ndarray, columns: Sequence[int]) -> np.ndarray:
+        """(n, len(columns)) P(class=1) from only the models at ``columns`` of ``model_names``."""
+        X = np.ascontiguousarray(X, dtype=self.input_dtype)
+        proba = np.empty((X.shape[0], len(columns)), dtype=np.float64)
+        scaled = None
+        if any(not self.stages[j][1] for j in columns):
+            scaled = self.scaler.transform(X)
+        observe = self.observe_stage
+        clock = time.perf_counter
+        for k, j in enumerate(columns):
+            model, raw_input = self.stages[j]
+            started = clock()
+            proba[:, k] = positive_probability(model, X if raw_input else scaled)
+            if observe is not None:
+                observe('model', clock() - started, self.model_names[j])
+        return proba
+
+    def link(self, score: np.ndarray) -> np.ndarray:
+        """The blend's link applied to linear scores ``intercept + weights @ p``."""
+        return expit(score) if self.logistic else score
+
+    def blend_scores(self, per_model: np.ndarray) -> np.ndarray:
+        """Blend an (n, len(model_names)) probability matrix as ``predict`` does."""
+        out = np.dot(per_model, self.weights)
+        if self.intercept:
+            out += self.intercept
+        return self.link(out)
+
+    def _blend(self, out: EnsembleOutput):
+        # Blend.combine inlined with the precomputed weight vector: one dot, plus
+        # an add and an in-place expit for a logistic meta-learner
+        np.dot(out.per_model, self.weights, out=out.ensemble)
+        if self.intercept:
+            out.ensemble += self.intercept
+        if self.logistic:
+            expit(out.ensemble, out=out.ensemble)
+
+
+def positive_probability(model, X: np.ndarray) -> np.ndarray:
+    """P(class=1) per row from any of the model types the API can load."""
+    if hasattr(model, 'predict_positive'):
+        return model.predict_positive(X)
+    if hasattr(model, 'predict_proba'):
+        return np.asarray(model.predict_proba(X), dtype=float)[:, 1]
+    # models that only implement predict (e.g. Keras, shape (n, 1))
+    return np.asarray(model.predict(X), dtype=float).reshape(X.shape[0], -1)[:, 0]
@@ -0,0 +1,67 @@
+"""Bounded thread pool that keeps CPU-bound inference off the event loop"""
+
+import asyncio
+import threading
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the inference pool has no free slot for another task."""
+
+
+class InferenceExecutor(Executor):
+    """Thread pool with a hard cap on running + queued tasks.
+
+    ``max_workers`` tasks run concurrently and at most ``max_queue`` more may
+    wait for a worker. ``submit`` fails fast with ``QueueFullError`` beyond
+    that instead of letting the backlog (and request latency) grow without
+    bound. NumPy, scikit-learn and TensorFlow release the GIL in their heavy
+    kernels, so threads give real parallelism while sharing one copy of the
+    models.
+    """
+
+    def __init__(self, max_workers: int = 4, max_queue: int = 32):
+        if max_workers < 1:
+            raise ValueError("max_workers must be >= 1")
+        self.max_workers = max_workers
+        self.max_queue = max(max_queue, 0)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cvd-inference")
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        if not self._slots.acquire(blocking=False):
+            raise QueueFullError(f"Inference queue is full ({self.capacity} tasks pending)")
+        with self._lock:
+            self._in_flight += 1
+        try:
+            future = self._pool.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, _future):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    async def run(self, fn, *args, **kwargs):
+        """Submit ``fn`` and await its result from a coroutine."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stats(self) -> dict:
+        return {"workers": self.max_workers, "capacity": self.capacity, "in_flight": self._in_flight}
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        self._pool.shutdown(wait=wait, cancel_futures=cancel_futures)
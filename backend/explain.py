@@ -0,0 +1,249 @@
+"""Per-feature contributions to the ensemble probability for ``explain=true``"""
+
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from scipy.special import expit
+
+from compiled_models import CompiledForest
+from ensemble import positive_probability
+
+# Elements of the (rows, leaves, slots, quadrature points) TreeSHAP tensor per block
+TREE_SHAP_BLOCK_ELEMENTS = 1 << 21
+# Rows explained between two checks of the latency budget
+EXPLAIN_CHUNK_ROWS = 16
+
+
+class TreeShap:
+    """Path-dependent TreeSHAP of a ``CompiledForest``, vectorized over rows and leaves.
+
+    Each leaf is kept as its root path: one slot per distinct feature split on
+    the way down, holding the interval of that feature the path admits and
+    ``z``, the share of the training cover that follows the path at those
+    splits. For a row, ``o`` is 1 in slots whose interval holds its value. The
+    leaf adds ``value * (o_i - z_i) * integral_0^1 prod_{j != i}(z_j + (o_j - z_j) t) dt``
+    to the feature in slot i, which is the Shapley-weighted sum over subsets of
+    the other slots (Lundberg et al.'s EXTEND/UNWIND, in integral form). The
+    integrand is a polynomial of degree below the slot count, so a
+    Gauss-Legendre rule with half as many points integrates it exactly.
+
+    Values are in the forest's raw output: probability for a random forest,
+    log-odds for gradient boosting. Needs the node ``cover`` of the export.
+    """
+
+    def __init__(self, forest: CompiledForest):
+        if forest.cover is None:
+            raise ValueError("Forest export has no node cover; re-export it to explain it with TreeSHAP")
+        self.forest = forest
+        cover = forest.cover
+        leaves = []  # (value, {feature: (low, high, z)})
+        expected = 0.0
+        for root in forest.roots:
+            stack = [(int(root), {})]
+            while stack:
+                node, path = stack.pop()
+                left, right = int(forest.left[node]), int(forest.right[node])
+                if left == node:
+                    leaves.append((forest.value[node], path))
+                    expected += forest.value[node] * cover[node] / cover[root]
+                    continue
+                feature, threshold = int(forest.feature[node]), forest.threshold[node]
+                low, high, z = path.get(feature, (-np.inf, np.inf, 1.0))
+                parent = cover[node] or 1.0
+                stack.append((left, {**path, feature: (low, min(high, threshold), z * cover[left] / parent)}))
+                stack.append((right, {**path, feature: (max(low, threshold), high, z * cover[right] / parent)}))
+
+        slots = max(1, max(len(path) for _, path in leaves))
+        n_leaves = len(leaves)
+        # padding slots admit everything with z = 1: a factor of 1 and no contribution
+        self.slot_feature = np.zeros((n_leaves, slots), dtype=np.intp)
+        self.low = np.full((n_leaves, slots), -np.inf)
+        self.high = np.full((n_leaves, slots), np.inf)
+        self.z = np.ones((n_leaves, slots))
+        self.value = np.array([value for value, _ in leaves], dtype=np.float64)
+        for l, (_, path) in enumerate(leaves):
+            for s, (feature, (low, high, z)) in enumerate(path.items()):
+                self.slot_feature[l, s] = feature
+                self.low[l, s], self.high[l, s], self.z[l, s] = low, high, z
+        # slot -> feature as a matrix, so the scatter-add over leaves is one product
+        self.slot_onehot = np.zeros((n_leaves * slots, forest.n_features))
+        self.slot_onehot[np.arange(n_leaves * slots), self.slot_feature.ravel()] = 1.0
+
+        # Gauss-Legendre on [0, 1]; per leaf, slot and point the factor is a1 where
+        # the row follows the path and a0 where it does not. The product over
+        # slots is taken in logs, so it becomes a (rows x slots) @ (slots x points)
+        # product per leaf, and so does the sum over points of product / factor
+        points, weights = np.polynomial.legendre.leggauss(max(1, (slots + 1) // 2))
+        t = (points + 1) / 2
+        self.weights = weights / 2
+        z = np.maximum(self.z, 1e-12)[:, None, :]
+        a1 = z + (1 - z) * t[None, :, None]  # (leaves, points, slots)
+        a0 = z * (1 - t)[None, :, None]
+        self.inv_a1, self.inv_a0 = 1 / a1, 1 / a0
+        self.log_a0 = np.log(a0).sum(axis=2)[:, None, :]  # (leaves, 1, points)
+        self.log_ratio = np.ascontiguousarray((np.log(a1) - np.log(a0)).transpose(0, 2, 1))  # (leaves, slots, points)
+        if forest.kind == 'random_forest':
+            self.value /= forest.n_trees
+            self.expected_value = expected / forest.n_trees
+        else:
+            self.expected_value = forest.init + expected
+
+    def explain(self, X: np.ndarray) -> np.ndarray:
+        """(n, n_features) contributions; each row sums to its raw output minus ``expected_value``"""
+        X = np.ascontiguousarray(X, dtype=self.forest.input_dtype)
+        n = X.shape[0]
+        out = np.empty((n, self.forest.n_features), dtype=np.float64)
+        step = max(1, TREE_SHAP_BLOCK_ELEMENTS // self.inv_a1.size)
+        low, high, z = self.low[:, None, :], self.high[:, None, :], self.z[:, None, :]
+        value = self.value[:, None, None]
+        for start in range(0, n, step):
+            block = X[start:start + step]
+            x = block[:, self.slot_feature].transpose(1, 0, 2)  # (leaves, rows, slots)
+            follows = (x > low) & (x <= high)
+            o = follows.astype(np.float64)
+            product = np.exp(o @ self.log_ratio + self.log_a0)
+            product *= self.weights
+            shapley = np.where(follows, product @ self.inv_a1, product @ self.inv_a0)
+            contrib = (o - z) * shapley * value
+            out[start:start + block.shape[0]] = contrib.transpose(1, 0, 2).reshape(block.shape[0], -1) @ self.slot_onehot
+        return out
+
+
+class PermutationShap:
+    """Sampled Shapley values of any model, walking from background rows to the input.
+
+    Each background row is paired with a fixed random feature order and its
+    reverse. Along an order, features switch from the background value to the
+    row's one at a time and each switch is credited with the change in the
+    output, so a walk's credits add up to ``f(x) - f(background)`` exactly;
+    the result averages the walks. All ``walks * n_features`` inputs of a
+    batch are scored in one call of ``predict``, and the background outputs
+    are computed once here.
+    """
+
+    def __init__(self, predict: Callable[[np.ndarray], np.ndarray], background: np.ndarray, seed: int = 0):
+        self.predict = predict
+        background = np.atleast_2d(np.asarray(background, dtype=np.float64))
+        n_features = background.shape[1]
+        rng = np.random.default_rng(seed)
+        orders = []
+        for _ in range(len(background)):
+            order = rng.permutation(n_features)
+            orders += [order, order[::-1]]
+        self.orders = np.array(orders)
+        self.starts = np.repeat(background, 2, axis=0)
+        # steps[w, s, f]: feature f has switched to the input after s + 1 steps of walk w
+        rank = np.argsort(self.orders, axis=1)
+        self.steps = rank[:, None, :] <= np.arange(n_features)[None, :, None]
+        self.rank = rank
+        self.start_values = np.asarray(predict(self.starts), dtype=np.float64)
+        self.expected_value = float(self.start_values.mean())
+
+    def explain(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64)
+        n, n_features = X.shape
+        walks = len(self.orders)
+        inputs = np.where(self.steps[None], X[:, None, None, :], self.starts[None, :, None, :])
+        values = np.asarray(self.predict(inputs.reshape(-1, n_features)), dtype=np.float64)
+        values = values.reshape(n, walks, n_features)
+        credits = np.diff(values, axis=2, prepend=np.broadcast_to(self.start_values[None, :, None], (n, walks, 1)))
+        # step s switched feature orders[w, s]; gather the credits back into feature order
+        by_feature = np.take_along_axis(credits, np.broadcast_to(self.rank[None], credits.shape), axis=2)
+        return by_feature.mean(axis=1)
+
+
+def _rescale(delta: np.ndarray, before: np.ndarray, after: np.ndarray, slope: np.ndarray) -> np.ndarray:
+    """Per-row factor mapping contributions that sum to ``delta`` onto ``after - before``.
+
+    The rescale rule for a monotone link: exact additivity in the output
+    space, with the link's slope where ``delta`` is too small to divide by.
+    """
+    tiny = np.abs(delta) < 1e-12
+    return np.where(tiny, slope, (after - before) / np.where(tiny, 1.0, delta))
+
+
+class EnsembleExplainer:
+    """Per-feature contributions to the ensemble probability of a ``CompiledEnsemble``.
+
+    Compiled forests with node cover use ``TreeShap``; every other model
+    (SVM, MLP, uncompiled estimators) uses ``PermutationShap`` against
+    ``background``, the reference patients the trainer saves (raw units).
+    Gradient-boosting log-odds and a logistic blend are mapped to
+    probability with the rescale rule, so each row's contributions add up to
+    ``ensemble_probability - base_value`` exactly (up to float rounding) in
+    ``contributions``. ``explain`` rounds the base value and every
+    contribution to 4 decimals, like the probabilities in the response, so
+    its 13 numbers can miss the rounded probability by up to ~8e-4.
+
+    Everything that does not depend on the request (leaf path tables,
+    background outputs) is built once per model version. ``explain`` works
+    through the batch in chunks and stops starting new ones after
+    ``budget_seconds``; rows it did not reach get None.
+    """
+
+    def __init__(self, ensemble, background: np.ndarray, feature_names: Sequence[str], budget_seconds: float,
+                 chunk_rows: int = EXPLAIN_CHUNK_ROWS):
+        self.ensemble = ensemble
+        self.feature_names = list(feature_names)
+        self.budget_seconds = budget_seconds
+        self.chunk_rows = chunk_rows
+        self.background = np.atleast_2d(np.asarray(background, dtype=np.float64))
+        self.explainers, self.methods = [], {}
+        for j, name in enumerate(ensemble.model_names):
+            model, raw_input = ensemble.stages[j]
+            if isinstance(model, CompiledForest) and model.cover is not None:
+                # boosting explains log-odds, mapped to probability per row
+                self.explainers.append((TreeShap(model), raw_input, model.kind == 'gradient_boosting'))
+                self.methods[name] = 'tree_shap'
+            else:
+                background = self.background if raw_input else ensemble.scaler.transform(self.background)
+                self.explainers.append((PermutationShap(lambda X, m=model: positive_probability(m, X), background),
+                                        raw_input, False))
+                self.methods[name] = 'permutation'
+
+    def explain(self, X: np.ndarray, per_model: np.ndarray) -> List[Optional[Dict]]:
+        """One explanation dict (or None past the budget) per row of the (n, 13) raw ``X``.
+
+        ``per_model`` is ``EnsembleOutput.per_model`` for the same rows.
+        """
+        started = time.perf_counter()
+        n = X.shape[0]
+        explained = []
+        for start in range(0, n, self.chunk_rows):
+            if start and time.perf_counter() - started > self.budget_seconds:
+                break
+            explained += self._explain_block(X[start:start + self.chunk_rows],
+                                             per_model[start:start + self.chunk_rows])
+        return explained + [None] * (n - len(explained))
+
+    def _explain_block(self, X: np.ndarray, per_model: np.ndarray) -> List[Dict]:
+        base, score = self.contributions(X, per_model)
+        names = self.feature_names
+        return [{'base_value': round(b, 4), 'contributions': dict(zip(names, np.round(row, 4).tolist())),
+                 'methods': self.methods}
+                for b, row in zip(base.tolist(), score)]
+
+    def contributions(self, X: np.ndarray, per_model: np.ndarray):
+        """(base value per row, (n, 13) contributions) for the raw ``X``, unrounded"""
+        ensemble = self.ensemble
+        scaled = None
+        score = np.zeros(X.shape, dtype=np.float64)
+        base = np.full(X.shape[0], ensemble.intercept, dtype=np.float64)
+        for j, (explainer, raw_input, log_odds) in enumerate(self.explainers):
+            if not raw_input and scaled is None:
+                scaled = ensemble.scaler.transform(X)
+            phi = explainer.explain(X if raw_input else scaled)
+            model_base = np.full(X.shape[0], explainer.expected_value)
+            if log_odds:
+                p, p_base = per_model[:, j], expit(model_base)
+                phi *= _rescale(phi.sum(axis=1), p_base, p, p_base * (1 - p_base))[:, None]
+                model_base = p_base
+            score += ensemble.weights[j] * phi
+            base += ensemble.weights[j] * model_base
+        if ensemble.logistic:
+            p_base = expit(base)
+            score *= _rescale(score.sum(axis=1), p_base, expit(base + score.sum(axis=1)),
+                              p_base * (1 - p_base))[:, None]
+            base = p_base
+        return base, score
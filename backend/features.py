@@ -0,0 +1,79 @@
+"""Feature matrices assembled in place into reusable per-thread buffers"""
+
+import threading
+from operator import attrgetter
+from typing import Callable, Dict, Sequence
+
+import numpy as np
+
+from config import FEATURE_NAMES
+
+# Largest batch (rows) whose buffers a thread keeps between requests; bigger
+# ones get buffers of their own, so one huge upload does not pin its memory
+MAX_BUFFER_ROWS = 1 << 14
+MIN_BUFFER_ROWS = 16
+
+# FEATURE_NAMES-ordered values of a PatientData (any object with those attributes)
+patient_values: Callable[[object], tuple] = attrgetter(*FEATURE_NAMES)
+
+
+def dict_values(record: Dict, default=0) -> list:
+    """FEATURE_NAMES-ordered values of a plain dict, ``default`` for absent keys"""
+    return [record.get(name, default) for name in FEATURE_NAMES]
+
+
+def _rows_for(n: int) -> int:
+    return max(MIN_BUFFER_ROWS, 1 << max(0, n - 1).bit_length())
+
+
+class FeatureBuffers:
+    """Row-major (n, 13) feature matrices and ensemble outputs reused across requests.
+
+    Each thread (the inference executor's workers, the micro-batcher's
+    flushes) keeps one C-contiguous feature buffer per dtype (``dtype``
+    unless a call asks for another) and one ``EnsembleOutput``, grown to the
+    next power of two when a batch does not fit. ``assemble`` writes the
+    values straight into it in ``FEATURE_NAMES`` order, the layout
+    ``CompiledEnsemble`` takes (and, in its ``input_dtype``, hands to every
+    folded model without a copy).
+
+    What they return are views: valid until the same thread asks again, so
+    anything that outlives the request must be copied (results are, by
+    ``tolist``).
+    """
+
+    def __init__(self, dtype=np.float64, n_features: int = len(FEATURE_NAMES)):
+        self.dtype = np.dtype(dtype)
+        self.n_features = n_features
+        self._local = threading.local()
+
+    def matrix(self, n: int, dtype=None) -> np.ndarray:
+        """An uninitialised (n, n_features) C-contiguous matrix"""
+        dtype = self.dtype if dtype is None else np.dtype(dtype)
+        if n > MAX_BUFFER_ROWS:
+            return np.empty((n, self.n_features), dtype=dtype)
+        buffers = getattr(self._local, 'features', None)
+        if buffers is None:
+            buffers = self._local.features = {}
+        buffer = buffers.get(dtype)
+        if buffer is None or buffer.shape[0] < n:
+            buffer = buffers[dtype] = np.empty((_rows_for(n), self.n_features), dtype=dtype)
+        return buffer[:n]
+
+    def assemble(self, records: Sequence, values: Callable[[object], Sequence] = patient_values,
+                 dtype=None) -> np.ndarray:
+        """The (len(records), n_features) matrix of ``values(record)`` rows"""
+        X = self.matrix(len(records), dtype)
+        if len(records):
+            X[...] = list(map(values, records))
+        return X
+
+    def output(self, ensemble, n: int):
+        """An ``EnsembleOutput`` of ``ensemble`` for ``n`` rows, for ``CompiledEnsemble.predict(out=...)``"""
+        if n > MAX_BUFFER_ROWS:
+            return ensemble.allocate(n)
+        out = getattr(self._local, 'output', None)
+        # a reload brings a new ensemble (and model_names list) with it
+        if out is None or out.capacity < n or out.model_names is not ensemble.model_names:
+            out = self._local.output = ensemble.allocate(_rows_for(n))
+        return out
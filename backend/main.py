@@ -1,21 +1,57 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
 
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, Header, HTTPException, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, Field, create_model
 import numpy as np
 import pandas as pd
 import joblib
-import os
 from datetime import datetime
+import importlib
+import json
 import logging
 
+from batching import MicroBatcher
+from cache import PredictionCache, feature_keys
+from cascade import CascadePlan, CascadeScorer, risk_bands
+from compiled_models import CompiledForest, NumpyMLP, NumpySVM
+from ensemble import Blend, CompiledEnsemble
+from explain import EnsembleExplainer
+from config import (FEATURE_NAMES, FEATURE_SCHEMA, COALESCE_ENABLED, COALESCE_WINDOW_MS, COALESCE_MAX_BATCH,
+                    INFERENCE_WORKERS, INFERENCE_MAX_QUEUE, STREAM_CHUNK_ROWS, COMPILED_TREES,
+                    COMPILED_SVM, SVM_FLOAT32, NN_BACKEND, PREDICTION_CACHE_SIZE,
+                    PREDICTION_CACHE_TTL_SECONDS, MMAP_MODELS, MODEL_LOAD_WORKERS, BACKGROUND_LOAD,
+                    MODEL_WATCH_SECONDS, ADMIN_TOKEN, WARMUP_BATCH_SIZES, WARMUP_ROUNDS, ENSEMBLE_WEIGHTS,
+                    RISK_THRESHOLDS, CASCADE_ENABLED, EXPLAIN_BUDGET_MS, EXPLAIN_BACKGROUND_ROWS, FEATURE_DTYPE,
+                    FLOAT32_TOLERANCE)
+from executor import InferenceExecutor, QueueFullError
+from features import FeatureBuffers
+from metrics import (BATCH_ROWS, CASCADE_ROWS, REGISTRY as METRICS_REGISTRY, REQUEST_ROWS, RequestMetricsMiddleware,
+                     observe_stage, stage_timer)
+from readiness import ModelsNotReadyError, Readiness
+from registry import ModelBundle, ModelRegistry
+from validation import validate_columns, validate_matrix
+from warmup import synthetic_features, warm_up
+from tabular import detect_format, read_frame
+from streaming import (CSVChunker, STREAM_FORMATS, UploadStreamingResponse, block_row_count, csv_header,
+                       format_csv, format_ndjson, parse_csv_block)
+from wire import (WIRE_FORMATS, UnsupportedFormatError, WireFormatError, decode_arrow, decode_packed,
+                  encode_arrow_columns, encode_packed_columns, media_format, result_columns)
+
 logger = logging.getLogger("cvd_api")
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
 BASE_DIR = Path(__file__).resolve().parent
 MODELS_DIR = BASE_DIR / "models"
+# Band boundaries of risk_level: low below the first, high from the second
+RISK_BOUNDARIES = (RISK_THRESHOLDS['low'], RISK_THRESHOLDS['moderate'])
+# synthetic patients (twice: raw and on the one-decimal grid) in the float32 check
+FLOAT32_PROBE_ROWS = 1024
 
 app = FastAPI(title="CVD Detection API",
               description="Lightweight ensemble CVD detection API (mock mode if models missing)",
@@ -28,23 +64,16 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestMetricsMiddleware)
 
 
 # ---------------- Pydantic models ----------------
-class PatientData(BaseModel):
-    age: float = Field(..., ge=0, le=120)
-    sex: int = Field(..., ge=0, le=1)
-    cp: int = Field(..., ge=0, le=3)
-    trestbps: float = Field(..., ge=50, le=300)
-    chol: float = Field(..., ge=50, le=1000)
-    fbs: int = Field(..., ge=0, le=1)
-    restecg: int = Field(..., ge=0, le=2)
-    thalach: float = Field(..., ge=20, le=300)
-    exang: int = Field(..., ge=0, le=1)
-    oldpeak: float = Field(..., ge=0.0, le=10.0)
-    slope: int = Field(..., ge=0, le=2)
-    ca: int = Field(..., ge=0, le=4)
-    thal: int = Field(..., ge=0, le=3)
+# Fields and bounds come from config.FEATURE_SCHEMA so they cannot drift from
+# the columnar validator used by the bulk endpoints
+PatientData = create_model(
+    'PatientData',
+    **{name: (spec['type'], Field(..., ge=spec['ge'], le=spec['le'])) for name, spec in FEATURE_SCHEMA.items()},
+)
 
 
 class PredictionResponse(BaseModel):
@@ -53,6 +82,9 @@ class PredictionResponse(BaseModel):
     ensemble_probability: float
     model_predictions: Dict[str, float]
     confidence_scores: Dict[str, float]
+    model_version: Optional[str] = None
+    models_run: Optional[List[str]] = None
+    explanation: Optional[Dict] = None
     timestamp: str = Field(default_factory=lambda: datetime.now().isoformat())
 
 
@@ -72,19 +104,16 @@ class BatchPredictionResponse(BaseModel):
     high_risk_count: int
     moderate_risk_count: int
     low_risk_count: int
+    model_version: Optional[str] = None
 
 
 # ---------------- Globals ----------------
-models: Dict[str, object] = {}
-scaler = None
-
-# Weights per research setup (can be tuned)
-MODEL_WEIGHTS = {
-    'svm': 0.25,
-    'random_forest': 0.25,
-    'gradient_boosting': 0.30,
-    'neural_network': 0.20,
-}
+readiness = Readiness()
+prediction_cache = PredictionCache(max_entries=PREDICTION_CACHE_SIZE, ttl_seconds=PREDICTION_CACHE_TTL_SECONDS)
+# per-thread feature matrices and ensemble outputs, reused across requests
+feature_buffers = FeatureBuffers()
+batcher: Optional[MicroBatcher] = None
+inference_pool = InferenceExecutor(max_workers=INFERENCE_WORKERS, max_queue=INFERENCE_MAX_QUEUE)
 
 
 def create_mock_model(name: str):
@@ -97,7 +126,8 @@ def create_mock_model(name: str):
             return (s > 0).astype(int)
 
         def predict_proba(self, X):
-            s = np.tanh(np.sum(X, axis=1) / (np.max(np.abs(X)) + 1e-6))
+            # normalise per row so a row scores the same alone or inside a batch
+            s = np.tanh(np.sum(X, axis=1) / (np.max(np.abs(X), axis=1) + 1e-6))
             prob = (s + 1) / 2
             return np.vstack([1 - prob, prob]).T
 
@@ -116,124 +146,468 @@ def create_mock_scaler():
     return MockScaler()
 
 
-def load_models():
-    """Try loading models from disk; fall back to mocks if missing."""
-    global models, scaler
-    models = {}
-    scaler = None
+def load_tree_model(pkl_path: Path):
+    """Load a forest, compiled to packed arrays unless CVD_COMPILED_TREES is off.
+
+    Prefers the ``*_trees.joblib`` export written by the trainer next to the
+    pickle; otherwise the pickle is loaded and compiled in place.
+    """
+    compiled_path = pkl_path.with_name(pkl_path.name.replace('_model.pkl', '_trees.joblib'))
+    if COMPILED_TREES and compiled_path.exists():
+        logger.info(f'Loaded {compiled_path.name}')
+        return CompiledForest.from_arrays(load_arrays(compiled_path))
+    if not pkl_path.exists():
+        return None
+    model = joblib.load(pkl_path)
+    logger.info(f'Loaded {pkl_path.name}')
+    if COMPILED_TREES:
+        try:
+            return CompiledForest.from_sklearn(model)
+        except Exception as e:
+            logger.warning(f'Unable to compile {pkl_path.name}, using sklearn predictor: {e}')
+    return model
+
+
+def load_svm_model(pkl_path: Path):
+    """Load the SVM as a NumpySVM unless CVD_COMPILED_SVM is off.
+
+    Uses the trainer's ``svm_kernel.joblib`` export when present, otherwise
+    the pickle is loaded and converted in place.
+    """
+    export_path = pkl_path.with_name('svm_kernel.joblib')
+    if COMPILED_SVM and export_path.exists():
+        logger.info(f'Loaded {export_path.name}')
+        return NumpySVM.from_arrays(load_arrays(export_path), float32=SVM_FLOAT32)
+    if not pkl_path.exists():
+        return None
+    model = joblib.load(pkl_path)
+    logger.info(f'Loaded {pkl_path.name}')
+    if COMPILED_SVM:
+        try:
+            return NumpySVM.from_sklearn(model, float32=SVM_FLOAT32)
+        except Exception as e:
+            logger.warning(f'Unable to compile {pkl_path.name}, using sklearn predictor: {e}')
+    return model
+
+
+def load_nn_model(nn_path: Path):
+    """Load the MLP as a NumpyMLP from ``nn_weights.npz`` (no TensorFlow import).
+
+    The Keras ``.h5`` is only used when CVD_NN_BACKEND=keras or the NumPy
+    export is missing.
+    """
+    npz_path = nn_path.with_name('nn_weights.npz')
+    if NN_BACKEND == 'numpy' and npz_path.exists():
+        logger.info(f'Loaded {npz_path.name}')
+        return NumpyMLP.load(npz_path)
+    if not nn_path.exists():
+        return None
+    if NN_BACKEND == 'numpy':
+        logger.warning(f'{npz_path.name} missing, falling back to Keras; '
+                       f'run scripts/export_numpy_artifacts.py to skip the TensorFlow import')
+    # lazy-load to avoid heavy imports if not needed; use importlib to avoid static import resolution issues
+    try:
+        try:
+            load_model = getattr(importlib.import_module('tensorflow.keras.models'), 'load_model')
+        except Exception:
+            # fallback to standalone keras if tensorflow package isn't available
+            load_model = getattr(importlib.import_module('keras.models'), 'load_model')
+        model = load_model(str(nn_path))
+        logger.info(f'Loaded {nn_path.name}')
+        return model
+    except Exception as e:
+        logger.warning(f'Unable to load NN model: {e}')
+        return None
+
+
+def load_arrays(path: Path):
+    """joblib.load an array export, memory-mapped read-only when CVD_MMAP_MODELS is on.
+
+    Mapped arrays live in the page cache, so every worker process that maps
+    the same file shares one physical copy instead of holding its own.
+    """
+    return joblib.load(path, mmap_mode='r' if MMAP_MODELS else None)
+
+
+def load_scaler(scaler_path: Path):
+    if not scaler_path.exists():
+        return None
+    loaded = joblib.load(scaler_path)
+    logger.info(f'Loaded {scaler_path.name}')
+    return loaded
+
 
-    if MODELS_DIR.exists() and MODELS_DIR.is_dir():
-        logger.info(f"Looking for models in {MODELS_DIR}")
-        # load common files if present
+def preimport_model_modules():
+    for module in ('sklearn.preprocessing', 'sklearn.svm', 'sklearn.ensemble', 'sklearn.pipeline',
+                   'sklearn.kernel_approximation', 'sklearn.linear_model'):
         try:
-            svm_path = MODELS_DIR / 'svm_model.pkl'
-            rf_path = MODELS_DIR / 'rf_model.pkl'
-            gb_path = MODELS_DIR / 'gb_model.pkl'
-            nn_path = MODELS_DIR / 'nn_model.h5'
-            scaler_path = MODELS_DIR / 'scaler.pkl'
-
-            if svm_path.exists():
-                models['svm'] = joblib.load(svm_path)
-                logger.info('Loaded svm_model.pkl')
-            if rf_path.exists():
-                models['random_forest'] = joblib.load(rf_path)
-                logger.info('Loaded rf_model.pkl')
-            if gb_path.exists():
-                models['gradient_boosting'] = joblib.load(gb_path)
-                logger.info('Loaded gb_model.pkl')
-            if nn_path.exists():
-                # lazy-load to avoid heavy imports if not needed; use importlib to avoid static import resolution issues
+            importlib.import_module(module)
+        except ImportError:
+            pass
+
+
+def load_blend(path: Path) -> Blend:
+    """The trainer's learned ``ensemble.json``; the fixed config.ENSEMBLE_WEIGHTS if there is none."""
+    if path.exists():
+        try:
+            blend = Blend.load(path)
+            logger.info(f"Loaded {path.name} ({blend.link} blend of {list(blend.weights)})")
+            return blend
+        except Exception as e:
+            logger.warning(f"Unable to read {path.name}, using the default weights: {e}")
+    return Blend(weights=dict(ENSEMBLE_WEIGHTS), info={'method': 'fixed'})
+
+
+def load_cascade(path: Path, ensemble: CompiledEnsemble) -> CascadeScorer:
+    """Cascade over ``ensemble`` with the trainer's ``cascade.json``; the uncalibrated hard plan if there is none.
+
+    A plan under which no row can ever exit (the hard bounds with weights
+    wider than every risk band) is replaced by one that scores the full
+    ensemble, which gives the same results without the first-stage overhead.
+    """
+    cascade = None
+    if path.exists():
+        try:
+            cascade = CascadeScorer(ensemble, CascadePlan.load(path), RISK_BOUNDARIES)
+            logger.info(f"Loaded {path.name} (first stage {list(cascade.plan.first)})")
+        except Exception as e:
+            logger.warning(f"Unable to use {path.name}, cascading with the hard bounds: {e}")
+    if cascade is None:
+        cascade = CascadeScorer(ensemble, CascadePlan.hard(), RISK_BOUNDARIES)
+    if not cascade.exits_possible():
+        logger.warning(f"No row can exit the {cascade.plan.info.get('method', 'cascade')} plan with first stage "
+                       f"{list(cascade.plan.first)}: the other models' weights span more than any risk band. "
+                       f"Cascade mode scores the full ensemble")
+        cascade = CascadeScorer(ensemble, CascadePlan.full(ensemble.model_names, reason='no exit possible'),
+                                RISK_BOUNDARIES)
+    return cascade
+
+
+def load_background(path: Path, scaler) -> np.ndarray:
+    """Reference patients (raw units) the explanations are measured against.
+
+    The trainer saves a handful of representative training rows; without
+    them the training mean from the scaler (or the middle of every feature
+    range) stands in as a single reference.
+    """
+    if path.exists():
+        try:
+            rows = np.asarray(joblib.load(path)['rows'], dtype=np.float64)[:max(1, EXPLAIN_BACKGROUND_ROWS)]
+            logger.info(f"Loaded {path.name} ({len(rows)} reference patients)")
+            return rows
+        except Exception as e:
+            logger.warning(f"Unable to read {path.name}, explaining against the training mean: {e}")
+    if hasattr(scaler, 'mean_'):
+        return np.asarray(scaler.mean_, dtype=np.float64)[None, :]
+    return np.array([[(spec['ge'] + spec['le']) / 2 for spec in FEATURE_SCHEMA.values()]])
+
+
+def float32_probe(background: np.ndarray, n: int = FLOAT32_PROBE_ROWS) -> np.ndarray:
+    """Patients the float32 check scores: the background rows, synthetic ones
+    across FEATURE_SCHEMA and the same on the one-decimal grid values are
+    entered in (where float32 misses values such as 2.3)"""
+    synthetic = synthetic_features(n, seed=32)
+    return np.vstack([background, synthetic, np.round(synthetic, 1)])
+
+
+def build_ensemble(models: Dict[str, object], blend: Blend, scaler, background: np.ndarray) -> CompiledEnsemble:
+    """The CompiledEnsemble in CVD_FEATURE_DTYPE, or in float64 when float32 would change results.
+
+    float32 is kept only if, on ``float32_probe``, every probability stays
+    within CVD_FLOAT32_TOLERANCE of float64 scoring and no risk level changes.
+    """
+    ensemble = CompiledEnsemble(models, blend, scaler, input_dtype=FEATURE_DTYPE)
+    if ensemble.input_dtype == np.float64:
+        return ensemble
+    exact = CompiledEnsemble(models, blend, scaler, input_dtype=np.float64)
+    probe = float32_probe(background)
+    p32, p64 = ensemble.predict(probe).ensemble, exact.predict(probe).ensemble
+    deviation = float(np.abs(p32 - p64).max())
+    changed = int(np.count_nonzero(risk_bands(p32, RISK_BOUNDARIES) != risk_bands(p64, RISK_BOUNDARIES)))
+    if deviation > FLOAT32_TOLERANCE or changed:
+        logger.info(f"float32 features move probabilities by up to {deviation:.2g} ({changed} risk level "
+                    f"changes on {len(probe)} probe patients); scoring this version in float64")
+        return exact
+    logger.info(f"Scoring in float32 (within {deviation:.2g} of float64 on {len(probe)} probe patients)")
+    return ensemble
+
+
+def load_quality_metrics(path: Path) -> Dict:
+    """Held-out evaluation written by CVDModelTrainer next to the artifacts, if any."""
+    if not path.exists():
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"Unable to read {path.name}: {e}")
+        return {}
+
+
+def build_bundle(models_dir: Path, version: str) -> ModelBundle:
+    """Load every artifact in parallel into a new ModelBundle; mocks stand in for missing ones."""
+    loaders = {
+        'svm': (load_svm_model, models_dir / 'svm_model.pkl'),
+        'random_forest': (load_tree_model, models_dir / 'rf_model.pkl'),
+        'gradient_boosting': (load_tree_model, models_dir / 'gb_model.pkl'),
+        'neural_network': (load_nn_model, models_dir / 'nn_model.h5'),
+        'scaler': (load_scaler, models_dir / 'scaler.pkl'),
+    }
+    loaded: Dict[str, object] = {}
+    if models_dir.exists() and models_dir.is_dir():
+        logger.info(f"Looking for models in {models_dir}")
+        # unpickling imports sklearn submodules on demand; doing that from
+        # several threads at once can hit half-initialised modules
+        preimport_model_modules()
+        # joblib/NumPy reads and TensorFlow's import release the GIL for most
+        # of their time, so threads overlap the loads well
+        with ThreadPoolExecutor(max_workers=MODEL_LOAD_WORKERS, thread_name_prefix='cvd-load') as pool:
+            futures = {key: pool.submit(fn, path) for key, (fn, path) in loaders.items()}
+            for key, future in futures.items():
                 try:
-                    import importlib
-                    try:
-                        load_model = getattr(importlib.import_module('tensorflow.keras.models'), 'load_model')
-                    except Exception:
-                        # fallback to standalone keras if tensorflow package isn't available
-                        load_model = getattr(importlib.import_module('keras.models'), 'load_model')
-                    models['neural_network'] = load_model(str(nn_path))
-                    logger.info('Loaded nn_model.h5')
+                    loaded[key] = future.result()
                 except Exception as e:
-                    logger.warning(f'Unable to load NN model: {e}')
-            if scaler_path.exists():
-                scaler = joblib.load(scaler_path)
-                logger.info('Loaded scaler.pkl')
-        except Exception as e:
-            logger.error(f"Error loading models: {e}")
+                    logger.error(f"Error loading {loaders[key][1].name}: {e}")
 
+    scaler = loaded.pop('scaler', None)
+    models: Dict[str, object] = {}
     # If some models are missing, create mocks so API still runs
     for key in ['svm', 'random_forest', 'gradient_boosting', 'neural_network']:
-        if key not in models:
-            models[key] = create_mock_model(key)
+        model = loaded.get(key)
+        models[key] = model if model is not None else create_mock_model(key)
 
     if scaler is None:
         scaler = create_mock_scaler()
 
-    logger.info(f"Models available: {list(models.keys())}")
+    background = load_background(models_dir / 'background.joblib', scaler)
+    ensemble = build_ensemble(models, load_blend(models_dir / 'ensemble.json'), scaler, background)
+    cascade = load_cascade(models_dir / 'cascade.json', ensemble)
+    explainer = EnsembleExplainer(ensemble, background, FEATURE_NAMES, budget_seconds=EXPLAIN_BUDGET_MS / 1000.0)
+    quality = load_quality_metrics(models_dir / 'metrics.json')
+    logger.info(f"Models available: {list(models.keys())} (version {version})")
+    # score before going live: a broken artifact set fails here instead of
+    # replacing a working one, and first-call costs are paid up front
+    readiness.mark_warming()
+    warmup = warm_up(ensemble, WARMUP_BATCH_SIZES or [1], rounds=WARMUP_ROUNDS if WARMUP_BATCH_SIZES else 1)
+    logger.info(f"Warm-up for {version} took {warmup['total_seconds']}s: {warmup['timings']}")
+    # instrument only after warm-up so synthetic batches stay out of the histograms
+    ensemble.observe_stage = observe_stage
+    return ModelBundle(version=version, models=models, scaler=scaler, ensemble=ensemble, cascade=cascade,
+                       explainer=explainer, warmup=warmup, quality=quality)
+
+
+registry = ModelRegistry(MODELS_DIR, build=build_bundle)
+# cached results belong to the version that produced them
+registry.on_publish(lambda bundle: prediction_cache.clear())
+
+
+def _register_runtime_gauges():
+    """Queue, cache and model-state values read at scrape time by /metrics/prometheus."""
+    gauges = [
+        ('cvd_inference_in_flight', 'Inference tasks running or waiting for a worker.',
+         lambda: inference_pool.in_flight),
+        ('cvd_inference_capacity', 'Inference tasks accepted before requests get 503.',
+         lambda: inference_pool.capacity),
+        ('cvd_coalescer_pending', 'Single predictions waiting for the current micro-batch.',
+         lambda: batcher.pending if batcher is not None else 0),
+        ('cvd_cache_entries', 'Results held in the prediction cache.', lambda: len(prediction_cache)),
+        ('cvd_models_ready', '1 once a warmed-up model version is serving.', lambda: int(readiness.ready)),
+    ]
+    for name, documentation, fn in gauges:
+        METRICS_REGISTRY.gauge(name, documentation).set_function(fn)
+    for field_name in ('hits', 'misses', 'evictions', 'expirations'):
+        METRICS_REGISTRY.counter(f'cvd_cache_{field_name}_total', f'Prediction cache {field_name}.').set_function(
+            lambda field_name=field_name: getattr(prediction_cache, field_name))
+    METRICS_REGISTRY.gauge('cvd_model_info', 'Live model version (value is always 1).', ('version',)).set_function(
+        lambda: {(registry.current.version,): 1} if registry.current is not None else {})
 
 
-def preprocess(patient: PatientData) -> np.ndarray:
-    arr = np.array([[
-        patient.age,
-        patient.sex,
-        patient.cp,
-        patient.trestbps,
-        patient.chol,
-        patient.fbs,
-        patient.restecg,
-        patient.thalach,
-        patient.exang,
-        patient.oldpeak,
-        patient.slope,
-        patient.ca,
-        patient.thal,
-    ]], dtype=float)
+_register_runtime_gauges()
+
+
+def load_models() -> ModelBundle:
+    """Build a bundle from ``registry.models_dir`` on this thread and swap it in."""
+    return registry.load(force=True)
+
+
+def current_bundle() -> ModelBundle:
+    bundle = registry.current
+    if bundle is None:
+        readiness.require()
+        raise ModelsNotReadyError("Models are not loaded")
+    return bundle
+
+
+def initialize_models():
+    """``load_models`` with ``readiness`` tracking; scoring endpoints answer 503 until it finishes."""
+    readiness.mark_loading()
     try:
-        return scaler.transform(arr)
-    except Exception:
-        return arr
+        load_models()
+    except Exception as e:
+        logger.exception("Model loading failed")
+        readiness.mark_failed(e)
+        return
+    readiness.mark_ready()
+    logger.info(f"Models ready after {readiness.load_seconds}s")
 
 
-def ensemble_predict_single(patient: PatientData) -> Dict:
-    features = preprocess(patient)
-    preds = {}
-    # Get per-model probabilities
-    for name, model in models.items():
-        try:
-            if hasattr(model, 'predict_proba'):
-                prob = float(model.predict_proba(features)[0][1])
-            else:
-                # fallback for models that only implement predict
-                pred = model.predict(features)[0]
-                prob = float(pred)
-        except Exception:
-            # unexpected model behavior -> mock
-            prob = float(np.clip((np.sum(features) % 1.0), 0.01, 0.99))
-        preds[name] = prob
+def preprocess(patient: PatientData) -> np.ndarray:
+    return scale_features(patients_to_matrix([patient]))
 
-    # Weighted ensemble
-    ensemble_prob = sum(preds.get(k, 0.0) * MODEL_WEIGHTS.get(k, 0.0) for k in MODEL_WEIGHTS)
 
-    if ensemble_prob < 0.3:
-        level = 'low'
-    elif ensemble_prob < 0.7:
-        level = 'moderate'
-    else:
-        level = 'high'
+def patients_to_matrix(patients: List[PatientData], dtype=None) -> np.ndarray:
+    """Patients as one (n, 13) matrix in FEATURE_NAMES order, in ``dtype``
+    (default: what the live ensemble takes).
+
+    Written into this thread's reusable buffer (``feature_buffers``): valid
+    until the thread assembles its next matrix.
+    """
+    return feature_buffers.assemble(patients, dtype=current_bundle().ensemble.input_dtype if dtype is None else dtype)
+
+
+def scale_features(arr: np.ndarray) -> np.ndarray:
+    return current_bundle().scaler.transform(arr)
+
 
-    response = {
+def risk_level(prob: float) -> str:
+    if prob < RISK_BOUNDARIES[0]:
+        return 'low'
+    elif prob < RISK_BOUNDARIES[1]:
+        return 'moderate'
+    return 'high'
+
+
+def build_response(ensemble_prob: float, preds: Dict[str, float], model_version: str) -> Dict:
+    """Response fields for one patient; ``preds`` holds only the models that scored it."""
+    return {
         'risk_percentage': round(ensemble_prob * 100, 2),
-        'risk_level': level,
+        'risk_level': risk_level(ensemble_prob),
         'ensemble_probability': round(ensemble_prob, 4),
         'model_predictions': {k: round(v, 4) for k, v in preds.items()},
         'confidence_scores': {k: round(v, 4) for k, v in preds.items()},
+        'model_version': model_version,
+        'models_run': list(preds),
     }
-    return response
+
+
+def ensemble_predict_matrix(raw: np.ndarray, bundle: Optional[ModelBundle] = None,
+                            cascade: bool = False, explain: bool = False) -> List[Dict]:
+    """Score an already validated (n, 13) raw feature matrix in one pass.
+
+    ``bundle`` pins the model version (e.g. for every chunk of one stream);
+    by default the live one is used. ``cascade`` scores through the bundle's
+    ``CascadeScorer``: same risk levels, fewer models per low-ambiguity row.
+    ``explain`` adds per-feature contributions and always runs every model.
+    """
+    bundle = bundle or current_bundle()
+    if raw.shape[0] == 0:
+        return []
+    BATCH_ROWS.observe(raw.shape[0])
+    if cascade and not explain:
+        return cascade_predict_matrix(raw, bundle)
+    scored = bundle.ensemble.predict(raw, out=feature_buffers.output(bundle.ensemble, raw.shape[0]))
+    if explain:
+        with stage_timer('explanation'):
+            explanations = bundle.explainer.explain(raw, scored.per_model)
+
+    with stage_timer('serialization'):
+        # Convert to plain Python floats once per model rather than per element access
+        per_model = {k: v.tolist() for k, v in scored.model_probabilities().items()}
+        results = [build_response(p, {k: v[i] for k, v in per_model.items()}, bundle.version)
+                   for i, p in enumerate(scored.ensemble.tolist())]
+        if explain:
+            for result, explanation in zip(results, explanations):
+                result['explanation'] = explanation
+        return results
+
+
+def cascade_score(raw: np.ndarray, bundle: ModelBundle):
+    """``CascadeScorer.predict`` on the bundle's cascade, counted in ``cvd_cascade_rows_total``"""
+    scored, ran = bundle.cascade.predict(raw)
+    exited = int(np.count_nonzero(~ran.all(axis=1)))
+    CASCADE_ROWS.inc(exited, outcome='exited')
+    CASCADE_ROWS.inc(raw.shape[0] - exited, outcome='full')
+    return scored, ran
+
+
+def cascade_predict_matrix(raw: np.ndarray, bundle: ModelBundle) -> List[Dict]:
+    scored, ran = cascade_score(raw, bundle)
+    with stage_timer('serialization'):
+        names = scored.model_names
+        per_model = scored.per_model.tolist()
+        ran = ran.tolist()
+        return [build_response(p, {name: v for name, v, r in zip(names, per_model[i], ran[i]) if r}, bundle.version)
+                for i, p in enumerate(scored.ensemble.tolist())]
+
+
+def cached_predict_matrix(raw: np.ndarray, cascade: bool = False, explain: bool = False) -> List[Dict]:
+    """``ensemble_predict_matrix`` behind the per-patient result cache.
+
+    Only rows not already cached for the live model version are scored,
+    still in one vectorized pass. Cascade and explained results are cached
+    apart from plain ones; rows the explanation budget did not reach are
+    not cached.
+    """
+    bundle = current_bundle()
+    if not prediction_cache.enabled:
+        return ensemble_predict_matrix(raw, bundle, cascade, explain)
+    mode = ':explain' if explain else ':cascade' if cascade else ''
+    keys = feature_keys(bundle.version + mode, raw)
+    results = prediction_cache.get_many(keys)
+    missing = [i for i, r in enumerate(results) if r is None]
+    if missing:
+        fresh = ensemble_predict_matrix(raw[missing], bundle, cascade, explain)
+        keep = [k for k, r in enumerate(fresh) if not explain or r['explanation'] is not None]
+        prediction_cache.put_many([keys[missing[k]] for k in keep], [fresh[k] for k in keep])
+        for i, result in zip(missing, fresh):
+            results[i] = result
+    # callers may add fields (e.g. row numbers); keep the cached dicts pristine
+    return [dict(r) for r in results]
+
+
+def ensemble_predict_batch(patients: List[PatientData], cascade: Optional[bool] = None,
+                           explain: bool = False) -> List[Dict]:
+    """Score all patients with one scaler call and one call per model; ``cascade`` defaults to CVD_CASCADE."""
+    with stage_timer('assembly'):
+        raw = patients_to_matrix(patients)
+    return cached_predict_matrix(raw, CASCADE_ENABLED if cascade is None else cascade, explain)
+
+
+def ensemble_predict_single(patient: PatientData, cascade: Optional[bool] = None, explain: bool = False) -> Dict:
+    return ensemble_predict_batch([patient], cascade, explain)[0]
 
 
 @app.on_event("startup")
 async def startup():
+    global batcher
     logger.info("Starting CVD Detection API (startup)")
-    load_models()
+    if BACKGROUND_LOAD:
+        # accept connections (and health probes) while the artifacts load
+        threading.Thread(target=initialize_models, name='cvd-model-loader', daemon=True).start()
+    else:
+        initialize_models()
+    if MODEL_WATCH_SECONDS > 0:
+        registry.watch(MODEL_WATCH_SECONDS)
+        logger.info(f"Watching {registry.models_dir} for new artifacts every {MODEL_WATCH_SECONDS}s")
+    if COALESCE_ENABLED:
+        batcher = MicroBatcher(ensemble_predict_batch, max_batch_size=COALESCE_MAX_BATCH,
+                               max_wait_ms=COALESCE_WINDOW_MS, executor=inference_pool)
+        logger.info(f"Request coalescing enabled (window={COALESCE_WINDOW_MS}ms, max_batch={COALESCE_MAX_BATCH})")
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    registry.stop()
+    if batcher is not None:
+        await batcher.close()
+    inference_pool.shutdown(wait=False)
+
+
+@app.exception_handler(QueueFullError)
+@app.exception_handler(ModelsNotReadyError)
+async def unavailable_handler(request: Request, exc: RuntimeError):
+    logger.warning(f"Rejecting {request.url.path}: {exc}")
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
 
 
 @app.get("/")
@@ -243,61 +617,315 @@ async def root():
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy", "models_loaded": list(models.keys()), "timestamp": datetime.now().isoformat()}
+    bundle = registry.current
+    return {"status": "healthy" if readiness.ready else readiness.status, "ready": readiness.ready,
+            "models_loaded": list(bundle.models.keys()) if bundle is not None else [],
+            "model_version": bundle.version if bundle is not None else None,
+            "loading": readiness.stats(), "warmup": bundle.warmup if bundle is not None else None,
+            "ensemble": bundle.ensemble.blend.to_dict() if bundle is not None else None,
+            "cascade": ({"enabled": CASCADE_ENABLED, **bundle.cascade.plan.to_dict()}
+                        if bundle is not None else None),
+            "registry": registry.stats(), "inference": inference_pool.stats(),
+            "timestamp": datetime.now().isoformat()}
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once the ensemble is loaded and warmed up, 503 before."""
+    readiness.require()
+    return {"ready": True, "model_version": current_bundle().version}
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    bundle = registry.current
+    return {"model_version": bundle.version if bundle is not None else None, **prediction_cache.stats()}
+
+
+@app.post("/admin/reload")
+async def admin_reload(wait: bool = False, force: bool = False,
+                       x_admin_token: Optional[str] = Header(default=None)):
+    """Load the artifacts in MODELS_DIR into a new version and swap it in.
+
+    The current version keeps serving (including requests already in
+    flight) until the new one is built. ``wait=true`` blocks until the swap
+    and reports the outcome; without ``force`` nothing happens if the
+    artifacts have not changed. Disabled unless CVD_ADMIN_TOKEN is set.
+    """
+    if ADMIN_TOKEN is None:
+        raise HTTPException(status_code=403, detail="admin reload is disabled; set CVD_ADMIN_TOKEN to enable it")
+    if x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="invalid admin token")
+    live = registry.current
+    previous = live.version if live is not None else None
+    if not wait:
+        registry.reload_in_background(force=force)
+        return JSONResponse(status_code=202, content={"status": "reloading", "current_version": previous})
+    try:
+        bundle = await asyncio.get_running_loop().run_in_executor(None, registry.load, force)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"reload failed, still serving {previous}: {e}")
+    if not readiness.ready:
+        readiness.mark_ready()
+    # a forced reload rebuilds (and re-warms) the same version under the same name
+    return {"status": "reloaded" if bundle is not live else "unchanged",
+            "model_version": bundle.version, "previous_version": previous}
 
 
 @app.post("/predict", response_model=PredictionResponse)
-async def predict(patient: PatientData):
+async def predict(patient: PatientData, cascade: Optional[bool] = None, explain: bool = False):
+    readiness.require()
+    REQUEST_ROWS.observe(1, endpoint='predict')
     try:
         logger.info(f"Predict request: age={patient.age}")
-        result = ensemble_predict_single(patient)
+        # the micro-batches are scored in the default mode; an override runs on its own
+        if batcher is not None and cascade in (None, CASCADE_ENABLED) and not explain:
+            result = await batcher.submit(patient)
+        else:
+            result = await inference_pool.run(ensemble_predict_single, patient, cascade, explain)
         return PredictionResponse(**result)
+    except (QueueFullError, ModelsNotReadyError):
+        raise
     except Exception as e:
         logger.error(f"Prediction failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+MODEL_DISPLAY_NAMES = {
+    'svm': 'SVM',
+    'random_forest': 'Random Forest',
+    'gradient_boosting': 'Gradient Boosting',
+    'neural_network': 'Neural Network',
+    'ensemble': 'Ensemble',
+}
+
+
 @app.get("/metrics", response_model=List[MetricsResponse])
 async def metrics():
-    # Static placeholder metrics (replace with trained metrics after training)
-    placeholder = [
-        MetricsResponse(model_name='SVM', accuracy=0.78, precision=0.81, recall=0.75, f1_score=0.78, auc=0.84),
-        MetricsResponse(model_name='Random Forest', accuracy=0.80, precision=0.82, recall=0.79, f1_score=0.80, auc=0.85),
-        MetricsResponse(model_name='Gradient Boosting', accuracy=0.81, precision=0.83, recall=0.80, f1_score=0.81, auc=0.86),
-        MetricsResponse(model_name='Neural Network', accuracy=0.79, precision=0.80, recall=0.78, f1_score=0.79, auc=0.84),
-        MetricsResponse(model_name='Ensemble', accuracy=0.82, precision=0.84, recall=0.81, f1_score=0.82, auc=0.87),
-    ]
-    return placeholder
+    """Held-out test metrics of the live model version, as saved by notebooks/train_models.py."""
+    quality = current_bundle().quality.get('models')
+    if not quality:
+        raise HTTPException(status_code=404,
+                            detail="No evaluation metrics for the loaded models; "
+                                   "run notebooks/train_models.py to write models/metrics.json")
+    return [MetricsResponse(model_name=MODEL_DISPLAY_NAMES.get(name, name), **scores)
+            for name, scores in quality.items()]
+
+
+@app.get("/metrics/prometheus")
+async def prometheus_metrics():
+    """Runtime latency, batch-size, queue and cache metrics in the Prometheus text format."""
+    return Response(content=METRICS_REGISTRY.render(), media_type=METRICS_REGISTRY.CONTENT_TYPE)
 
 
 @app.post("/batch-predict", response_model=BatchPredictionResponse)
-async def batch_predict(patients: List[PatientData]):
-    results = [ensemble_predict_single(p) for p in patients]
+async def batch_predict(patients: List[PatientData], cascade: Optional[bool] = None, explain: bool = False):
+    readiness.require()
+    REQUEST_ROWS.observe(len(patients), endpoint='batch-predict')
+    results = await inference_pool.run(ensemble_predict_batch, patients, cascade, explain)
+    return summarize_batch(results)
+
+
+class ColumnarValidationError(ValueError):
+    def __init__(self, errors: List[Dict], limit: int = 20):
+        self.errors = errors[:limit]
+        self.invalid_rows = len(errors)
+        super().__init__(f"{len(errors)} invalid rows")
+
+
+def score_columnar(body: bytes, input_format: str, output_format: str, cascade: bool):
+    """Decode, validate, score and encode one binary batch; returns (body, rows, model version).
+
+    The per-row dicts of the JSON endpoints are never built: the model
+    outputs go back as whole columns, unrounded. Rows are not looked up in
+    or added to the result cache.
+    """
+    with stage_timer('assembly'):
+        raw = decode_packed(body) if input_format == 'packed' else decode_arrow(body)
+    with stage_timer('validation'):
+        check = validate_matrix(raw)
+    if not check.all_valid:
+        raise ColumnarValidationError(check.errors)
+    bundle = current_bundle()
+    n = raw.shape[0]
+    if n:
+        BATCH_ROWS.observe(n)
+    scored = cascade_score(raw, bundle)[0] if cascade else bundle.ensemble.predict(raw)
+    with stage_timer('serialization'):
+        levels = risk_bands(scored.ensemble, RISK_BOUNDARIES)
+        columns = result_columns(scored.ensemble, scored.per_model, list(scored.model_names), levels)
+        if output_format == 'packed':
+            return encode_packed_columns(columns, n), n, bundle.version
+        return encode_arrow_columns(columns, levels, ['low', 'moderate', 'high']), n, bundle.version
+
+
+@app.post("/batch-predict/columnar")
+async def batch_predict_columnar(request: Request, cascade: Optional[bool] = None):
+    """``/batch-predict`` for binary columnar bodies (see wire.py).
+
+    The Content-Type selects the input format: ``application/x-cvd-packed``
+    (a 16-byte header and row-major float32/float64 features) or an Arrow IPC
+    stream (``application/vnd.apache.arrow.stream``, needs pyarrow). The
+    response has one column per output: ``ensemble_probability``,
+    ``risk_level`` and each model's probability (NaN / null where cascade
+    mode skipped the model). It uses the format named in ``Accept``, or the
+    request's own. Invalid rows reject the whole batch with a 422, as on
+    ``/batch-predict``.
+    """
+    input_format = media_format(request.headers.get('content-type'))
+    if input_format is None:
+        raise HTTPException(status_code=415, detail=f"Content-Type must be one of {sorted(WIRE_FORMATS.values())}")
+    output_format = media_format(request.headers.get('accept')) or input_format
+    readiness.require()
+    body = await request.body()
+    try:
+        content, n, version = await inference_pool.run(
+            score_columnar, body, input_format, output_format, CASCADE_ENABLED if cascade is None else cascade)
+    except UnsupportedFormatError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except WireFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ColumnarValidationError as e:
+        raise HTTPException(status_code=422, detail={'invalid_rows': e.invalid_rows, 'errors': e.errors})
+    REQUEST_ROWS.observe(n, endpoint='batch-predict/columnar')
+    return Response(content=content, media_type=WIRE_FORMATS[output_format], headers={"X-Model-Version": version})
+
+
+def summarize_batch(results: List[Dict]) -> BatchPredictionResponse:
     risk_percentages = [r['risk_percentage'] for r in results]
     avg = round(sum(risk_percentages) / len(risk_percentages), 2) if risk_percentages else 0.0
     high = sum(1 for r in results if r['risk_level'] == 'high')
     moderate = sum(1 for r in results if r['risk_level'] == 'moderate')
     low = sum(1 for r in results if r['risk_level'] == 'low')
-    predictions = [PredictionResponse(**r) for r in results]
+    with stage_timer('serialization'):
+        predictions = [PredictionResponse(**r) for r in results]
     return BatchPredictionResponse(predictions=predictions, count=len(predictions), average_risk=avg,
-                                   high_risk_count=high, moderate_risk_count=moderate, low_risk_count=low)
+                                   high_risk_count=high, moderate_risk_count=moderate, low_risk_count=low,
+                                   model_version=results[0]['model_version'] if results else None)
+
+
+class CSVValidationError(ValueError):
+    def __init__(self, errors: List[Dict], limit: int = 20):
+        self.errors = errors
+        shown = '; '.join(f"row {e['row']}: {', '.join(e['errors'])}" for e in errors[:limit])
+        more = f" (and {len(errors) - limit} more rows)" if len(errors) > limit else ''
+        super().__init__(f"{len(errors)} invalid rows: {shown}{more}")
+
+
+def score_csv_upload(raw: bytes, filename: Optional[str] = None) -> Dict:
+    """Score an uploaded CSV, Parquet or Arrow IPC file (told apart by its leading bytes)."""
+    with stage_timer('assembly'):
+        df = read_frame(raw, columns=FEATURE_NAMES, fmt=detect_format(filename, raw[:8]), typed=False)
+    REQUEST_ROWS.observe(len(df), endpoint='upload-csv')
+    with stage_timer('validation'):
+        check = validate_columns(df)
+    if not check.all_valid:
+        raise CSVValidationError(check.errors)
+    bundle = current_bundle()
+    results = ensemble_predict_matrix(check.features, bundle)
+    risk_percentages = [r['risk_percentage'] for r in results]
+    avg = round(sum(risk_percentages) / len(risk_percentages), 2) if risk_percentages else 0.0
+    return {"total": len(results), "average_risk": avg, "model_version": bundle.version}
 
 
 @app.post('/upload-csv')
 async def upload_csv(file: UploadFile = File(...)):
+    readiness.require()
     try:
         raw = await file.read()
-        df = pd.read_csv(pd.io.common.BytesIO(raw))
-        patients = []
-        for _, row in df.iterrows():
-            patients.append(PatientData(**row.to_dict()))
-        resp = await batch_predict(patients)
-        return {"filename": file.filename, "summary": {"total": resp.count, "average_risk": resp.average_risk}}
+        summary = await inference_pool.run(score_csv_upload, raw, file.filename)
+        return {"filename": file.filename, "summary": summary}
+    except (QueueFullError, ModelsNotReadyError):
+        raise
     except Exception as e:
         logger.error(f"CSV upload error: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
 
+def score_csv_chunk(frame: pd.DataFrame, offset: int, bundle: Optional[ModelBundle] = None) -> List[Dict]:
+    """Validate and score one parsed chunk; returns one record per input row."""
+    with stage_timer('validation'):
+        check = validate_columns(frame)
+    records: List[Dict] = [{} for _ in range(len(frame))]
+    for err in check.errors:
+        records[err['row']] = {'error': '; '.join(err['errors'])}
+    positions = np.flatnonzero(check.valid)
+    for i, result in zip(positions.tolist(), ensemble_predict_matrix(check.features[positions], bundle)):
+        records[i] = result
+    for i, record in enumerate(records):
+        record['row'] = offset + i
+    return records
+
+
+def score_csv_block(block: bytes, offset: int, bundle: Optional[ModelBundle] = None) -> List[Dict]:
+    try:
+        frame = parse_csv_block(block)
+    except Exception as e:
+        return [{'row': offset + i, 'error': f"unparseable chunk: {e}"} for i in range(block_row_count(block))]
+    return score_csv_chunk(frame, offset, bundle)
+
+
+async def _run_with_backpressure(fn, *args):
+    # a stream cannot switch to a 503 half way through, so wait for a free slot
+    # instead; this also slows how fast we drain the upload
+    while True:
+        try:
+            return await inference_pool.run(fn, *args)
+        except QueueFullError:
+            await asyncio.sleep(0.05)
+
+
+@app.post('/upload-csv/stream')
+async def upload_csv_stream(request: Request, format: str = 'ndjson', chunk_size: int = STREAM_CHUNK_ROWS):
+    """Score a raw CSV request body chunk by chunk while it is still uploading.
+
+    Send the CSV as the request body (``Content-Type: text/csv``). Results are
+    streamed back per row as NDJSON or CSV in input order; invalid rows carry
+    an ``error`` instead of a prediction. Memory use is bounded by
+    ``chunk_size`` rows regardless of upload size. The whole stream is
+    scored by the model version that was live when it started (reported in
+    the ``X-Model-Version`` header).
+    """
+    if format not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {sorted(STREAM_FORMATS)}")
+    if chunk_size < 1:
+        raise HTTPException(status_code=400, detail="chunk_size must be >= 1")
+    readiness.require()
+    bundle = current_bundle()
+    model_names = list(bundle.models.keys())
+
+    def render(records: List[Dict]) -> str:
+        with stage_timer('serialization'):
+            return format_ndjson(records) if format == 'ndjson' else format_csv(records, model_names)
+
+    async def generate():
+        if format == 'csv':
+            yield csv_header(model_names)
+        chunker = CSVChunker(chunk_size)
+        offset = 0
+
+        async def score(block):
+            nonlocal offset
+            records = await _run_with_backpressure(score_csv_block, block, offset, bundle)
+            offset += len(records)
+            return render(records)
+
+        try:
+            async for data in request.stream():
+                for block in chunker.feed(data):
+                    yield await score(block)
+            for block in chunker.close():
+                yield await score(block)
+            REQUEST_ROWS.observe(offset, endpoint='upload-csv/stream')
+        except Exception as e:
+            # headers are already sent; report the failure in-band and stop
+            logger.error(f"CSV stream error after {offset} rows: {e}")
+            yield render([{'row': offset, 'error': f"stream aborted: {e}"}])
+
+    return UploadStreamingResponse(generate(), media_type=STREAM_FORMATS[format],
+                                   headers={"X-Model-Version": bundle.version})
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
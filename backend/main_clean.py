@@ -7,10 +7,11 @@ from pydantic import BaseModel, Field
 import numpy as np
 import pandas as pd
 import joblib
-import os
 from datetime import datetime
 import logging
 
+from config import ENSEMBLE_WEIGHTS
+
 logger = logging.getLogger("cvd_api")
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
@@ -78,13 +79,8 @@ class BatchPredictionResponse(BaseModel):
 models: Dict[str, object] = {}
 scaler = None
 
-# Weights per research setup (can be tuned)
-MODEL_WEIGHTS = {
-    'svm': 0.25,
-    'random_forest': 0.25,
-    'gradient_boosting': 0.30,
-    'neural_network': 0.20,
-}
+# Weights per research setup (can be tuned in config.py)
+MODEL_WEIGHTS = dict(ENSEMBLE_WEIGHTS)
 
 
 def create_mock_model(name: str):
@@ -0,0 +1,233 @@
+"""Runtime counters, gauges and histograms rendered in the Prometheus text format"""
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Seconds; spans the ~50us compiled single-row path up to multi-second bulk chunks
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = tuple(float(2 ** i) for i in range(0, 21, 2))  # 1 .. ~1M rows
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._function: Optional[Callable[[], object]] = None
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def set_function(self, fn: Callable[[], object]):
+        """Read the value(s) from ``fn`` at scrape time instead of storing them.
+
+        ``fn`` returns a number, or a dict of label-value tuples to numbers
+        for labelled metrics.
+        """
+        self._function = fn
+
+    def _samples(self) -> List[Tuple[str, str, float]]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(f'{name}{labels} {_format_value(value)}' for name, labels, value in self._samples())
+        return lines
+
+
+class _Scalar(_Metric):
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def _samples(self):
+        if self._function is not None:
+            result = self._function()
+            values = result if isinstance(result, dict) else {(): result}
+        else:
+            with self._lock:
+                values = dict(self._values)
+        return [(self.name, _label_text(self.labelnames, key), float(value))
+                for key, value in sorted(values.items())]
+
+
+class Counter(_Scalar):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Scalar):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [bucket counts..., +Inf count], sum
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self):
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        samples = []
+        for key, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                samples.append((f'{self.name}_bucket', _label_text(self.labelnames, key, le), cumulative))
+            samples.append((f'{self.name}_sum', _label_text(self.labelnames, key), total))
+            samples.append((f'{self.name}_count', _label_text(self.labelnames, key), cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """Named collection of metrics that renders one text exposition."""
+
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _add(self, metric: _Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self._add(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self._add(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'cvd_http_request_duration_seconds', 'End-to-end HTTP request latency.', ('method', 'path', 'status'))
+STAGE_SECONDS = REGISTRY.histogram(
+    'cvd_stage_duration_seconds',
+    'Time per scoring stage (validation, assembly, scaling, model, blending, explanation, serialization).',
+    ('stage', 'model'))
+BATCH_ROWS = REGISTRY.histogram(
+    'cvd_ensemble_batch_rows', 'Rows scored per vectorized ensemble pass.', buckets=ROW_BUCKETS)
+REQUEST_ROWS = REGISTRY.histogram(
+    'cvd_request_rows', 'Patient rows submitted per request.', ('endpoint',), buckets=ROW_BUCKETS)
+CASCADE_ROWS = REGISTRY.counter(
+    'cvd_cascade_rows_total', 'Rows scored in cascade mode, by whether they exited after the first stage.',
+    ('outcome',))
+
+
+def observe_stage(stage: str, seconds: float, model: str = ''):
+    STAGE_SECONDS.observe(seconds, stage=stage, model=model)
+
+
+def stage_timer(stage: str, model: str = ''):
+    return STAGE_SECONDS.time(stage=stage, model=model)
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware recording ``HTTP_REQUEST_SECONDS`` per method, route and status.
+
+    Measured until the last body chunk is sent, so streamed responses count
+    their full duration. Routes are labelled by their path template to keep
+    label cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = {'code': 500, 'done': False}
+
+        def finish():
+            if not status['done']:
+                status['done'] = True
+                route = scope.get('route')
+                HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=scope['method'],
+                                             path=getattr(route, 'path', 'unmatched'), status=str(status['code']))
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+            await send(message)
+            if message['type'] == 'http.response.body' and not message.get('more_body', False):
+                finish()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            finish()
@@ -0,0 +1,279 @@
+"""
+Hyperparameter search for the CVD base models
+Randomized or successive-halving search over stratified k-fold splits, fitted in a
+process pool, with every (candidate, fold) result cached on disk
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+
+import joblib
+import numpy as np
+from scipy.stats import loguniform, randint, uniform
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import ParameterSampler, StratifiedKFold
+from threadpoolctl import threadpool_limits
+
+from model_fitting import FITTERS, SEED, model_params
+
+logger = logging.getLogger(__name__)
+
+# Distributions are sampled with scipy, lists uniformly; every key is a model_fitting hyperparameter
+SEARCH_SPACES = {
+    'svm': {
+        'C': loguniform(1e-2, 1e2),
+        'gamma': loguniform(1e-3, 1e0),
+    },
+    'random_forest': {
+        'n_estimators': randint(50, 401),
+        'max_depth': [None, 5, 8, 12, 15, 20],
+        'min_samples_split': randint(2, 11),
+        'min_samples_leaf': randint(1, 6),
+        'max_features': ['sqrt', 'log2', 0.5],
+    },
+    'gradient_boosting': {
+        'n_estimators': randint(50, 401),
+        'learning_rate': loguniform(1e-2, 3e-1),
+        'max_depth': randint(2, 8),
+        'min_samples_split': randint(2, 11),
+        'min_samples_leaf': randint(1, 6),
+        'subsample': uniform(0.6, 0.4),
+    },
+    'neural_network': {
+        'units': [(64, 32, 16), (128, 64, 32), (64, 32), (32, 16)],
+        'dropout': uniform(0.0, 0.5),
+        'learning_rate': loguniform(1e-4, 1e-2),
+        'batch_size': [16, 32, 64],
+    },
+}
+
+# Per-process state of the search workers, set once by _init_worker
+_WORKER = {}
+
+
+def _plain(value):
+    """JSON-friendly copy of a sampled value (NumPy scalars, tuples)"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return value
+
+
+def data_fingerprint(X, y):
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(X, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(y, dtype=np.int64).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def fold_indices(y, folds, seed):
+    """(train, validation) index pairs of a shuffled StratifiedKFold"""
+    splitter = StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed)
+    return list(splitter.split(np.zeros(len(y)), y))
+
+
+def _init_worker(X, y, folds, seed):
+    _WORKER.update(X=X, y=y, seed=seed, folds=fold_indices(y, folds, seed))
+
+
+def _fit_fold(model, params, fold, rows):
+    """Fit one candidate on one fold (its first ``rows`` shuffled training rows) and score it.
+
+    Runs single-threaded: the pool already keeps one process per core busy.
+    """
+    X, y = _WORKER['X'], _WORKER['y']
+    train, validation = _WORKER['folds'][fold]
+    if rows is not None and rows < len(train):
+        train = np.random.default_rng([_WORKER['seed'], fold]).permutation(train)[:rows]
+    if model == 'neural_network':
+        from tensorflow import keras
+        # a worker fits many networks; drop the previous ones' graphs and functions
+        keras.backend.clear_session()
+    started = time.perf_counter()
+    with threadpool_limits(limits=1):
+        fitted = FITTERS[model](X[train], y[train], n_threads=1, **params)
+        if model == 'neural_network':
+            proba = fitted.predict(X[validation], verbose=0).ravel()
+        else:
+            proba = fitted.predict_proba(X[validation])[:, 1]
+    return {'score': float(roc_auc_score(y[validation], proba)), 'fit_seconds': time.perf_counter() - started,
+            'validation_index': validation, 'validation_proba': proba.astype(np.float64)}
+
+
+class HyperparameterSearch:
+    """Search the hyperparameters of each base model by stratified k-fold ROC AUC.
+
+    ``strategy='random'`` scores ``n_candidates`` sampled configurations on
+    all training rows. ``'halving'`` (successive halving) scores them on a
+    subset of rows first and keeps the best ``1 / eta`` each round, growing
+    the rows by ``eta`` until the survivors see every row. The first
+    candidate is always the current default configuration, and sampling is
+    seeded, so raising ``n_candidates`` extends an earlier search.
+
+    Each (model, candidate, fold, rows) fit is stored under ``cache_dir``
+    (keyed by a hash of those and of the data), with its validation-fold
+    probabilities; an interrupted or extended search only fits what is
+    missing.
+    """
+
+    STRATEGIES = ('random', 'halving')
+
+    def __init__(self, X, y, folds=5, strategy='halving', n_candidates=20, eta=3, min_rows=60, n_jobs=None,
+                 cache_dir='.search_cache', seed=SEED):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown search strategy {strategy!r}; expected one of {self.STRATEGIES}")
+        self.X = np.ascontiguousarray(X, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.int64)
+        self.folds = folds
+        self.strategy = strategy
+        self.n_candidates = n_candidates
+        self.eta = eta
+        self.min_rows = min_rows
+        self.n_jobs = n_jobs or os.cpu_count() or 1
+        self.cache_dir = Path(cache_dir)
+        self.seed = seed
+        self.fingerprint = data_fingerprint(self.X, self.y)
+        self.train_rows = min(len(train) for train, _ in fold_indices(self.y, folds, seed))
+        self.reset_stats()
+        self._pool = None
+
+    def __enter__(self):
+        self._pool = ProcessPoolExecutor(max_workers=self.n_jobs, mp_context=get_context('spawn'),
+                                         initializer=_init_worker,
+                                         initargs=(self.X, self.y, self.folds, self.seed))
+        return self
+
+    def __exit__(self, *exc):
+        self._pool.shutdown(cancel_futures=True)
+        self._pool = None
+
+    def reset_stats(self):
+        self.stats = {'fits': 0, 'cache_hits': 0, 'fit_seconds': 0.0}
+
+    def candidates(self, model):
+        sampled = ParameterSampler(SEARCH_SPACES[model], n_iter=max(self.n_candidates - 1, 0),
+                                   random_state=self.seed)
+        return [{}] + [{key: _plain(value) for key, value in params.items()} for params in sampled]
+
+    def _cache_path(self, model, params, fold, rows):
+        # keyed on the resolved hyperparameters, so a changed default never reuses stale fits
+        key = json.dumps({'model': model, 'params': _plain(model_params(model, params)), 'fold': fold, 'folds': self.folds, 'rows': rows,
+                          'seed': self.seed, 'data': self.fingerprint}, sort_keys=True)
+        return self.cache_dir / model / f"{hashlib.sha256(key.encode()).hexdigest()[:24]}.joblib"
+
+    def evaluate(self, model, candidates, rows=None):
+        """Mean validation AUC per candidate; fits the (candidate, fold) pairs missing from the cache"""
+        scores = [[None] * self.folds for _ in candidates]
+        pending = {}
+        for c, params in enumerate(candidates):
+            for fold in range(self.folds):
+                path = self._cache_path(model, params, fold, rows)
+                if path.exists():
+                    scores[c][fold] = joblib.load(path)['score']
+                    self.stats['cache_hits'] += 1
+                else:
+                    pending[self._pool.submit(_fit_fold, model, params, fold, rows)] = (c, fold, path)
+        for future in as_completed(pending):
+            c, fold, path = pending[future]
+            result = future.result()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # write then rename, so an interrupted search never leaves a truncated entry
+            partial = path.with_suffix('.tmp')
+            joblib.dump({'params': candidates[c], 'fold': fold, 'rows': rows, **result}, partial)
+            os.replace(partial, path)
+            scores[c][fold] = result['score']
+            self.stats['fits'] += 1
+            self.stats['fit_seconds'] += result['fit_seconds']
+        return [float(np.mean(fold_scores)) for fold_scores in scores]
+
+    def out_of_fold(self, model, params=None):
+        """P(class=1) for every row from the fold model that did not see it (fits only uncached folds)"""
+        params = params or {}
+        self.evaluate(model, [params])
+        proba = np.empty(len(self.y), dtype=np.float64)
+        for fold in range(self.folds):
+            entry = joblib.load(self._cache_path(model, params, fold, None))
+            proba[entry['validation_index']] = entry['validation_proba']
+        return proba
+
+    def _rounds(self, n_candidates):
+        """Training rows per successive-halving round, ending with all of them"""
+        if self.strategy == 'random' or n_candidates <= 1:
+            return [None]
+        n_rounds = int(math.floor(math.log(n_candidates, self.eta) + 1e-9)) + 1
+        rounds = []
+        for r in range(n_rounds):
+            rows = int(self.train_rows / self.eta ** (n_rounds - 1 - r))
+            if rows >= self.train_rows:
+                rows = None
+            elif rows < self.min_rows:
+                continue
+            rounds.append(rows)
+        return rounds if rounds and rounds[-1] is None else rounds + [None]
+
+    def search(self, model):
+        """Best overrides for ``model`` plus the per-round history"""
+        if self._pool is None:
+            with self:
+                return self.search(model)
+        started = time.perf_counter()
+        self.reset_stats()
+        candidates = self.candidates(model)
+        history = []
+        survivors = list(range(len(candidates)))
+        rounds = self._rounds(len(candidates))
+        for r, rows in enumerate(rounds):
+            scores = self.evaluate(model, [candidates[c] for c in survivors], rows)
+            # stable sort: ties keep sampling order, so the defaults win a tie
+            ranked = [c for _, c in sorted(zip(scores, survivors), key=lambda pair: -pair[0])]
+            history.append({'rows': rows or self.train_rows, 'candidates': len(survivors),
+                            'best_score': round(max(scores), 6)})
+            logger.info(f"{model}: round {r + 1}/{len(rounds)} scored {len(survivors)} candidates on "
+                        f"{rows or self.train_rows} rows, best AUC {max(scores):.4f}")
+            best_score = max(scores)
+            if r < len(rounds) - 1:
+                survivors = ranked[:max(1, math.ceil(len(survivors) / self.eta))]
+            else:
+                survivors = ranked[:1]
+        best = survivors[0]
+        default_score = self.evaluate(model, [{}])[0]
+        return {'params': candidates[best], 'cv_auc': round(best_score, 6), 'default_cv_auc': round(default_score, 6),
+                'candidates': len(candidates), 'rounds': history, 'fits': self.stats['fits'],
+                'cache_hits': self.stats['cache_hits'], 'fit_seconds': round(self.stats['fit_seconds'], 3),
+                'wall_seconds': round(time.perf_counter() - started, 3)}
+
+    def run(self, models):
+        with self:
+            return {model: self.search(model) for model in models}
+
+    def report(self, results):
+        return {
+            'generated_at': datetime.now().isoformat(),
+            'strategy': self.strategy,
+            'folds': self.folds,
+            'scoring': 'roc_auc',
+            'seed': self.seed,
+            'models': results,
+        }
+
+
+def write_best_params(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Saved {path}")
+
+
+def load_best_params(path):
+    """Per-model overrides from a best_params.json, as CVDModelTrainer(params=...) takes them"""
+    with open(path) as f:
+        report = json.load(f)
+    return {name: result['params'] for name, result in report['models'].items()}
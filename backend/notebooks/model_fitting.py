@@ -0,0 +1,209 @@
+"""
+Model fitting jobs for CVDModelTrainer, runnable in-process or in a process pool
+Each fit function is self-contained (data in, fitted model out) so the four
+base models can train concurrently without sharing state
+"""
+
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+from sklearn.svm import SVC
+from threadpoolctl import threadpool_limits
+
+logger = logging.getLogger(__name__)
+
+SEED = 42
+MODEL_NAMES = ('svm', 'random_forest', 'gradient_boosting', 'neural_network')
+
+
+# Hyperparameters each fit function uses unless overridden (see hyperparameter_search)
+DEFAULT_PARAMS = {
+    'svm': {'C': 1.0, 'gamma': 'scale'},
+    'random_forest': {'n_estimators': 100, 'max_depth': 15, 'min_samples_split': 5, 'min_samples_leaf': 2,
+                      'max_features': 'sqrt'},
+    'gradient_boosting': {'n_estimators': 100, 'learning_rate': 0.1, 'max_depth': 5, 'min_samples_split': 5,
+                          'min_samples_leaf': 2, 'subsample': 1.0},
+    'neural_network': {'units': (64, 32, 16), 'dropout': (0.3, 0.3, 0.2), 'learning_rate': 0.001,
+                       'batch_size': 16, 'epochs': 100, 'patience': 10},
+}
+
+
+def model_params(name, params=None):
+    """DEFAULT_PARAMS for ``name`` updated with ``params``; unknown keys are an error"""
+    merged = dict(DEFAULT_PARAMS[name])
+    unknown = set(params or {}) - set(merged)
+    if unknown:
+        raise ValueError(f"Unknown {name} hyperparameters: {sorted(unknown)}")
+    merged.update(params or {})
+    return merged
+
+
+def fit_svm(X, y, n_threads=1, **params):
+    """libsvm is single-threaded; n_threads only bounds BLAS in the kernel cache"""
+    svm = SVC(kernel='rbf', probability=True, random_state=SEED, **model_params('svm', params))
+    return svm.fit(X, y)
+
+
+def fit_random_forest(X, y, n_threads=-1, **params):
+    rf = RandomForestClassifier(random_state=SEED, n_jobs=n_threads, **model_params('random_forest', params))
+    return rf.fit(X, y)
+
+
+def fit_gradient_boosting(X, y, n_threads=1, **params):
+    gb = GradientBoostingClassifier(random_state=SEED, **model_params('gradient_boosting', params))
+    return gb.fit(X, y)
+
+
+def build_neural_network(n_features, units=(64, 32, 16), dropout=(0.3, 0.3, 0.2), learning_rate=0.001):
+    from tensorflow import keras
+    from tensorflow.keras import layers
+
+    # one dropout rate per hidden layer, or a single rate for all of them
+    rates = dropout if isinstance(dropout, (list, tuple)) else [dropout] * len(units)
+    model = keras.Sequential([keras.Input(shape=(n_features,))])
+    for width, rate in zip(units, rates):
+        model.add(layers.Dense(width, activation='relu'))
+        model.add(layers.Dropout(rate))
+    model.add(layers.Dense(1, activation='sigmoid'))
+    model.compile(
+        optimizer=keras.optimizers.Adam(learning_rate=learning_rate),
+        loss='binary_crossentropy',
+        metrics=['accuracy', keras.metrics.AUC()]
+    )
+    return model
+
+
+def fit_neural_network(X, y, n_threads=None, **params):
+    """Keras MLP with early stopping; seeds are reset here so the result does not
+    depend on what else ran in the process before"""
+    import tensorflow as tf
+    from tensorflow import keras
+
+    params = model_params('neural_network', params)
+    if isinstance(params['dropout'], (list, tuple)) and len(params['units']) != len(params['dropout']):
+        raise ValueError("neural_network needs one dropout rate per hidden layer")
+    if n_threads:
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(n_threads)
+            tf.config.threading.set_inter_op_parallelism_threads(1)
+        except RuntimeError:
+            # TensorFlow already initialised in this process; keep its pools
+            pass
+    keras.utils.set_random_seed(SEED)
+
+    model = build_neural_network(X.shape[1], params['units'], params['dropout'], params['learning_rate'])
+    early_stop = keras.callbacks.EarlyStopping(
+        monitor='val_loss',
+        patience=params['patience'],
+        restore_best_weights=True
+    )
+    model.fit(
+        X, y,
+        epochs=params['epochs'],
+        batch_size=params['batch_size'],
+        validation_split=0.2,
+        callbacks=[early_stop],
+        verbose=0
+    )
+    return model
+
+
+FITTERS = {
+    'svm': fit_svm,
+    'random_forest': fit_random_forest,
+    'gradient_boosting': fit_gradient_boosting,
+    'neural_network': fit_neural_network,
+}
+
+
+def thread_budgets(n_cores=None, names=MODEL_NAMES):
+    """Split the cores between concurrently training models.
+
+    SVC and GradientBoosting fit single-threaded, so they get one core each;
+    the NN gets a quarter of the machine and the random forest, whose trees
+    parallelise perfectly, takes the rest. With at least one core per model
+    the total is the core count, so BLAS/OpenMP pools in different workers
+    do not oversubscribe; with fewer cores every model gets one thread and
+    ``fit_models_parallel`` runs at most ``n_cores`` of them at a time.
+    """
+    n_cores = n_cores or os.cpu_count() or 1
+    budgets = {name: 1 for name in names}
+    if 'neural_network' in budgets:
+        budgets['neural_network'] = max(1, n_cores // 4)
+    if 'random_forest' in budgets:
+        budgets['random_forest'] = max(1, n_cores - sum(v for k, v in budgets.items() if k != 'random_forest'))
+    return budgets
+
+
+def _fit_job(name, X, y, n_threads, scratch_dir, params=None):
+    """Process-pool entry point: fit one model under its thread budget.
+
+    Keras models are returned as a saved ``.h5`` path (reloaded by the
+    parent) since they do not pickle reliably across TensorFlow versions.
+    """
+    started = time.perf_counter()
+    with threadpool_limits(limits=n_threads):
+        model = FITTERS[name](X, y, n_threads=n_threads, **(params or {}))
+    seconds = time.perf_counter() - started
+    if name == 'random_forest':
+        # the budget applies to fitting only; ship the same params as the sequential path
+        model.set_params(n_jobs=-1)
+    if name == 'neural_network':
+        path = Path(scratch_dir) / f'{name}.h5'
+        model.save(path)
+        return name, str(path), seconds
+    return name, model, seconds
+
+
+def fit_models_sequential(X, y, names=MODEL_NAMES, params=None):
+    """Fit each model in this process, one after another; returns (models, wall seconds per model).
+
+    ``params`` maps model name to hyperparameter overrides.
+    """
+    params = params or {}
+    models, timings = {}, {}
+    for name in names:
+        logger.info(f"Training {name}...")
+        started = time.perf_counter()
+        models[name] = FITTERS[name](X, y, **params.get(name, {}))
+        timings[name] = time.perf_counter() - started
+        logger.info(f"{name} trained in {timings[name]:.2f}s")
+    return models, timings
+
+
+def fit_models_parallel(X, y, names=MODEL_NAMES, max_workers=None, n_cores=None, params=None):
+    """Fit the models concurrently in spawned worker processes.
+
+    Every worker caps its BLAS/OpenMP threads (and TensorFlow's pools or the
+    forest's ``n_jobs``) at its share from ``thread_budgets``, and no more
+    models run at once than there are cores. Fixed seeds in the fit
+    functions make the models match ``fit_models_sequential``.
+    """
+    params = params or {}
+    n_cores = n_cores or os.cpu_count() or 1
+    budgets = thread_budgets(n_cores, names)
+    # below one core per model every budget is 1; queue the rest rather than oversubscribe
+    max_workers = min(max_workers or len(names), n_cores)
+    models, timings = {}, {}
+    X = np.ascontiguousarray(X)
+    y = np.asarray(y)
+    with tempfile.TemporaryDirectory() as scratch_dir, \
+            ProcessPoolExecutor(max_workers=max_workers, mp_context=get_context('spawn')) as pool:
+        futures = {pool.submit(_fit_job, name, X, y, budgets[name], scratch_dir, params.get(name)): name
+                   for name in names}
+        for future in as_completed(futures):
+            name, model, seconds = future.result()
+            if name == 'neural_network':
+                from tensorflow import keras
+                model = keras.models.load_model(model)
+            models[name] = model
+            timings[name] = seconds
+            logger.info(f"{name} trained in {seconds:.2f}s ({budgets[name]} threads)")
+    return {name: models[name] for name in names}, timings
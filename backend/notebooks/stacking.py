@@ -0,0 +1,144 @@
+"""
+Learned ensemble weights for CVDModelTrainer
+Fits the blend the API applies (models/ensemble.json) and its early-exit
+cascade (models/cascade.json) on out-of-fold probabilities
+"""
+
+import logging
+from datetime import datetime
+from itertools import combinations
+
+import numpy as np
+from scipy.optimize import nnls
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import log_loss, roc_auc_score
+
+from cascade import CascadePlan, CascadeScorer, risk_bands
+from ensemble import Blend, CompiledEnsemble
+from hyperparameter_search import HyperparameterSearch
+
+logger = logging.getLogger(__name__)
+
+BLEND_METHODS = ('logistic', 'nnls', 'fixed')
+
+
+def out_of_fold_probabilities(X, y, names, params=None, folds=5, n_jobs=None, cache_dir='.search_cache'):
+    """(n, len(names)) matrix of each base model's out-of-fold P(class=1).
+
+    Fold fits go through HyperparameterSearch, so they run in its process
+    pool and share its cache: a search with the same folds has already
+    fitted the winning configuration on every fold.
+    """
+    params = params or {}
+    with HyperparameterSearch(X, y, folds=folds, strategy='random', n_jobs=n_jobs, cache_dir=cache_dir) as search:
+        columns = []
+        for name in names:
+            search.reset_stats()
+            columns.append(search.out_of_fold(name, params.get(name, {})))
+            logger.info(f"Out-of-fold {name}: {search.stats['fits']} fits, {search.stats['cache_hits']} cached")
+        return np.column_stack(columns)
+
+
+def fit_blend(oof, y, names, method='logistic', fixed_weights=None, folds=None):
+    """Blend of the base models fitted on their out-of-fold probabilities.
+
+    ``logistic`` is a logistic-regression meta-learner (calibrated output);
+    ``nnls`` finds non-negative least-squares weights normalised to sum to
+    one, i.e. a weighted average like the fixed weights; ``fixed`` keeps
+    ``fixed_weights`` and only reports how they score.
+    """
+    y = np.asarray(y)
+    if method == 'logistic':
+        meta = LogisticRegression(C=1.0, max_iter=1000).fit(oof, y)
+        blend = Blend(weights=dict(zip(names, meta.coef_[0].tolist())), intercept=float(meta.intercept_[0]),
+                      link='logistic')
+    elif method == 'nnls':
+        weights, _ = nnls(oof, y.astype(np.float64))
+        weights = weights / weights.sum() if weights.sum() > 0 else np.full(len(names), 1.0 / len(names))
+        blend = Blend(weights=dict(zip(names, weights.tolist())))
+    elif method == 'fixed':
+        blend = Blend(weights=dict(fixed_weights))
+    else:
+        raise ValueError(f"Unknown blend method {method!r}; expected one of {BLEND_METHODS}")
+
+    blended = blend.combine(oof, names)
+    info = {
+        'method': method,
+        'folds': folds,
+        'rows': int(len(y)),
+        'generated_at': datetime.now().isoformat(),
+        'oof_auc': {name: round(float(roc_auc_score(y, oof[:, j])), 6) for j, name in enumerate(names)},
+        'oof_ensemble_auc': round(float(roc_auc_score(y, blended)), 6),
+        'oof_ensemble_log_loss': round(float(log_loss(y, np.clip(blended, 1e-7, 1 - 1e-7))), 6),
+    }
+    logger.info(f"{method} blend: weights {blend.weights}, intercept {blend.intercept:.4f}, "
+                f"out-of-fold AUC {info['oof_ensemble_auc']:.4f}")
+    return Blend(weights=blend.weights, intercept=blend.intercept, link=blend.link, info=info)
+
+
+def fit_cascade(oof, names, blend, costs, thresholds, margin=0.05):
+    """Cheapest early-exit ``CascadePlan`` for ``blend``, judged on out-of-fold probabilities.
+
+    Every proper subset of ``names`` is tried as the first stage. The
+    remaining models' part of the blend score is regressed (least squares)
+    on the first-stage probabilities, and the residual range on ``oof``,
+    widened on each side by ``margin`` times the range those models can
+    span, bounds it. A plan's expected cost per row is its first stage's
+    cost plus the rest's times the share of rows that do not exit;
+    ``costs`` is the seconds per call of each model. The bounds are
+    empirical: they hold on ``oof``, not for every possible row.
+    """
+    names = list(names)
+    # only the blend is used: CascadeScorer.decide never calls the models
+    ensemble = CompiledEnsemble(dict.fromkeys(names), blend)
+    oof = np.asarray(oof, dtype=np.float64)[:, [names.index(name) for name in ensemble.model_names]]
+    total = sum(costs[name] for name in names)
+    best, candidates = None, []
+    for size in range(1, len(names)):
+        for first in combinations(ensemble.model_names, size):
+            bare = CascadeScorer(ensemble, CascadePlan(first=first), thresholds)
+            rest_score = oof[:, bare.rest] @ ensemble.weights[bare.rest]
+            design = np.column_stack([np.ones(len(oof)), oof[:, bare.first]])
+            solution = np.linalg.lstsq(design, rest_score, rcond=None)[0]
+            residual = rest_score - design @ solution
+            pad = margin * (bare.hard_high - bare.hard_low)
+            plan = CascadePlan(first=first, coef=dict(zip(first, solution[1:].tolist())),
+                               intercept=float(solution[0]), residual_low=float(residual.min() - pad),
+                               residual_high=float(residual.max() + pad))
+            exits, _ = CascadeScorer(ensemble, plan, thresholds).decide(oof[:, bare.first])
+            exit_rate = float(exits.mean())
+            cost = sum(costs[name] for name in first) + (1 - exit_rate) * (total - sum(costs[name] for name in first))
+            candidates.append({'first': list(first), 'oof_exit_rate': round(exit_rate, 4),
+                               'expected_cost_ratio': round(cost / total, 4)})
+            if best is None or cost < best[0]:
+                best = (cost, plan, exit_rate)
+
+    cost, plan, exit_rate = best
+    info = {
+        'method': 'calibrated',
+        # residual range on the out-of-fold rows plus the margin: not a guarantee on new rows
+        'bounds': 'approximate',
+        'margin': margin,
+        'rows': int(len(oof)),
+        'generated_at': datetime.now().isoformat(),
+        'thresholds': list(thresholds),
+        'model_seconds': {name: round(costs[name], 9) for name in names},
+        'oof_exit_rate': round(exit_rate, 4),
+        'expected_cost_ratio': round(cost / total, 4),
+        'candidates': sorted(candidates, key=lambda c: c['expected_cost_ratio']),
+    }
+    logger.info(f"Cascade: first stage {list(plan.first)} exits {exit_rate:.1%} of out-of-fold rows, "
+                f"expected cost {cost / total:.1%} of the full ensemble")
+    return CascadePlan(first=plan.first, coef=plan.coef, intercept=plan.intercept, residual_low=plan.residual_low,
+                       residual_high=plan.residual_high, info=info)
+
+
+def cascade_agreement(plan, blend, per_model, names, thresholds):
+    """(exit rate, risk-level agreement with the full blend) of ``plan`` on an (n, len(names)) probability matrix"""
+    ensemble = CompiledEnsemble(dict.fromkeys(names), blend)
+    per_model = np.asarray(per_model, dtype=np.float64)[:, [list(names).index(name) for name in ensemble.model_names]]
+    scorer = CascadeScorer(ensemble, plan, thresholds)
+    exits, estimate = scorer.decide(per_model[:, scorer.first])
+    full = ensemble.blend_scores(per_model)
+    agree = np.where(exits, risk_bands(estimate, thresholds) == risk_bands(full, thresholds), True)
+    return float(exits.mean()), float(agree.mean())
@@ -4,23 +4,34 @@ Trains SVM, Random Forest, Gradient Boosting, and Deep Neural Network models
 """
 
 import numpy as np
-import pandas as pd
-from sklearn.model_selection import train_test_split, cross_val_score
+from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
-from sklearn.svm import SVC
-from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+from sklearn.cluster import KMeans
 from sklearn.metrics import (
     accuracy_score, precision_score, recall_score, f1_score,
     roc_auc_score, confusion_matrix, roc_curve, auc
 )
 import tensorflow as tf
-from tensorflow import keras
-from tensorflow.keras import layers
 import joblib
 import matplotlib.pyplot as plt
 import seaborn as sns
 from pathlib import Path
+from datetime import datetime
+import argparse
+import json
 import logging
+import sys
+import time
+
+# Make the backend modules (compiled_models, config) importable from notebooks/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from compiled_models import CompiledForest, NumpyMLP, NumpySVM, dump_arrays
+from model_fitting import FITTERS, MODEL_NAMES, fit_models_parallel, model_params
+from hyperparameter_search import HyperparameterSearch, load_best_params, write_best_params
+from stacking import BLEND_METHODS, cascade_agreement, fit_blend, fit_cascade, out_of_fold_probabilities
+from ensemble import Blend, positive_probability
+from config import ENSEMBLE_WEIGHTS, FEATURE_NAMES, RISK_THRESHOLDS
+from tabular import TARGET, read_frame
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -33,8 +44,10 @@ tf.random.set_seed(42)
 class CVDModelTrainer:
     """Train and evaluate ensemble models for CVD detection"""
     
-    def __init__(self, data_path=None):
+    def __init__(self, data_path=None, params=None):
         self.data_path = data_path
+        # per-model hyperparameter overrides, e.g. the best_params.json of a search
+        self.params = params or {}
         self.X_train = None
         self.X_test = None
         self.y_train = None
@@ -42,6 +55,10 @@ class CVDModelTrainer:
         self.scaler = None
         self.models = {}
         self.metrics = {}
+        self.timings = {}
+        self.blend = Blend(weights=dict(ENSEMBLE_WEIGHTS), info={'method': 'fixed'})
+        self.oof = None
+        self.cascade = None
         
     def load_data(self):
         """Load and prepare CVD dataset"""
@@ -52,10 +69,10 @@ class CVDModelTrainer:
             logger.info("Creating synthetic CVD dataset...")
             self.X, self.y = self._create_synthetic_data()
         else:
-            # Load from CSV
-            df = pd.read_csv(self.data_path)
-            self.X = df.drop('target', axis=1)
-            self.y = df['target']
+            # CSV, Parquet or Arrow IPC, projected to the model columns
+            df = read_frame(self.data_path, columns=FEATURE_NAMES + [TARGET])
+            self.X = df[FEATURE_NAMES]
+            self.y = df[TARGET]
         
         logger.info(f"Dataset shape: {self.X.shape}")
         logger.info(f"Class distribution: {np.bincount(self.y)}")
@@ -108,82 +125,42 @@ class CVDModelTrainer:
         
         return X.astype(float), y.astype(int)
     
+    def _train(self, name):
+        started = time.perf_counter()
+        self.models[name] = FITTERS[name](self.X_train, self.y_train, **self.params.get(name, {}))
+        self.timings[name] = time.perf_counter() - started
+        logger.info(f"{name} training completed in {self.timings[name]:.2f}s")
+
     def train_svm(self):
         """Train Support Vector Machine model"""
         logger.info("Training SVM model...")
-        svm = SVC(kernel='rbf', C=1.0, gamma='scale', probability=True, random_state=42)
-        svm.fit(self.X_train, self.y_train)
-        self.models['svm'] = svm
-        logger.info("SVM training completed")
+        self._train('svm')
     
     def train_random_forest(self):
         """Train Random Forest model"""
         logger.info("Training Random Forest model...")
-        rf = RandomForestClassifier(
-            n_estimators=100,
-            max_depth=15,
-            min_samples_split=5,
-            min_samples_leaf=2,
-            random_state=42,
-            n_jobs=-1
-        )
-        rf.fit(self.X_train, self.y_train)
-        self.models['random_forest'] = rf
-        logger.info("Random Forest training completed")
+        self._train('random_forest')
     
     def train_gradient_boosting(self):
         """Train Gradient Boosting model"""
         logger.info("Training Gradient Boosting model...")
-        gb = GradientBoostingClassifier(
-            n_estimators=100,
-            learning_rate=0.1,
-            max_depth=5,
-            min_samples_split=5,
-            min_samples_leaf=2,
-            random_state=42
-        )
-        gb.fit(self.X_train, self.y_train)
-        self.models['gradient_boosting'] = gb
-        logger.info("Gradient Boosting training completed")
+        self._train('gradient_boosting')
     
     def train_neural_network(self):
         """Train Deep Neural Network model"""
         logger.info("Training Neural Network model...")
-        
-        model = keras.Sequential([
-            layers.Dense(64, activation='relu', input_shape=(self.X_train.shape[1],)),
-            layers.Dropout(0.3),
-            layers.Dense(32, activation='relu'),
-            layers.Dropout(0.3),
-            layers.Dense(16, activation='relu'),
-            layers.Dropout(0.2),
-            layers.Dense(1, activation='sigmoid')
-        ])
-        
-        model.compile(
-            optimizer=keras.optimizers.Adam(learning_rate=0.001),
-            loss='binary_crossentropy',
-            metrics=['accuracy', keras.metrics.AUC()]
-        )
-        
-        # Train with early stopping
-        early_stop = keras.callbacks.EarlyStopping(
-            monitor='val_loss',
-            patience=10,
-            restore_best_weights=True
-        )
-        
-        model.fit(
-            self.X_train, self.y_train,
-            epochs=100,
-            batch_size=16,
-            validation_split=0.2,
-            callbacks=[early_stop],
-            verbose=0
-        )
-        
-        self.models['neural_network'] = model
-        logger.info("Neural Network training completed")
+        self._train('neural_network')
+
+    def train_parallel(self, max_workers=None):
+        """Train the four models concurrently in worker processes, each under its own thread budget"""
+        logger.info("Training all models in parallel...")
+        started = time.perf_counter()
+        models, timings = fit_models_parallel(self.X_train, self.y_train, max_workers=max_workers,
+                                              params=self.params)
+        self.models.update(models)
+        self.timings.update(timings)
+        logger.info(f"Parallel training completed in {time.perf_counter() - started:.2f}s "
+                    f"(sum of per-model times {sum(timings.values()):.2f}s)")
     
     def evaluate_models(self):
         """Evaluate all trained models"""
@@ -221,26 +198,73 @@ class CVDModelTrainer:
             logger.info(f"  F1-Score: {f1:.4f}")
             logger.info(f"  AUC: {auc_score:.4f}")
     
+    def fit_blend(self, method='logistic', folds=5, n_jobs=None, cache_dir='.search_cache'):
+        """Learn the ensemble blend from each base model's out-of-fold probabilities on the training split"""
+        names = [name for name in MODEL_NAMES if name in self.models]
+        if method == 'fixed':
+            self.blend = Blend(weights=dict(ENSEMBLE_WEIGHTS), info={'method': 'fixed'})
+            return
+        logger.info(f"Fitting {method} blend on {folds}-fold out-of-fold predictions...")
+        self.oof = out_of_fold_probabilities(self.X_train, self.y_train, names, self.params, folds=folds,
+                                             n_jobs=n_jobs, cache_dir=cache_dir)
+        self.blend = fit_blend(self.oof, self.y_train, names, method=method, folds=folds)
+
+    def model_seconds(self, repeats=200):
+        """Median seconds of a single-row call to each model in the form the API serves it"""
+        served = {
+            'svm': NumpySVM.from_sklearn(self.models['svm']),
+            'random_forest': CompiledForest.from_sklearn(self.models['random_forest']),
+            'gradient_boosting': CompiledForest.from_sklearn(self.models['gradient_boosting']),
+            'neural_network': NumpyMLP.from_keras(self.models['neural_network']),
+        }
+        row = np.ascontiguousarray(self.X_test[:1], dtype=np.float64)
+        seconds = {}
+        for name, model in served.items():
+            samples = []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                positive_probability(model, row)
+                samples.append(time.perf_counter() - started)
+            seconds[name] = float(np.median(samples))
+        return seconds
+
+    def fit_cascade(self, margin=0.05):
+        """Calibrate the API's early-exit cascade (cascade.json) on the blend's out-of-fold probabilities"""
+        if self.oof is None:
+            logger.info("No out-of-fold predictions (fixed blend); the API will cascade with the hard bounds")
+            self.cascade = None
+            return
+        names = [name for name in MODEL_NAMES if name in self.models]
+        thresholds = (RISK_THRESHOLDS['low'], RISK_THRESHOLDS['moderate'])
+        plan = fit_cascade(self.oof, names, self.blend, self.model_seconds(), thresholds, margin=margin)
+        exit_rate, agreement = cascade_agreement(plan, self.blend, self.predict_per_model(self.X_test), names,
+                                                 thresholds)
+        plan.info.update(test_exit_rate=round(exit_rate, 4), test_agreement=round(agreement, 4))
+        logger.info(f"Cascade on the test split: {exit_rate:.1%} of rows exit early, "
+                    f"risk level agrees with the full ensemble on {agreement:.2%}")
+        self.cascade = plan
+
+    def background_rows(self, n_rows=32, X=None):
+        """Representative training patients in raw units, most typical first; the API explains against them"""
+        X = self.X_train if X is None else X
+        if len(X) > 10_000:
+            X = X[np.random.default_rng(42).choice(len(X), 10_000, replace=False)]
+        kmeans = KMeans(n_clusters=min(n_rows, len(X)), n_init=4, random_state=42).fit(X)
+        # the real patient closest to each centre, largest clusters first
+        medoids = np.array([np.argmin(((X - centre) ** 2).sum(axis=1)) for centre in kmeans.cluster_centers_])
+        order = np.argsort(-np.bincount(kmeans.labels_, minlength=len(medoids)), kind='stable')
+        return np.round(self.scaler.inverse_transform(X[medoids[order]]), 6)
+
+    def predict_per_model(self, X):
+        """(n, len(models)) P(class=1) of every trained model, in self.models order"""
+        return np.column_stack([
+            model.predict(X, verbose=0).flatten() if name == 'neural_network' else model.predict_proba(X)[:, 1]
+            for name, model in self.models.items()
+        ])
+
     def ensemble_predict(self, X):
         """Make ensemble predictions"""
-        weights = {
-            'svm': 0.25,
-            'random_forest': 0.25,
-            'gradient_boosting': 0.30,
-            'neural_network': 0.20
-        }
-        
-        ensemble_proba = np.zeros(X.shape[0])
-        
-        for model_name, model in self.models.items():
-            if model_name == 'neural_network':
-                proba = model.predict(X, verbose=0).flatten()
-            else:
-                proba = model.predict_proba(X)[:, 1]
-            
-            ensemble_proba += proba * weights[model_name]
-        
-        return ensemble_proba
+        return self.blend.combine(self.predict_per_model(X), list(self.models))
     
     def evaluate_ensemble(self):
         """Evaluate ensemble model"""
@@ -280,11 +304,62 @@ class CVDModelTrainer:
         joblib.dump(self.models['random_forest'], f'{output_dir}/rf_model.pkl')
         joblib.dump(self.models['gradient_boosting'], f'{output_dir}/gb_model.pkl')
         joblib.dump(self.scaler, f'{output_dir}/scaler.pkl')
-        
-        # Save neural network
+
+        # Packed tree arrays for the API's compiled predictor; replaced, never
+        # rewritten, since a running API may have the current ones memory-mapped
+        dump_arrays(CompiledForest.from_sklearn(self.models['random_forest']).to_arrays(),
+                    f'{output_dir}/rf_trees.joblib')
+        dump_arrays(CompiledForest.from_sklearn(self.models['gradient_boosting']).to_arrays(),
+                    f'{output_dir}/gb_trees.joblib')
+        svm = NumpySVM.from_sklearn(self.models['svm'])
+        error = np.abs(svm.predict_proba(self.X_test) - self.models['svm'].predict_proba(self.X_test)).max()
+        if error > 1e-6:
+            raise RuntimeError(f"NumPy SVM export deviates from predict_proba by {error:.2e}")
+        dump_arrays(svm.to_arrays(), f'{output_dir}/svm_kernel.joblib')
+        
+        # Save neural network, plus the TensorFlow-free weights the API serves
         self.models['neural_network'].save(f'{output_dir}/nn_model.h5')
+        mlp = NumpyMLP.from_keras(self.models['neural_network'])
+        error = mlp.max_abs_error(self.models['neural_network'], self.X_test)
+        if error > 1e-4:
+            raise RuntimeError(f"NumPy MLP export deviates from Keras by {error:.2e}")
+        mlp.save(f'{output_dir}/nn_weights.npz')
+        logger.info(f"Exported nn_weights.npz (max deviation from Keras {error:.2e})")
+
+        joblib.dump({'rows': self.background_rows(), 'feature_names': FEATURE_NAMES},
+                    f'{output_dir}/background.joblib')
+        logger.info("Saved background.joblib")
+        self.blend.save(f'{output_dir}/ensemble.json')
+        logger.info("Saved ensemble.json")
+        cascade_path = Path(output_dir) / 'cascade.json'
+        if self.cascade is not None:
+            self.cascade.save(cascade_path)
+            logger.info("Saved cascade.json")
+        elif cascade_path.exists():
+            # calibrated for an earlier blend; it would not hold for this one
+            cascade_path.unlink()
+
+        self.save_metrics(output_dir)
         
         logger.info("Models saved successfully")
+
+    def hyperparameters(self):
+        """Hyperparameters each trained model was fitted with, as recorded in metrics.json"""
+        return {name: model_params(name, self.params.get(name)) for name in self.models}
+
+    def save_metrics(self, output_dir='../backend/models'):
+        """Write the held-out evaluation next to the artifacts; the API serves it on /metrics"""
+        report = {
+            'generated_at': datetime.now().isoformat(),
+            'test_samples': int(len(self.y_test)),
+            'training_seconds': {name: round(seconds, 3) for name, seconds in self.timings.items()},
+            'hyperparameters': self.hyperparameters(),
+            'models': {name: {metric: float(value) for metric, value in scores.items()}
+                       for name, scores in self.metrics.items()},
+        }
+        with open(f'{output_dir}/metrics.json', 'w') as f:
+            json.dump(report, f, indent=2)
+        logger.info("Saved metrics.json")
     
     def plot_results(self, output_dir='../backend/models'):
         """Generate visualization plots"""
@@ -361,24 +436,89 @@ class CVDModelTrainer:
         plt.savefig(f'{output_dir}/confusion_matrices.png', dpi=300)
         logger.info("Saved confusion_matrices.png")
     
-    def train_all(self):
-        """Train all models"""
+    def train_all(self, parallel=False, max_workers=None, output_dir='../backend/models', blend='fixed',
+                  stack_folds=5, cache_dir=None):
+        """Train all models; ``parallel`` fits them concurrently in a process pool.
+
+        ``blend`` other than 'fixed' adds ``stack_folds`` out-of-fold fits per
+        model, cached in ``cache_dir`` (default ``output_dir/.search_cache``).
+        """
+        if cache_dir is None:
+            cache_dir = Path(output_dir) / '.search_cache'
         self.load_data()
-        self.train_svm()
-        self.train_random_forest()
-        self.train_gradient_boosting()
-        self.train_neural_network()
+        if parallel:
+            self.train_parallel(max_workers)
+        else:
+            self.train_svm()
+            self.train_random_forest()
+            self.train_gradient_boosting()
+            self.train_neural_network()
+        self.fit_blend(blend, folds=stack_folds, n_jobs=max_workers, cache_dir=cache_dir)
+        self.fit_cascade()
         self.evaluate_models()
         self.evaluate_ensemble()
-        self.save_models()
-        self.plot_results()
+        self.save_models(output_dir)
+        self.plot_results(output_dir)
         
         logger.info("\nTraining completed successfully!")
         return self.metrics
 
+def search_hyperparameters(trainer, args):
+    """``search`` subcommand: tune on the training split, write best_params.json, then retrain with it"""
+    trainer.load_data()
+    search = HyperparameterSearch(trainer.X_train, trainer.y_train, folds=args.folds, strategy=args.strategy,
+                                  n_candidates=args.candidates, eta=args.eta, n_jobs=args.jobs,
+                                  cache_dir=args.cache_dir)
+    results = search.run(args.models)
+    for name, result in results.items():
+        logger.info(f"{name}: CV AUC {result['cv_auc']:.4f} (defaults {result['default_cv_auc']:.4f}) "
+                    f"with {result['params'] or 'the defaults'}; {result['fits']} fits, "
+                    f"{result['cache_hits']} cached, {result['wall_seconds']:.1f}s")
+    Path(args.output_dir).mkdir(parents=True, exist_ok=True)
+    write_best_params(search.report(results), f'{args.output_dir}/best_params.json')
+    if args.search_only:
+        return None
+    trainer.params.update({name: result['params'] for name, result in results.items()})
+    return trainer.train_all(parallel=args.parallel, max_workers=args.workers, output_dir=args.output_dir,
+                             blend=args.blend, stack_folds=args.folds, cache_dir=args.cache_dir)
+
+
 if __name__ == "__main__":
-    trainer = CVDModelTrainer()
-    metrics = trainer.train_all()
+    parser = argparse.ArgumentParser(description="Train the CVD ensemble models")
+    parser.add_argument('--data', help="CSV, Parquet or Arrow IPC with the 13 features and a 'target' column "
+                             "(synthetic data if omitted)")
+    parser.add_argument('--output-dir', default='../backend/models')
+    parser.add_argument('--parallel', action='store_true',
+                        help="fit the models concurrently in worker processes")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="process pool size for --parallel (default: one per model)")
+    parser.add_argument('--params', help="best_params.json from a search; its hyperparameters override the defaults")
+    parser.add_argument('--blend', choices=BLEND_METHODS, default='logistic',
+                        help="how ensemble.json combines the models: logistic meta-learner or NNLS weights fitted "
+                             "on out-of-fold predictions, or the fixed config.ENSEMBLE_WEIGHTS")
+    commands = parser.add_subparsers(dest='command')
+    search_parser = commands.add_parser('search', help="tune hyperparameters with cached, parallel k-fold CV, "
+                                                       "then train with the best configuration")
+    search_parser.add_argument('--models', nargs='+', choices=MODEL_NAMES, default=list(MODEL_NAMES))
+    search_parser.add_argument('--strategy', choices=HyperparameterSearch.STRATEGIES, default='halving')
+    search_parser.add_argument('--candidates', type=int, default=20,
+                               help="configurations per model, the current defaults included")
+    search_parser.add_argument('--folds', type=int, default=5)
+    search_parser.add_argument('--eta', type=int, default=3, help="successive-halving reduction factor")
+    search_parser.add_argument('--jobs', type=int, default=None, help="worker processes (default: one per core)")
+    search_parser.add_argument('--cache-dir', default='.search_cache',
+                               help="fold-level results; rerunning resumes from here")
+    search_parser.add_argument('--search-only', action='store_true', help="write best_params.json without training")
+    args = parser.parse_args()
+
+    trainer = CVDModelTrainer(args.data, params=load_best_params(args.params) if args.params else None)
+    if args.command == 'search':
+        metrics = search_hyperparameters(trainer, args)
+        if metrics is None:
+            sys.exit(0)
+    else:
+        metrics = trainer.train_all(parallel=args.parallel, max_workers=args.workers, output_dir=args.output_dir,
+                                    blend=args.blend)
     
     # Print summary
     print("\n" + "="*50)
@@ -388,3 +528,6 @@ if __name__ == "__main__":
         print(f"\n{model.upper()}:")
         for metric, value in scores.items():
             print(f"  {metric}: {value:.4f}")
+    print("\nTRAINING WALL TIME:")
+    for model, seconds in trainer.timings.items():
+        print(f"  {model}: {seconds:.2f}s")
@@ -0,0 +1,297 @@
+"""
+Out-of-core training for CVD datasets larger than RAM
+Streams a CSV or Parquet file in chunks; the full feature matrix is never built
+"""
+
+import argparse
+import logging
+import math
+import time
+from pathlib import Path
+
+import numpy as np
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.kernel_approximation import Nystroem
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from train_models import CVDModelTrainer
+from model_fitting import MODEL_NAMES, SEED, build_neural_network
+from config import FEATURE_NAMES
+from tabular import TARGET, iter_frames
+
+logger = logging.getLogger(__name__)
+
+TEST_FRACTION = 0.2
+# share of the training rows the NN holds out for early stopping, like validation_split=0.2
+VALIDATION_FRACTION = 0.2
+
+
+def iter_chunks(path, chunk_rows, columns=None):
+    """Yield DataFrames of at most ``chunk_rows`` rows, reading only ``columns``.
+
+    Parquet is read row group by row group and Arrow IPC batch by batch
+    (both need pyarrow); anything else is parsed as CSV. See ``tabular``.
+    """
+    return iter_frames(path, chunk_rows, columns=list(columns or FEATURE_NAMES + [TARGET]))
+
+
+class Reservoir:
+    """Uniform fixed-size sample of a row stream (Vitter's algorithm R, vectorized per chunk)"""
+
+    def __init__(self, capacity, n_features, rng):
+        self.capacity = int(capacity)
+        self.X = np.empty((self.capacity, n_features), dtype=np.float64)
+        self.y = np.empty(self.capacity, dtype=np.int64)
+        self.seen = 0
+        self.rng = rng
+
+    def add(self, X, y):
+        index = self.seen + np.arange(len(X))
+        self.seen += len(X)
+        fill = index < self.capacity
+        self.X[index[fill]] = X[fill]
+        self.y[index[fill]] = y[fill]
+        slot = self.rng.integers(0, index[~fill] + 1) if (~fill).any() else np.empty(0, dtype=np.int64)
+        keep = slot < self.capacity
+        self.X[slot[keep]] = X[~fill][keep]
+        self.y[slot[keep]] = y[~fill][keep]
+
+    def arrays(self):
+        n = min(self.seen, self.capacity)
+        return self.X[:n], self.y[:n]
+
+
+class StreamingCVDTrainer(CVDModelTrainer):
+    """CVDModelTrainer that streams its data instead of loading it.
+
+    Memory is bounded by ``chunk_rows`` plus the fixed-size samples, whatever
+    the file size:
+
+    - the scaler is fitted with ``partial_fit`` over one pass
+    - SVM: RBF Nystroem feature map + ``SGDClassifier(log_loss)`` trained
+      with ``partial_fit`` on the training rows, then Platt-scaled on the
+      validation sample (exports to the same ``svm_kernel.joblib``)
+    - Random Forest: trees are grown ``warm_start`` on successive chunks
+    - Gradient Boosting: ``HistGradientBoostingClassifier`` on a uniform
+      sample of ``sample_rows`` training rows
+    - Neural network: Keras ``fit`` on a batch generator over the file
+
+    Rows are split per row with a seeded draw, so each pass sees the same
+    train/validation/test assignment; metrics come from a uniform sample of
+    at most ``eval_rows`` held-out rows.
+    """
+
+    def __init__(self, data_path, chunk_rows=100_000, sample_rows=500_000, eval_rows=100_000,
+                 svm_components=300, sgd_epochs=5, nn_epochs=100, nn_batch_size=16):
+        super().__init__(data_path)
+        self.chunk_rows = chunk_rows
+        self.sample_rows = sample_rows
+        self.eval_rows = eval_rows
+        self.svm_components = svm_components
+        self.sgd_epochs = sgd_epochs
+        self.nn_epochs = nn_epochs
+        self.nn_batch_size = nn_batch_size
+        self.rows = {}
+
+    def _chunks(self):
+        """(chunk index, raw X, y, split) per chunk; split is 0 train, 1 NN validation, 2 test"""
+        for i, df in enumerate(iter_chunks(self.data_path, self.chunk_rows)):
+            X = df[FEATURE_NAMES].to_numpy(dtype=np.float64)
+            y = df[TARGET].to_numpy(dtype=np.int64)
+            u = np.random.default_rng([SEED, i]).random(len(df))
+            split = np.where(u < TEST_FRACTION, 2,
+                             np.where(u < TEST_FRACTION + (1 - TEST_FRACTION) * VALIDATION_FRACTION, 1, 0))
+            yield i, X, y, split
+
+    def _training_chunks(self, include_validation=True):
+        """Scaled (X, y) training rows per chunk"""
+        for _, X, y, split in self._chunks():
+            mask = split <= 1 if include_validation else split == 0
+            if mask.any():
+                yield self.scaler.transform(X[mask]), y[mask]
+
+    def load_data(self):
+        """One pass: fit the scaler, count rows and draw the bounded samples"""
+        if self.data_path is None or not Path(self.data_path).exists():
+            raise FileNotFoundError(f"Streaming training needs a CSV or Parquet file, got {self.data_path!r}")
+        logger.info(f"Streaming {self.data_path} in chunks of {self.chunk_rows} rows...")
+
+        self.scaler = StandardScaler()
+        n_features = len(FEATURE_NAMES)
+        samples = {name: Reservoir(capacity, n_features, np.random.default_rng([SEED, k]))
+                   for k, (name, capacity) in enumerate([('train', self.sample_rows), ('validation', self.eval_rows),
+                                                         ('test', self.eval_rows)])}
+        self.rows = {'train': 0, 'validation': 0, 'test': 0, 'chunks': 0}
+        self.nn_steps = 0
+        class_counts = np.zeros(2, dtype=np.int64)
+        for _, X, y, split in self._chunks():
+            train = split <= 1
+            if train.any():
+                self.scaler.partial_fit(X[train])
+                samples['train'].add(X[train], y[train])
+            samples['validation'].add(X[split == 1], y[split == 1])
+            samples['test'].add(X[split == 2], y[split == 2])
+            self.rows['train'] += int(train.sum())
+            self.rows['validation'] += int((split == 1).sum())
+            self.rows['test'] += int((split == 2).sum())
+            self.rows['chunks'] += 1
+            self.nn_steps += math.ceil(int((split == 0).sum()) / self.nn_batch_size)
+            class_counts += np.bincount(y, minlength=2)[:2]
+
+        logger.info(f"Rows: {self.rows}")
+        logger.info(f"Class distribution: {class_counts}")
+        # samples are drawn raw and scaled once the scaler has seen every row
+        self.X_sample, self.y_sample = samples['train'].arrays()
+        self.X_sample = self.scaler.transform(self.X_sample)
+        X_val, self.y_val = samples['validation'].arrays()
+        self.X_val = self.scaler.transform(X_val)
+        X_test, self.y_test = samples['test'].arrays()
+        self.X_test = self.scaler.transform(X_test)
+        logger.info(f"Training sample size: {len(self.y_sample)}")
+        logger.info(f"Test sample size: {len(self.y_test)}")
+
+    def _train(self, name):
+        started = time.perf_counter()
+        self.models[name] = getattr(self, f'_fit_{name}')()
+        self.timings[name] = time.perf_counter() - started
+        logger.info(f"{name} training completed in {self.timings[name]:.2f}s")
+
+    def hyperparameters(self):
+        # the streaming variants have their own fixed settings; search overrides do not apply
+        return {}
+
+    def fit_blend(self, method='logistic', folds=5, n_jobs=None, cache_dir='.search_cache'):
+        if method != 'fixed':
+            # out-of-fold predictions would take k more passes per model over the file
+            logger.warning(f"Streaming training keeps the fixed ensemble weights; ignoring blend={method!r}")
+        super().fit_blend('fixed')
+
+    def background_rows(self, n_rows=32, X=None):
+        return super().background_rows(n_rows, self.X_sample if X is None else X)
+
+    def train_parallel(self, max_workers=None):
+        # worker processes would each stream the whole file; there is nothing to share between them
+        logger.warning("Streaming training reads the file once per model; training sequentially instead")
+        for name in MODEL_NAMES:
+            getattr(self, f'train_{name}')()
+
+    def _fit_svm(self):
+        nystroem = Nystroem(kernel='rbf', gamma=1.0 / len(FEATURE_NAMES),
+                            n_components=min(self.svm_components, len(self.y_sample)), random_state=SEED)
+        nystroem.fit(self.X_sample)
+        sgd = SGDClassifier(loss='log_loss', alpha=1e-4, random_state=SEED)
+        for epoch in range(self.sgd_epochs):
+            for X, y in self._training_chunks(include_validation=False):
+                sgd.partial_fit(nystroem.transform(X), y, classes=np.array([0, 1]))
+        self._platt_scale(sgd, nystroem.transform(self.X_val))
+        return Pipeline([('nystroem', nystroem), ('sgd', sgd)])
+
+    def _platt_scale(self, sgd, features):
+        """Fit Platt's sigmoid to the SGD decision values on the validation sample, in place.
+
+        A few epochs of ``partial_fit`` rank well but leave the logistic
+        output far from calibrated. ``sigmoid(a * f + b)`` is folded into
+        ``coef_`` / ``intercept_``, so ``predict_proba`` and the NumPy export
+        both return the calibrated probability.
+        """
+        if len(np.unique(self.y_val)) < 2:
+            logger.warning("Validation sample lacks a class; the SVM probabilities are left uncalibrated")
+            return
+        platt = LogisticRegression(C=1e6).fit(sgd.decision_function(features).reshape(-1, 1), self.y_val)
+        a, b = platt.coef_[0, 0], platt.intercept_[0]
+        sgd.coef_ = sgd.coef_ * a
+        sgd.intercept_ = sgd.intercept_ * a + b
+        logger.info(f"SVM Platt scaling on {len(self.y_val)} validation rows: a={a:.4f}, b={b:.4f}")
+
+    def _fit_random_forest(self, n_estimators=100):
+        rf = RandomForestClassifier(
+            n_estimators=0,
+            max_depth=15,
+            min_samples_split=5,
+            min_samples_leaf=2,
+            random_state=SEED,
+            n_jobs=-1,
+            warm_start=True
+        )
+        # spread the trees evenly over the chunks; a tree never sees more than one chunk
+        n_chunks = max(self.rows['chunks'], 1)
+        for i, (X, y) in enumerate(self._training_chunks()):
+            target = max(round((i + 1) * n_estimators / n_chunks), rf.n_estimators)
+            if target == rf.n_estimators:
+                continue
+            if len(np.unique(y)) < 2:
+                # every tree must see both classes; the quota carries to the next chunk
+                continue
+            rf.set_params(n_estimators=target)
+            rf.fit(X, y)
+        if rf.n_estimators == 0:
+            raise ValueError("No training chunk contained both classes")
+        return rf
+
+    def _fit_gradient_boosting(self):
+        gb = HistGradientBoostingClassifier(
+            max_iter=100,
+            learning_rate=0.1,
+            max_depth=5,
+            early_stopping=False,
+            random_state=SEED
+        )
+        return gb.fit(self.X_sample, self.y_sample)
+
+    def _nn_batches(self):
+        """Endless shuffled-within-chunk mini-batches of the NN training rows"""
+        epoch = 0
+        while True:
+            rng = np.random.default_rng([SEED, epoch])
+            for X, y in self._training_chunks(include_validation=False):
+                order = rng.permutation(len(y))
+                X = X[order].astype(np.float32)
+                y = y[order].astype(np.float32)
+                for start in range(0, len(y), self.nn_batch_size):
+                    yield X[start:start + self.nn_batch_size], y[start:start + self.nn_batch_size]
+            epoch += 1
+
+    def _fit_neural_network(self):
+        from tensorflow import keras
+
+        keras.utils.set_random_seed(SEED)
+        model = build_neural_network(len(FEATURE_NAMES))
+        callbacks, validation = [], None
+        if len(self.y_val):
+            validation = (self.X_val.astype(np.float32), self.y_val.astype(np.float32))
+            callbacks.append(keras.callbacks.EarlyStopping(monitor='val_loss', patience=10,
+                                                           restore_best_weights=True))
+        model.fit(
+            self._nn_batches(),
+            steps_per_epoch=self.nn_steps,
+            epochs=self.nn_epochs,
+            validation_data=validation,
+            callbacks=callbacks,
+            verbose=0
+        )
+        return model
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Train the CVD ensemble out of core from a CSV or Parquet file")
+    parser.add_argument('--data', required=True, help="CSV, Parquet or Arrow IPC with the 13 features and a 'target' column")
+    parser.add_argument('--output-dir', default='../backend/models')
+    parser.add_argument('--chunk-rows', type=int, default=100_000, help="rows read per chunk")
+    parser.add_argument('--sample-rows', type=int, default=500_000,
+                        help="uniform training sample for Gradient Boosting and the SVM landmarks")
+    parser.add_argument('--eval-rows', type=int, default=100_000,
+                        help="held-out rows kept for evaluation and NN early stopping")
+    parser.add_argument('--sgd-epochs', type=int, default=5)
+    parser.add_argument('--nn-epochs', type=int, default=100)
+    args = parser.parse_args()
+
+    trainer = StreamingCVDTrainer(args.data, chunk_rows=args.chunk_rows, sample_rows=args.sample_rows,
+                                  eval_rows=args.eval_rows, sgd_epochs=args.sgd_epochs, nn_epochs=args.nn_epochs)
+    metrics = trainer.train_all(output_dir=args.output_dir, blend='fixed')
+    for model, scores in metrics.items():
+        print(f"{model:20s} " + "  ".join(f"{metric} {value:.4f}" for metric, value in scores.items()))
+    for model, seconds in trainer.timings.items():
+        print(f"{model:20s} trained in {seconds:.2f}s")
@@ -3,7 +3,9 @@
 import numpy as np
 from sklearn.preprocessing import StandardScaler
 import joblib
-from config import SCALER_PATH, FEATURE_NAMES
+from config import SCALER_PATH
+from features import dict_values
+from validation import validate_record
 
 class DataPreprocessor:
     """Handle data preprocessing for model predictions"""
@@ -27,38 +29,10 @@ class DataPreprocessor:
             return scaler
     
     def preprocess(self, data_dict):
-        """Preprocess patient data"""
-        features = np.array([[
-            data_dict.get('age', 0),
-            data_dict.get('sex', 0),
-            data_dict.get('cp', 0),
-            data_dict.get('trestbps', 0),
-            data_dict.get('chol', 0),
-            data_dict.get('fbs', 0),
-            data_dict.get('restecg', 0),
-            data_dict.get('thalach', 0),
-            data_dict.get('exang', 0),
-            data_dict.get('oldpeak', 0),
-            data_dict.get('slope', 0),
-            data_dict.get('ca', 0),
-            data_dict.get('thal', 0)
-        ]])
-        
+        """Preprocess patient data (absent features count as 0)"""
+        features = np.array([dict_values(data_dict)], dtype=np.float64)
         return self.scaler.transform(features)
     
     def validate_input(self, data_dict):
-        """Validate input data ranges"""
-        errors = []
-        
-        if not 0 <= data_dict.get('age', 0) <= 120:
-            errors.append("Age must be between 0 and 120")
-        if data_dict.get('sex', 0) not in [0, 1]:
-            errors.append("Sex must be 0 (female) or 1 (male)")
-        if not 0 <= data_dict.get('cp', 0) <= 3:
-            errors.append("Chest pain type must be between 0 and 3")
-        if not 0 <= data_dict.get('trestbps', 0) <= 200:
-            errors.append("Resting BP must be between 0 and 200")
-        if not 0 <= data_dict.get('chol', 0) <= 400:
-            errors.append("Cholesterol must be between 0 and 400")
-        
-        return errors
+        """Validate input data ranges against config.FEATURE_SCHEMA"""
+        return validate_record(data_dict)
@@ -0,0 +1,65 @@
+"""Readiness state for models that load in the background after startup"""
+
+import threading
+import time
+from typing import Dict, Optional
+
+
+class ModelsNotReadyError(RuntimeError):
+    """Raised when a scoring request arrives before the ensemble is loaded."""
+
+
+class Readiness:
+    """Tracks the model load: ``starting`` -> ``loading`` -> ``warming`` -> ``ready`` (or ``failed``).
+
+    The API accepts connections immediately; scoring endpoints call
+    ``require()`` and answer 503 until ``mark_ready``. ``wait`` lets scripts
+    and tests block until the state settles.
+    """
+
+    def __init__(self):
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self.status = 'starting'
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.load_seconds: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def mark_loading(self):
+        with self._lock:
+            self.status = 'loading'
+            self.error = None
+            self.started_at = time.perf_counter()
+
+    def mark_warming(self):
+        with self._lock:
+            if not self.ready:
+                self.status = 'warming'
+
+    def mark_ready(self):
+        with self._lock:
+            self.status = 'ready'
+            if self.started_at is not None:
+                self.load_seconds = round(time.perf_counter() - self.started_at, 3)
+            self._ready.set()
+
+    def mark_failed(self, error: Exception):
+        with self._lock:
+            self.status = 'failed'
+            self.error = str(error)
+
+    def require(self):
+        if not self.ready:
+            detail = f": {self.error}" if self.error else ''
+            raise ModelsNotReadyError(f"Models are not ready (status={self.status}){detail}")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def stats(self) -> Dict:
+        return {"status": self.status, "ready": self.ready, "load_seconds": self.load_seconds,
+                "error": self.error}
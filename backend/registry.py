@@ -0,0 +1,163 @@
+"""Versioned model registry with background reload and atomic swap"""
+
+import hashlib
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger("cvd_api")
+
+
+def artifact_fingerprint(models_dir: Path) -> str:
+    """Short hash of the model files' names, sizes and mtimes; used as the model version."""
+    digest = hashlib.sha256()
+    if models_dir.is_dir():
+        for path in sorted(p for p in models_dir.iterdir() if p.is_file()):
+            stat = path.stat()
+            digest.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()[:12]
+
+
+@dataclass(frozen=True)
+class ModelBundle:
+    """Everything one request needs to be scored by a single model version.
+
+    Bundles are immutable once published; a reload builds a new one, so a
+    request that grabbed ``registry.current`` keeps scoring against the same
+    models, scaler and ensemble even if a swap happens mid-flight.
+    """
+    version: str
+    models: Dict[str, object]
+    scaler: object
+    ensemble: object
+    cascade: object = None
+    explainer: object = None
+    warmup: Dict = field(default_factory=dict)
+    quality: Dict = field(default_factory=dict)
+    loaded_at: str = field(default_factory=lambda: datetime.now().isoformat())
+
+
+class ModelRegistry:
+    """Holds the live ``ModelBundle`` and replaces it without downtime.
+
+    ``build(models_dir, version)`` loads (and may warm) a complete bundle; ``load`` runs
+    it on the calling thread and ``reload_in_background`` on a new one, and
+    both publish the result with a single reference assignment, which is
+    atomic for readers. Reloads are
+    serialised and a failed one leaves the current bundle in place.
+    ``on_publish`` callbacks run after every swap (e.g. cache invalidation).
+    """
+
+    def __init__(self, models_dir: Path, build: Callable[[Path, str], ModelBundle], history: int = 5):
+        self.models_dir = Path(models_dir)
+        self._build = build
+        self._reload_lock = threading.Lock()
+        self._current: Optional[ModelBundle] = None
+        self._history: List[Dict] = []
+        self._history_size = history
+        self._on_publish: List[Callable[[ModelBundle], None]] = []
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.reloading = False
+        self.last_error: Optional[str] = None
+
+    @property
+    def current(self) -> Optional[ModelBundle]:
+        return self._current
+
+    def on_publish(self, callback: Callable[[ModelBundle], None]):
+        self._on_publish.append(callback)
+
+    def publish(self, bundle: ModelBundle):
+        previous = self._current
+        self._current = bundle
+        self._history.append({"version": bundle.version, "loaded_at": bundle.loaded_at})
+        del self._history[:-self._history_size]
+        for callback in self._on_publish:
+            callback(bundle)
+        logger.info(f"Model version {bundle.version} is live"
+                    + (f" (replaced {previous.version})" if previous is not None else ''))
+
+    def load(self, force: bool = True) -> ModelBundle:
+        """Build and publish a bundle on the calling thread; returns the live bundle.
+
+        Without ``force`` nothing is rebuilt while the artifacts still match
+        the live version.
+        """
+        with self._reload_lock:
+            version = artifact_fingerprint(self.models_dir)
+            if not force and self._current is not None and self._current.version == version:
+                return self._current
+            self.reloading = True
+            try:
+                started = time.perf_counter()
+                bundle = self._build(self.models_dir, version)
+                logger.info(f"Built model version {version} in {time.perf_counter() - started:.2f}s")
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                self.reloading = False
+            self.last_error = None
+            self.publish(bundle)
+            return bundle
+
+    def reload_in_background(self, force: bool = True) -> threading.Thread:
+        def run():
+            try:
+                self.load(force=force)
+            except Exception:
+                logger.exception("Model reload failed; keeping the current version")
+
+        thread = threading.Thread(target=run, name='cvd-model-reload', daemon=True)
+        thread.start()
+        return thread
+
+    def watch(self, interval_seconds: float):
+        """Poll ``models_dir`` and reload once a changed fingerprint stays stable for one interval.
+
+        Waiting for two identical readings avoids loading a half-copied set
+        of artifacts while the trainer is still writing them.
+        """
+        if self._watcher is not None or interval_seconds <= 0:
+            return
+
+        def run():
+            pending = failed = None
+            while not self._stop.wait(interval_seconds):
+                version = artifact_fingerprint(self.models_dir)
+                live = self._current.version if self._current is not None else None
+                if version in (live, failed):
+                    pending = None
+                elif version != pending:
+                    pending = version
+                else:
+                    logger.info(f"Artifacts in {self.models_dir} changed, reloading")
+                    try:
+                        self.load(force=False)
+                    except Exception:
+                        # retried only once the artifacts change again
+                        failed = version
+                        logger.exception("Model reload failed; keeping the current version")
+                    pending = None
+
+        self._watcher = threading.Thread(target=run, name='cvd-model-watch', daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> Dict:
+        current = self._current
+        return {
+            "version": current.version if current is not None else None,
+            "loaded_at": current.loaded_at if current is not None else None,
+            "reloading": self.reloading,
+            "last_error": self.last_error,
+            "watching": self._watcher is not None,
+            "history": list(self._history),
+        }
@@ -0,0 +1,320 @@
+"""Score a whole patient file offline with the serving ensemble, in parallel and resumably
+
+    python scripts/bulk_score.py registry.parquet scores.parquet --workers 8 --id-column patient_id
+
+The input (CSV, Parquet or Arrow IPC, see tabular.py) is cut into shards of
+about --shard-rows rows and scored by a pool of worker processes, each
+single-threaded. The ensemble is loaded once with main.load_models() before
+the pool forks, so the workers share its memory read-only (copy-on-write;
+with CVD_MMAP_MODELS the array exports are shared page cache either way).
+Parquet shards are whole row groups that each worker reads itself; for CSV
+and Arrow the parent reads the shards and hands them over.
+
+Every finished shard is written atomically to <output>.parts/ and is its
+own checkpoint: a killed run started again with the same arguments scores
+only the missing shards. The parts are then merged in input order into
+<output> (CSV unless it ends in .parquet). Output columns match
+/upload-csv/stream: row, [id columns], risk_percentage, risk_level,
+ensemble_probability, one probability per model, model_version and error
+(invalid rows are kept, with the reason and no scores).
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from threadpoolctl import threadpool_limits
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import main
+from cascade import risk_bands
+from config import FEATURE_NAMES
+from tabular import PARQUET_SUFFIXES, iter_frames, require_pyarrow, source_format
+from validation import validate_columns
+
+logger = logging.getLogger("cvd_api")
+
+RISK_LEVELS = np.array(['low', 'moderate', 'high'], dtype=object)
+MANIFEST = 'manifest.json'
+
+# set in the parent before the pool forks, or by _init_worker under spawn
+_bundle = None
+
+
+@dataclass(frozen=True)
+class Shard:
+    index: int
+    start: int
+    rows: int
+    row_groups: Tuple[int, ...] = ()  # Parquet: read by the worker itself
+
+
+@dataclass(frozen=True)
+class Job:
+    input_path: str
+    parts_dir: str
+    output_format: str
+    cascade: bool
+    id_columns: Tuple[str, ...]
+
+
+def output_format(path: Path) -> str:
+    return 'parquet' if path.suffix.lower() in PARQUET_SUFFIXES else 'csv'
+
+
+def parquet_shards(path: Path, shard_rows: int) -> List[Shard]:
+    """Consecutive row groups packed into shards of at least ``shard_rows`` rows (or the rest)"""
+    metadata = require_pyarrow().parquet.ParquetFile(str(path)).metadata
+    shards, groups, start, rows = [], [], 0, 0
+    for g in range(metadata.num_row_groups):
+        groups.append(g)
+        rows += metadata.row_group(g).num_rows
+        if rows >= shard_rows or g == metadata.num_row_groups - 1:
+            shards.append(Shard(len(shards), start, rows, tuple(groups)))
+            start, groups, rows = start + rows, [], 0
+    return shards
+
+
+def score_frame(frame: pd.DataFrame, start: int, bundle, cascade: bool = False,
+                id_columns: Sequence[str] = ()) -> pd.DataFrame:
+    """Validate and score one shard; one output row per input row, rounded like the API responses"""
+    check = validate_columns(frame)
+    n = len(frame)
+    names = list(bundle.ensemble.model_names)
+    probability = np.full(n, np.nan)
+    per_model = np.full((n, len(names)), np.nan)
+    valid = np.flatnonzero(check.valid)
+    if valid.size:
+        features = check.features[valid]
+        scored = bundle.cascade.predict(features)[0] if cascade else bundle.ensemble.predict(features)
+        probability[valid] = scored.ensemble
+        per_model[valid] = scored.per_model
+
+    out = {'row': np.arange(start, start + n)}
+    for name in id_columns:
+        out[name] = frame[name].to_numpy() if name in frame else np.full(n, None, dtype=object)
+    levels = np.full(n, '', dtype=object)
+    levels[valid] = RISK_LEVELS[risk_bands(probability[valid], main.RISK_BOUNDARIES)]
+    out.update({'risk_percentage': np.round(probability * 100, 2), 'risk_level': levels,
+                'ensemble_probability': np.round(probability, 4)})
+    for j, name in enumerate(names):
+        out[name] = np.round(per_model[:, j], 4)
+    out['model_version'] = np.full(n, bundle.version, dtype=object)
+    errors = np.full(n, '', dtype=object)
+    for e in check.errors:
+        errors[e['row']] = '; '.join(e['errors'])
+    out['error'] = errors
+    return pd.DataFrame(out)
+
+
+def part_path(parts_dir: Path, index: int, fmt: str) -> Path:
+    return parts_dir / f"part-{index:06d}.{fmt}"
+
+
+def _write_part(result: pd.DataFrame, path: Path, fmt: str):
+    # written under a temporary name and renamed: a part that exists is complete
+    tmp = path.with_name(path.name + '.tmp')
+    if fmt == 'parquet':
+        result.to_parquet(tmp, index=False)
+    else:
+        result.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def _init_worker(models_dir: str, threads: int):
+    global _bundle
+    # one core per worker: BLAS threads on top of the processes would oversubscribe
+    threadpool_limits(limits=threads)
+    if _bundle is None:
+        main.registry.models_dir = Path(models_dir)
+        _bundle = main.load_models()
+
+
+def _run_shard(task) -> Tuple[int, int, int]:
+    """Score one shard and write its part; returns (index, rows, invalid rows)"""
+    shard, frame, job = task
+    if frame is None:
+        parquet = require_pyarrow().parquet.ParquetFile(job.input_path)
+        columns = [c for c in FEATURE_NAMES + list(job.id_columns) if c in parquet.schema_arrow.names]
+        frame = parquet.read_row_groups(list(shard.row_groups), columns=columns).to_pandas()
+    result = score_frame(frame, shard.start, _bundle, job.cascade, job.id_columns)
+    _write_part(result, part_path(Path(job.parts_dir), shard.index, job.output_format), job.output_format)
+    return shard.index, len(result), int((result['error'] != '').sum())
+
+
+class Checkpoint:
+    """The parts directory of one run and the manifest that ties it to its inputs.
+
+    Resuming with another input file, shard size, model version or output
+    layout would mix incompatible parts, so that refuses unless ``restart``.
+    """
+
+    def __init__(self, parts_dir: Path, manifest: Dict, fmt: str):
+        self.parts_dir = parts_dir
+        self.manifest = manifest
+        self.fmt = fmt
+
+    def open(self, restart: bool = False) -> set:
+        """Indices of the shards already done (none after ``restart``)"""
+        path = self.parts_dir / MANIFEST
+        if restart and self.parts_dir.exists():
+            shutil.rmtree(self.parts_dir)
+        if path.exists():
+            with open(path) as f:
+                saved = json.load(f)
+            if saved != self.manifest:
+                changed = sorted(k for k in set(saved) | set(self.manifest) if saved.get(k) != self.manifest.get(k))
+                raise ValueError(f"{self.parts_dir} holds a run with different {', '.join(changed)}; "
+                                 f"pass --restart to discard it")
+        else:
+            self.parts_dir.mkdir(parents=True, exist_ok=True)
+            with open(path, 'w') as f:
+                json.dump(self.manifest, f, indent=2)
+        for tmp in self.parts_dir.glob('*.tmp'):
+            tmp.unlink()
+        return {int(p.name.split('-')[1].split('.')[0]) for p in self.parts_dir.glob(f'part-*.{self.fmt}')}
+
+    def merge(self, n_shards: int, output: Path, empty: pd.DataFrame):
+        """Concatenate parts 0..n_shards-1 into ``output`` (atomically), streaming one part at a time"""
+        parts = [part_path(self.parts_dir, i, self.fmt) for i in range(n_shards)]
+        missing = [p.name for p in parts if not p.exists()]
+        if missing:
+            raise RuntimeError(f"cannot merge, parts missing: {', '.join(missing[:5])}")
+        tmp = output.with_name(output.name + '.tmp')
+        if not parts:
+            _write_part(empty, output, self.fmt)
+            return
+        if self.fmt == 'parquet':
+            pq = require_pyarrow().parquet
+            writer = None
+            for part in parts:
+                table = pq.read_table(part)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp, table.schema)
+                writer.write_table(table.cast(writer.schema))
+            writer.close()
+        else:
+            with open(tmp, 'wb') as out:
+                for k, part in enumerate(parts):
+                    with open(part, 'rb') as f:
+                        if k:
+                            f.readline()  # every part repeats the header
+                        shutil.copyfileobj(f, out, 1 << 20)
+        os.replace(tmp, output)
+
+
+def _bounded(tasks: Iterator, slots: threading.Semaphore) -> Iterator:
+    # Pool feeds tasks from its own thread as fast as it can; holding a slot per
+    # task in flight keeps the parent from reading the whole input ahead
+    for task in tasks:
+        slots.acquire()
+        yield task
+
+
+def bulk_score(input_path, output_path, models_dir, workers: int = None, shard_rows: int = 100_000,
+               cascade: bool = False, id_columns: Sequence[str] = (), restart: bool = False,
+               keep_parts: bool = False, log=logger.info) -> Dict:
+    global _bundle
+    input_path, output_path, models_dir = Path(input_path).resolve(), Path(output_path), Path(models_dir)
+    workers = workers or os.cpu_count() or 1
+    fmt = output_format(output_path)
+    input_format = source_format(input_path)
+    id_columns = tuple(id_columns)
+
+    main.registry.models_dir = models_dir
+    _bundle = bundle = main.load_models()
+    bundle.ensemble.observe_stage = None  # no one scrapes this process's metrics
+
+    stat = input_path.stat()
+    manifest = {'input': str(input_path), 'input_size': stat.st_size, 'input_mtime_ns': stat.st_mtime_ns,
+                'shard_rows': shard_rows, 'model_version': bundle.version, 'cascade': cascade,
+                'id_columns': list(id_columns), 'output_format': fmt}
+    checkpoint = Checkpoint(output_path.with_name(output_path.name + '.parts'), manifest, fmt)
+    done = checkpoint.open(restart)
+    job = Job(str(input_path), str(checkpoint.parts_dir), fmt, cascade, id_columns)
+
+    n_shards = 0
+    if input_format == 'parquet':
+        shards = parquet_shards(input_path, shard_rows)
+        n_shards = len(shards)
+        tasks = ((shard, None, job) for shard in shards if shard.index not in done)
+    else:
+        def read_shards():
+            nonlocal n_shards
+            start = 0
+            for i, frame in enumerate(iter_frames(input_path, shard_rows, columns=FEATURE_NAMES + list(id_columns),
+                                                  typed=False)):
+                n_shards = i + 1
+                for name in id_columns:
+                    if name in frame:
+                        # inferred per chunk otherwise; the parts must agree on a type
+                        frame[name] = frame[name].astype('string')
+                if i not in done:
+                    yield Shard(i, start, len(frame)), frame, job
+                start += len(frame)
+        tasks = read_shards()
+
+    log(f"Scoring {input_path.name} with model version {bundle.version}: {workers} workers, "
+        f"{len(done)} shards already done")
+    started = time.perf_counter()
+    rows = invalid = scored_shards = 0
+    slots = threading.Semaphore(2 * workers)
+
+    def finished(result):
+        nonlocal rows, invalid, scored_shards
+        slots.release()
+        index, n, bad = result
+        rows, invalid, scored_shards = rows + n, invalid + bad, scored_shards + 1
+        elapsed = time.perf_counter() - started
+        log(f"shard {index} done ({n} rows, {bad} invalid); {rows} rows in {elapsed:.1f}s "
+            f"({rows / elapsed if elapsed else 0:,.0f} rows/s)")
+
+    if workers == 1:
+        _init_worker(str(models_dir), 1)
+        for task in _bounded(tasks, slots):
+            finished(_run_shard(task))
+    else:
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+        with context.Pool(workers, initializer=_init_worker, initargs=(str(models_dir), 1)) as pool:
+            for result in pool.imap_unordered(_run_shard, _bounded(tasks, slots)):
+                finished(result)
+
+    seconds = time.perf_counter() - started
+    empty = score_frame(pd.DataFrame(columns=FEATURE_NAMES), 0, bundle, cascade, id_columns)
+    checkpoint.merge(n_shards, output_path, empty)
+    if not keep_parts:
+        shutil.rmtree(checkpoint.parts_dir)
+    summary = {'output': str(output_path), 'shards': n_shards, 'resumed_shards': len(done),
+               'rows_scored': rows, 'invalid_rows': invalid, 'seconds': round(seconds, 2),
+               'rows_per_second': round(rows / seconds, 1) if seconds else None, 'model_version': bundle.version}
+    log(f"Wrote {output_path}: {summary}")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help="CSV, Parquet or Arrow IPC file with the 13 feature columns")
+    parser.add_argument('output', help="result file; Parquet if it ends in .parquet, CSV otherwise")
+    parser.add_argument('--models-dir', default=str(main.MODELS_DIR))
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument('--shard-rows', type=int, default=100_000,
+                        help="rows per shard (Parquet: whole row groups, at least this many)")
+    parser.add_argument('--id-column', action='append', default=[], help="input column copied to the output")
+    parser.add_argument('--cascade', action='store_true', help="score in cascade mode (see README)")
+    parser.add_argument('--restart', action='store_true', help="discard the checkpoint of an earlier run")
+    parser.add_argument('--keep-parts', action='store_true', help="keep <output>.parts/ after merging")
+    args = parser.parse_args()
+    bulk_score(args.input, args.output, args.models_dir, args.workers, args.shard_rows, args.cascade,
+               args.id_column, args.restart, args.keep_parts)
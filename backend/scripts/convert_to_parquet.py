@@ -0,0 +1,73 @@
+"""Convert heart.csv-style CSV exports to Parquet for the trainer and /upload-csv
+
+The CSV is read in chunks, so any size fits in memory. Only the 13 feature
+columns and 'target' (when present) are kept, validated against
+config.FEATURE_SCHEMA and written with fixed types (tabular.STORAGE_DTYPES)
+and zstd compression, one row group per chunk. Later runs then read typed
+columns straight from the row groups instead of parsing and re-inferring
+the CSV every time.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config import FEATURE_NAMES
+from tabular import STORAGE_DTYPES, TARGET, iter_frames, require_pyarrow
+from validation import validate_columns
+
+
+def convert(csv_path, parquet_path=None, chunk_rows=100_000, compression='zstd'):
+    """Write ``csv_path`` as Parquet (default: same name, ``.parquet``); returns (rows, path)"""
+    pa = require_pyarrow()
+    csv_path = Path(csv_path)
+    parquet_path = Path(parquet_path) if parquet_path else csv_path.with_suffix('.parquet')
+    writer = None
+    rows = 0
+    try:
+        for frame in iter_frames(csv_path, chunk_rows, columns=FEATURE_NAMES + [TARGET], fmt='csv', typed=False):
+            check = validate_columns(frame)
+            errors = [(e['row'], e['errors']) for e in check.errors]
+            columns = {name: check.features[:, j] for j, name in enumerate(FEATURE_NAMES)}
+            if TARGET in frame:
+                target = pd.to_numeric(frame[TARGET], errors='coerce').to_numpy(dtype=np.float64)
+                errors += [(int(i), [f"{TARGET}: must be 0 or 1"]) for i in np.flatnonzero(~np.isin(target, (0, 1)))]
+                columns[TARGET] = target
+            if errors:
+                row, messages = min(errors)
+                raise ValueError(f"{csv_path.name} row {rows + row}: {', '.join(messages)} "
+                                 f"({len(errors)} problems in rows {rows}-{rows + len(frame) - 1}); "
+                                 f"fix the export and convert again")
+            table = pa.table({name: values.astype(STORAGE_DTYPES[name]) for name, values in columns.items()})
+            if writer is None:
+                writer = pa.parquet.ParquetWriter(parquet_path, table.schema, compression=compression)
+            writer.write_table(table, row_group_size=chunk_rows)
+            rows += len(frame)
+    except BaseException:
+        if writer is not None:
+            writer.close()
+            parquet_path.unlink()
+        raise
+    if writer is None:
+        raise ValueError(f"{csv_path.name} has no rows")
+    writer.close()
+    return rows, parquet_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('csv', help="CSV with the 13 features and optionally 'target'")
+    parser.add_argument('--output', help="Parquet path (default: the CSV's name with .parquet)")
+    parser.add_argument('--chunk-rows', type=int, default=100_000, help="rows read per chunk and per row group")
+    parser.add_argument('--compression', default='zstd', help="Parquet codec (zstd, snappy, gzip, none)")
+    args = parser.parse_args()
+    started = time.perf_counter()
+    n_rows, output = convert(args.csv, args.output, args.chunk_rows, args.compression)
+    size_in, size_out = Path(args.csv).stat().st_size, output.stat().st_size
+    print(f"Wrote {output} ({n_rows} rows, {size_in / 1e6:.2f} MB CSV -> {size_out / 1e6:.2f} MB Parquet, "
+          f"{time.perf_counter() - started:.1f}s)")
@@ -0,0 +1,59 @@
+"""Export NumPy inference artifacts for models trained before the exports existed
+
+Writes rf_trees.joblib, gb_trees.joblib, svm_kernel.joblib and
+nn_weights.npz next to the pickles / .h5 in the models directory, so the API
+can serve them without compiling at startup or importing TensorFlow. Each file
+is written under a temporary name and renamed into place, so this is safe to
+run against the directory a live API serves (memory-mapped) from.
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from compiled_models import CompiledForest, NumpyMLP, NumpySVM, dump_arrays
+
+
+def export_artifacts(models_dir):
+    models_dir = Path(models_dir)
+    for prefix in ('rf', 'gb'):
+        pkl_path = models_dir / f'{prefix}_model.pkl'
+        if pkl_path.exists():
+            forest = CompiledForest.from_sklearn(joblib.load(pkl_path))
+            dump_arrays(forest.to_arrays(), models_dir / f'{prefix}_trees.joblib')
+            print(f"Exported {prefix}_trees.joblib ({forest.n_trees} trees)")
+
+    svm_path = models_dir / 'svm_model.pkl'
+    if svm_path.exists():
+        model = joblib.load(svm_path)
+        svm = NumpySVM.from_sklearn(model)
+        probe = np.random.default_rng(0).normal(size=(256, svm.support_vectors.shape[1]))
+        error = np.abs(svm.predict_proba(probe) - model.predict_proba(probe)).max()
+        if error > 1e-6:
+            raise RuntimeError(f"NumPy SVM deviates from predict_proba by {error:.2e}")
+        dump_arrays(svm.to_arrays(), models_dir / 'svm_kernel.joblib')
+        print(f"Exported svm_kernel.joblib ({len(svm.dual_coef)} support vectors, max deviation {error:.2e})")
+
+    nn_path = models_dir / 'nn_model.h5'
+    if nn_path.exists():
+        from tensorflow.keras.models import load_model
+        keras_model = load_model(str(nn_path))
+        mlp = NumpyMLP.from_keras(keras_model)
+        n_features = mlp.kernels[0].shape[0]
+        probe = np.random.default_rng(0).normal(size=(256, n_features))
+        error = mlp.max_abs_error(keras_model, probe)
+        if error > 1e-4:
+            raise RuntimeError(f"NumPy MLP deviates from Keras by {error:.2e}")
+        mlp.save(models_dir / 'nn_weights.npz')
+        print(f"Exported nn_weights.npz (max deviation from Keras {error:.2e})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--models-dir', default=str(Path(__file__).resolve().parent.parent / 'models'))
+    args = parser.parse_args()
+    export_artifacts(args.models_dir)
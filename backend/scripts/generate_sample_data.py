@@ -4,10 +4,10 @@ import pandas as pd
 import numpy as np
 from pathlib import Path
 
-def generate_cvd_dataset(n_samples=300, output_path='data/heart.csv'):
-    """Generate synthetic CVD dataset"""
+def make_cvd_dataset(n_samples=300, seed=42):
+    """Build the synthetic CVD DataFrame (13 features + target) in memory"""
     
-    np.random.seed(42)
+    np.random.seed(seed)
     
     # Generate features
     data = {
@@ -38,6 +38,12 @@ def generate_cvd_dataset(n_samples=300, output_path='data/heart.csv'):
     ) > 0.5
     
     df['target'] = df['target'].astype(int)
+    return df
+
+def generate_cvd_dataset(n_samples=300, output_path='data/heart.csv'):
+    """Generate synthetic CVD dataset"""
+    
+    df = make_cvd_dataset(n_samples)
     
     # Save to CSV
     Path(output_path).parent.mkdir(parents=True, exist_ok=True)
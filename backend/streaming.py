@@ -0,0 +1,107 @@
+"""Incremental CSV parsing and result serialisation for streamed scoring"""
+
+import csv
+import io
+import json
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+from starlette.responses import StreamingResponse
+
+STREAM_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+class CSVChunker:
+    """Split an incoming CSV byte stream into blocks of ``chunk_rows`` rows.
+
+    Bytes are fed as they arrive; only the header, the current partial line
+    and at most one chunk of complete lines are held in memory. Each yielded
+    block is a self-contained CSV document (header + rows) for
+    ``parse_csv_block``, so parsing can happen off the event loop. Fields are
+    assumed not to contain embedded newlines, which holds for the numeric
+    patient exports this endpoint accepts.
+    """
+
+    def __init__(self, chunk_rows: int = 1000):
+        if chunk_rows < 1:
+            raise ValueError("chunk_rows must be >= 1")
+        self.chunk_rows = chunk_rows
+        self.header: Optional[bytes] = None
+        self._partial = b""
+        self._lines: List[bytes] = []
+
+    def feed(self, data: bytes) -> Iterator[bytes]:
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+        for line in lines:
+            yield from self._add_line(line)
+
+    def close(self) -> Iterator[bytes]:
+        if self._partial:
+            yield from self._add_line(self._partial)
+            self._partial = b""
+        if self._lines:
+            yield self._block()
+
+    def _add_line(self, line: bytes) -> Iterator[bytes]:
+        line = line.rstrip(b"\r")
+        if not line.strip():
+            return
+        if self.header is None:
+            # strip a UTF-8 BOM (Excel exports) so the first column name matches
+            self.header = line[3:] if line.startswith(b"\xef\xbb\xbf") else line
+            return
+        self._lines.append(line)
+        if len(self._lines) >= self.chunk_rows:
+            yield self._block()
+
+    def _block(self) -> bytes:
+        lines, self._lines = self._lines, []
+        return b"\n".join([self.header] + lines)
+
+
+def block_row_count(block: bytes) -> int:
+    return block.count(b"\n")
+
+
+def parse_csv_block(block: bytes) -> pd.DataFrame:
+    return pd.read_csv(io.BytesIO(block))
+
+
+class UploadStreamingResponse(StreamingResponse):
+    """StreamingResponse whose body iterator may still be reading the request.
+
+    The stock response watches ``receive`` for a client disconnect while it
+    streams, which would swallow request body chunks that the iterator is
+    still consuming through ``request.stream()``. A disconnect still surfaces
+    here as a failed ``send`` (or ``ClientDisconnect`` from the body stream).
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+def format_ndjson(records: List[Dict]) -> str:
+    return "".join(json.dumps(r) + "\n" for r in records)
+
+
+def csv_header(model_names: List[str]) -> str:
+    return ",".join(["row", "risk_percentage", "risk_level", "ensemble_probability"]
+                    + model_names + ["model_version", "error"]) + "\n"
+
+
+def format_csv(records: List[Dict], model_names: List[str]) -> str:
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    for r in records:
+        preds = r.get("model_predictions", {})
+        writer.writerow([r["row"], r.get("risk_percentage", ""), r.get("risk_level", ""),
+                         r.get("ensemble_probability", "")]
+                        + [preds.get(m, "") for m in model_names]
+                        + [r.get("model_version", ""), r.get("error", "")])
+    return out.getvalue()
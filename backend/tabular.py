@@ -0,0 +1,146 @@
+"""CSV, Parquet and Arrow IPC readers with projection to the model columns"""
+
+import io
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Union
+
+import pandas as pd
+
+from config import FEATURE_NAMES, FEATURE_SCHEMA
+
+TARGET = 'target'
+PARQUET_SUFFIXES = ('.parquet', '.pq')
+ARROW_SUFFIXES = ('.arrow', '.feather', '.ipc')
+PARQUET_MAGIC = b'PAR1'
+ARROW_FILE_MAGIC = b'ARROW1'
+ARROW_STREAM_MARKER = b'\xff\xff\xff\xff'
+
+# CSV features parse straight to float64 instead of being inferred per load
+CSV_DTYPES = {name: 'float64' for name in FEATURE_NAMES}
+# what scripts/convert_to_parquet.py stores: the int-typed features and the
+# target fit int8 (see FEATURE_SCHEMA); the rest stay float64 so decimals
+# such as oldpeak=2.3 read back bit-identical to the CSV
+STORAGE_DTYPES = {**{name: 'int8' if spec['type'] is int else 'float64' for name, spec in FEATURE_SCHEMA.items()},
+                  TARGET: 'int8'}
+
+Source = Union[str, Path, bytes, bytearray, memoryview]
+
+
+def detect_format(name: Optional[str] = None, head: bytes = b'') -> str:
+    """``'parquet'``, ``'arrow'`` or ``'csv'``, from the leading bytes if given, else the file suffix"""
+    if head.startswith(PARQUET_MAGIC):
+        return 'parquet'
+    if head.startswith(ARROW_FILE_MAGIC) or head.startswith(ARROW_STREAM_MARKER):
+        return 'arrow'
+    if head:
+        return 'csv'
+    suffix = Path(name or '').suffix.lower()
+    if suffix in PARQUET_SUFFIXES:
+        return 'parquet'
+    if suffix in ARROW_SUFFIXES:
+        return 'arrow'
+    return 'csv'
+
+
+def source_format(source: Source) -> str:
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return detect_format(head=bytes(source[:8]))
+    with open(source, 'rb') as f:
+        return detect_format(head=f.read(8))
+
+
+def require_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as e:
+        raise ImportError("Reading Parquet or Arrow requires pyarrow (pip install pyarrow)") from e
+    return pa
+
+
+def _arrow_input(pa, source: Source):
+    # memory-mapped or wrapped in place: neither copies the file into Python
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return pa.BufferReader(source)
+    return pa.memory_map(str(source))
+
+
+def _open_ipc(pa, source: Source):
+    try:
+        return pa.ipc.open_file(_arrow_input(pa, source))
+    except pa.ArrowInvalid:
+        return pa.ipc.open_stream(_arrow_input(pa, source))
+
+
+def _ipc_batches(reader) -> Iterator:
+    if hasattr(reader, 'num_record_batches'):  # file format; the stream reader iterates
+        for i in range(reader.num_record_batches):
+            yield reader.get_batch(i)
+    else:
+        yield from reader
+
+
+def _present(columns: Optional[Sequence[str]], names: Sequence[str]) -> Optional[List[str]]:
+    # like usecols with a callable: absent columns are left for validation to report
+    return None if columns is None else [name for name in columns if name in names]
+
+
+def _csv_kwargs(columns: Optional[Sequence[str]], typed: bool):
+    wanted = None if columns is None else set(columns)
+    return {'usecols': None if wanted is None else (lambda name: name in wanted),
+            'dtype': CSV_DTYPES if typed else None, 'encoding': 'utf-8-sig'}
+
+
+def _csv_input(source: Source):
+    return io.BytesIO(source) if isinstance(source, (bytes, bytearray, memoryview)) else source
+
+
+def read_frame(source: Source, columns: Optional[Sequence[str]] = None, fmt: Optional[str] = None,
+               typed: bool = True) -> pd.DataFrame:
+    """Read a whole table, keeping only ``columns`` (those present; all when None).
+
+    ``source`` is a path or the file's bytes; ``fmt`` defaults to what its
+    leading bytes say. Parquet reads only the projected column chunks and
+    Arrow IPC is memory-mapped. ``typed`` parses CSV features as float64
+    rather than inferring; leave it off where bad cells must reach
+    row-level validation instead of failing the parse.
+    """
+    fmt = fmt or source_format(source)
+    if fmt == 'csv':
+        return pd.read_csv(_csv_input(source), **_csv_kwargs(columns, typed))
+    pa = require_pyarrow()
+    if fmt == 'parquet':
+        parquet = pa.parquet.ParquetFile(_arrow_input(pa, source))
+        return parquet.read(columns=_present(columns, parquet.schema_arrow.names)).to_pandas()
+    table = _open_ipc(pa, source).read_all()
+    if columns is not None:
+        table = table.select(_present(columns, table.column_names))
+    return table.to_pandas()
+
+
+def iter_frames(source: Source, chunk_rows: int, columns: Optional[Sequence[str]] = None,
+                fmt: Optional[str] = None, typed: bool = True) -> Iterator[pd.DataFrame]:
+    """``read_frame`` in DataFrames of at most ``chunk_rows`` rows.
+
+    Parquet is decoded row group by row group and Arrow IPC record batch by
+    record batch, so memory is bounded by the chunk (plus one row group)
+    whatever the file size.
+    """
+    fmt = fmt or source_format(source)
+    if fmt == 'csv':
+        yield from pd.read_csv(_csv_input(source), chunksize=chunk_rows, **_csv_kwargs(columns, typed))
+        return
+    pa = require_pyarrow()
+    if fmt == 'parquet':
+        parquet = pa.parquet.ParquetFile(_arrow_input(pa, source))
+        for batch in parquet.iter_batches(batch_size=chunk_rows,
+                                          columns=_present(columns, parquet.schema_arrow.names)):
+            yield batch.to_pandas()
+        return
+    reader = _open_ipc(pa, source)
+    for batch in _ipc_batches(reader):
+        if columns is not None:
+            batch = batch.select(_present(columns, batch.schema.names))
+        for start in range(0, batch.num_rows, chunk_rows):
+            yield batch.slice(start, chunk_rows).to_pandas()
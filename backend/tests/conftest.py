@@ -0,0 +1,53 @@
+"""Shared fixtures; puts the backend modules, the training notebooks and the scripts on the import path"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+BACKEND = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND))
+sys.path.insert(0, str(BACKEND / 'notebooks'))
+sys.path.insert(0, str(BACKEND / 'scripts'))
+
+HEART_CSV = BACKEND.parent / 'heart.csv'
+
+
+@pytest.fixture(scope='session')
+def heart_csv():
+    if not HEART_CSV.exists():
+        pytest.skip(f"{HEART_CSV} not found")
+    return HEART_CSV
+
+
+@pytest.fixture(scope='session')
+def client():
+    """One TestClient for the whole run: the app's shutdown stops its inference pool for good"""
+    pytest.importorskip('fastapi')
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as client:
+        # waits out the startup load when it runs in the background
+        main.registry.load(force=False)
+        yield client
+
+
+@pytest.fixture(scope='session')
+def heart_split(heart_csv):
+    """Raw and scaled train/test splits of heart.csv, as the trainer makes them"""
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import StandardScaler
+
+    from config import FEATURE_NAMES
+    from tabular import TARGET, read_frame
+
+    df = read_frame(heart_csv, columns=FEATURE_NAMES + [TARGET])
+    X = df[FEATURE_NAMES].to_numpy(dtype=np.float64)
+    y = df[TARGET].to_numpy()
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    scaler = StandardScaler().fit(X_train)
+    return {'raw_train': X_train, 'raw_test': X_test, 'y_train': y_train, 'y_test': y_test,
+            'train': scaler.transform(X_train), 'test': scaler.transform(X_test), 'scaler': scaler}
@@ -0,0 +1,21 @@
+import pytest
+
+pytest.importorskip('fastapi')
+
+import main
+
+
+def test_reload_is_disabled_without_a_token(client, monkeypatch):
+    monkeypatch.setattr(main, 'ADMIN_TOKEN', None)
+    assert client.post('/admin/reload?wait=true').status_code == 403
+    assert client.post('/admin/reload?wait=true', headers={'X-Admin-Token': ''}).status_code == 403
+
+
+def test_reload_reports_forced_rebuilds(client, monkeypatch):
+    monkeypatch.setattr(main, 'ADMIN_TOKEN', 'secret')
+    headers = {'X-Admin-Token': 'secret'}
+    assert client.post('/admin/reload?wait=true', headers={'X-Admin-Token': 'wrong'}).status_code == 403
+    assert client.post('/admin/reload?wait=true', headers=headers).json()['status'] == 'unchanged'
+    forced = client.post('/admin/reload?wait=true&force=true', headers=headers).json()
+    assert forced['status'] == 'reloaded'
+    assert forced['model_version'] == forced['previous_version']
@@ -0,0 +1,67 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip('fastapi')
+
+import main
+from config import FEATURE_NAMES
+
+INTEGER_FEATURES = ['sex', 'cp', 'fbs', 'restecg', 'exang', 'slope', 'ca', 'thal']
+
+
+@pytest.fixture(autouse=True)
+def uncached(monkeypatch):
+    # every request must be scored, not answered from what another path cached
+    monkeypatch.setattr(main.prediction_cache, 'max_entries', 0)
+
+
+@pytest.fixture(scope='module')
+def patients(heart_csv):
+    frame = pd.read_csv(heart_csv, usecols=FEATURE_NAMES).head(25).astype({name: int for name in INTEGER_FEATURES})
+    return frame.to_dict(orient='records')
+
+
+def without_timestamp(prediction):
+    return {k: v for k, v in prediction.items() if k != 'timestamp'}
+
+
+def test_batch_matches_single_patient_predictions(client, patients):
+    single = [client.post('/predict', json=patient) for patient in patients]
+    assert all(r.status_code == 200 for r in single)
+    batch = client.post('/batch-predict', json=patients)
+    assert batch.status_code == 200
+    body = batch.json()
+    assert body['count'] == len(patients)
+    assert [without_timestamp(p) for p in body['predictions']] == [without_timestamp(r.json()) for r in single]
+    levels = [r.json()['risk_level'] for r in single]
+    assert (body['high_risk_count'], body['moderate_risk_count'], body['low_risk_count']) == \
+        (levels.count('high'), levels.count('moderate'), levels.count('low'))
+
+
+def test_invalid_row_fails_alone_in_the_vectorized_csv_path(client, patients):
+    frame = pd.DataFrame(patients).astype({'age': object})
+    frame.loc[3, 'age'] = 'unknown'
+    frame.loc[7, 'chol'] = 5000
+    records = main.score_csv_chunk(frame, offset=100)
+    assert [r['row'] for r in records] == list(range(100, 100 + len(patients)))
+    assert {i for i, r in enumerate(records) if 'error' in r} == {3, 7}
+    for i, (record, patient) in enumerate(zip(records, patients)):
+        if i not in (3, 7):
+            expected = main.ensemble_predict_single(main.PatientData(**patient))
+            assert {k: v for k, v in record.items() if k != 'row'} == expected
+
+
+def test_invalid_patient_is_rejected_by_both_endpoints(client, patients):
+    invalid = dict(patients[0], chol=5000)
+    assert client.post('/predict', json=invalid).status_code == 422
+    response = client.post('/batch-predict', json=[patients[1], invalid])
+    assert response.status_code == 422
+    assert response.json()['detail'][0]['loc'][:3] == ['body', 1, 'chol']
+
+
+def test_empty_batch(client):
+    assert main.ensemble_predict_matrix(main.patients_to_matrix([])) == []
+    response = client.post('/batch-predict', json=[])
+    assert response.status_code == 200
+    assert response.json() == {'predictions': [], 'count': 0, 'average_risk': 0.0, 'high_risk_count': 0,
+                               'moderate_risk_count': 0, 'low_risk_count': 0, 'model_version': None}
@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+import main
+from bulk_score import bulk_score
+
+
+@pytest.fixture
+def patients(heart_csv, tmp_path):
+    """60 heart.csv rows with an id column and one invalid row, as a CSV"""
+    frame = pd.read_csv(heart_csv).head(60)
+    frame.insert(0, 'patient_id', [f'p{i:03d}' for i in range(len(frame))])
+    frame = frame.astype({'age': object})
+    frame.loc[17, 'age'] = 'unknown'
+    path = tmp_path / 'patients.csv'
+    frame.to_csv(path, index=False)
+    return path
+
+
+def run(patients, output, **kwargs):
+    return bulk_score(patients, output, main.MODELS_DIR, workers=1, shard_rows=8, id_columns=['patient_id'],
+                      log=lambda message: None, **kwargs)
+
+
+def test_resume_after_losing_a_part_is_byte_identical(patients, tmp_path):
+    output = tmp_path / 'scores.csv'
+    summary = run(patients, output, keep_parts=True)
+    assert summary['shards'] == 8 and summary['rows_scored'] == 60 and summary['invalid_rows'] == 1
+    first = output.read_bytes()
+    result = pd.read_csv(output)
+    assert result['row'].tolist() == list(range(60))
+    assert result.loc[17, 'error'] and pd.isna(result.loc[17, 'ensemble_probability'])
+
+    parts = tmp_path / 'scores.csv.parts'
+    (parts / 'part-000003.csv').unlink()
+    output.unlink()
+    summary = run(patients, output)
+    assert summary['resumed_shards'] == 7 and summary['rows_scored'] == 8
+    assert output.read_bytes() == first
+    assert not parts.exists()
+
+
+def test_resume_with_different_arguments_is_refused(patients, tmp_path):
+    output = tmp_path / 'scores.csv'
+    run(patients, output, keep_parts=True)
+    with pytest.raises(ValueError, match='id_columns'):
+        bulk_score(patients, output, main.MODELS_DIR, workers=1, shard_rows=8, log=lambda message: None)
+    # --restart discards the old parts instead
+    summary = bulk_score(patients, output, main.MODELS_DIR, workers=1, shard_rows=8, restart=True,
+                         log=lambda message: None)
+    assert summary['resumed_shards'] == 0 and 'patient_id' not in pd.read_csv(output)
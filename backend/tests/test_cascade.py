@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from cascade import CascadePlan, CascadeScorer
+from config import ENSEMBLE_WEIGHTS
+from ensemble import Blend, CompiledEnsemble
+
+BOUNDARIES = (0.3, 0.7)
+NARROW_REST = {'svm': 0.05, 'random_forest': 0.45, 'gradient_boosting': 0.45, 'neural_network': 0.05}
+
+
+def hard_scorer(weights, link='identity', intercept=0.0):
+    ensemble = CompiledEnsemble(dict.fromkeys(weights), Blend(weights=weights, link=link, intercept=intercept))
+    return CascadeScorer(ensemble, CascadePlan.hard(), BOUNDARIES)
+
+
+@pytest.mark.parametrize('weights,link,intercept', [
+    (ENSEMBLE_WEIGHTS, 'identity', 0.0),
+    (ENSEMBLE_WEIGHTS, 'logistic', -0.5),
+    (NARROW_REST, 'identity', 0.0),
+    (NARROW_REST, 'logistic', -0.5),
+])
+def test_exits_possible_matches_decide(weights, link, intercept):
+    scorer = hard_scorer(dict(weights), link, intercept)
+    first_proba = np.random.default_rng(0).uniform(size=(20000, len(scorer.first)))
+    assert scorer.exits_possible() == scorer.decide(first_proba)[0].any()
+
+
+def test_default_weights_cannot_exit_the_hard_plan():
+    assert not hard_scorer(dict(ENSEMBLE_WEIGHTS)).exits_possible()
+
+
+def test_full_plan_runs_every_model_first():
+    ensemble = CompiledEnsemble(dict.fromkeys(ENSEMBLE_WEIGHTS), Blend(weights=dict(ENSEMBLE_WEIGHTS)))
+    scorer = CascadeScorer(ensemble, CascadePlan.full(ensemble.model_names), BOUNDARIES)
+    assert scorer.exits_possible()
+    assert scorer.rest.size == 0
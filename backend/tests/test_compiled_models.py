@@ -0,0 +1,114 @@
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import HistGradientBoostingClassifier
+
+from compiled_models import CompiledForest, NumpyMLP, NumpySVM, dump_arrays
+from model_fitting import fit_gradient_boosting, fit_random_forest
+
+
+def probe_rows(split):
+    """Test rows plus rows sitting exactly on the training values, where splits are decided"""
+    return np.vstack([split['test'], split['train']])
+
+
+@pytest.fixture(scope='module', params=['random_forest', 'gradient_boosting', 'hist_gradient_boosting'])
+def forest(request, heart_split):
+    X, y = heart_split['train'], heart_split['y_train']
+    if request.param == 'random_forest':
+        return fit_random_forest(X, y)
+    if request.param == 'gradient_boosting':
+        return fit_gradient_boosting(X, y)
+    return HistGradientBoostingClassifier(max_iter=50, random_state=42).fit(X, y)
+
+
+def test_matches_sklearn_predict_proba(forest, heart_split):
+    X = probe_rows(heart_split)
+    compiled = CompiledForest.from_sklearn(forest)
+    expected = forest.predict_proba(X)
+    np.testing.assert_array_equal(compiled.predict_positive(X), expected[:, 1])
+    # sklearn normalises the negative column separately; 1 - p can differ in the last bit
+    np.testing.assert_allclose(compiled.predict_proba(X), expected, rtol=0, atol=1e-15)
+    np.testing.assert_array_equal(compiled.predict(X), forest.predict(X))
+
+
+def test_arrays_round_trip(forest, heart_split):
+    X = probe_rows(heart_split)
+    compiled = CompiledForest.from_sklearn(forest)
+    restored = CompiledForest.from_arrays(compiled.to_arrays())
+    np.testing.assert_array_equal(restored.predict_positive(X), compiled.predict_positive(X))
+
+
+@pytest.mark.parametrize('dtype', [np.float64, np.float32])
+def test_folded_scaler_takes_raw_features(forest, heart_split, dtype):
+    scaler = heart_split['scaler']
+    raw = np.vstack([heart_split['raw_test'], heart_split['raw_train']])
+    folded = CompiledForest.from_sklearn(forest).fold_scaler(scaler.mean_, scaler.scale_, dtype=dtype)
+    expected = forest.predict_proba(scaler.transform(raw.astype(dtype).astype(np.float64)))[:, 1]
+    np.testing.assert_array_equal(folded.predict_positive(raw.astype(dtype)), expected)
+
+
+@pytest.fixture(scope='module')
+def svm(heart_split):
+    from model_fitting import fit_svm
+
+    return fit_svm(heart_split['train'], heart_split['y_train'])
+
+
+def test_svm_matches_libsvm_platt_scaling(svm, heart_split):
+    X = probe_rows(heart_split)
+    expected = svm.predict_proba(X)
+    np.testing.assert_allclose(NumpySVM.from_sklearn(svm).predict_proba(X), expected, rtol=0, atol=1e-13)
+    # float32 kernel: ~4e-7 measured
+    np.testing.assert_allclose(NumpySVM.from_sklearn(svm, float32=True).predict_proba(X), expected,
+                               rtol=0, atol=2e-6)
+    restored = NumpySVM.from_arrays(NumpySVM.from_sklearn(svm).to_arrays())
+    np.testing.assert_allclose(restored.predict_proba(X), expected, rtol=0, atol=1e-13)
+
+
+def test_svm_folded_scaler_takes_raw_features(svm, heart_split):
+    scaler = heart_split['scaler']
+    raw = np.vstack([heart_split['raw_test'], heart_split['raw_train']])
+    folded = NumpySVM.from_sklearn(svm).fold_scaler(scaler.mean_, scaler.scale_)
+    np.testing.assert_allclose(folded.predict_proba(raw), svm.predict_proba(scaler.transform(raw)),
+                               rtol=0, atol=1e-13)
+
+
+@pytest.fixture(scope='module')
+def keras_network(heart_split, tmp_path_factory):
+    """A briefly trained network, reloaded from the .h5 file the trainer writes"""
+    pytest.importorskip('tensorflow')
+    from tensorflow import keras
+
+    from model_fitting import fit_neural_network
+
+    model = fit_neural_network(heart_split['train'], heart_split['y_train'], epochs=5)
+    path = tmp_path_factory.mktemp('nn') / 'nn_model.h5'
+    model.save(path)
+    return keras.models.load_model(path)
+
+
+def test_mlp_matches_keras(keras_network, heart_split, tmp_path):
+    X = probe_rows(heart_split)
+    mlp = NumpyMLP.from_keras(keras_network)
+    expected = keras_network.predict(X.astype(np.float32), verbose=0).reshape(-1)
+    # both compute in float32; only the summation order differs (~6e-8 measured)
+    assert mlp.max_abs_error(keras_network, X) < 1e-6
+    mlp.save(tmp_path / 'nn_weights.npz')
+    np.testing.assert_array_equal(NumpyMLP.load(tmp_path / 'nn_weights.npz').predict_positive(X),
+                                  mlp.predict_positive(X))
+    scaler = heart_split['scaler']
+    raw = np.vstack([heart_split['raw_test'], heart_split['raw_train']])
+    folded = mlp.fold_scaler(scaler.mean_, scaler.scale_)
+    np.testing.assert_allclose(folded.predict_positive(raw), expected, rtol=0, atol=1e-6)
+
+
+def test_dump_arrays_leaves_mapped_exports_intact(tmp_path):
+    path = tmp_path / 'rf_trees.joblib'
+    dump_arrays({'value': np.arange(100_000, dtype=np.float64)}, path)
+    mapped = joblib.load(path, mmap_mode='r')
+    # a shorter file rewritten in place would SIGBUS on the next read
+    dump_arrays({'value': np.zeros(10)}, path)
+    np.testing.assert_array_equal(mapped['value'], np.arange(100_000, dtype=np.float64))
+    np.testing.assert_array_equal(joblib.load(path)['value'], np.zeros(10))
+    assert [p.name for p in tmp_path.iterdir()] == ['rf_trees.joblib']
@@ -0,0 +1,93 @@
+from itertools import combinations
+from math import factorial
+
+import numpy as np
+import pytest
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+
+from compiled_models import CompiledForest
+from explain import EnsembleExplainer, TreeShap
+
+N_FEATURES = 5
+
+
+def tree_expectation(forest, node, x, known):
+    """Path-dependent E[tree(x) | x_known]: unknown features follow both children, weighted by cover"""
+    left, right = int(forest.left[node]), int(forest.right[node])
+    if left == node:
+        return forest.value[node]
+    feature = int(forest.feature[node])
+    if feature in known:
+        return tree_expectation(forest, left if x[feature] <= forest.threshold[node] else right, x, known)
+    return (forest.cover[left] * tree_expectation(forest, left, x, known)
+            + forest.cover[right] * tree_expectation(forest, right, x, known)) / forest.cover[node]
+
+
+def forest_expectation(forest, x, known):
+    total = sum(tree_expectation(forest, int(root), x, known) for root in forest.roots)
+    return total / forest.n_trees if forest.kind == 'random_forest' else forest.init + total
+
+
+def brute_force_shapley(forest, x):
+    features = range(forest.n_features)
+    phi = np.zeros(forest.n_features)
+    for i in features:
+        others = [f for f in features if f != i]
+        for size in range(len(others) + 1):
+            weight = factorial(size) * factorial(forest.n_features - size - 1) / factorial(forest.n_features)
+            for subset in combinations(others, size):
+                known = set(subset)
+                phi[i] += weight * (forest_expectation(forest, x, known | {i}) - forest_expectation(forest, x, known))
+    return phi
+
+
+@pytest.fixture(scope='module')
+def data():
+    rng = np.random.default_rng(0)
+    # float32-representable, as the forests compare inputs in float32
+    X = rng.normal(size=(300, N_FEATURES)).astype(np.float32).astype(np.float64)
+    y = (X[:, 0] + X[:, 1] * X[:, 2] - 0.5 * X[:, 3] + rng.normal(scale=0.5, size=300) > 0).astype(int)
+    return X, y
+
+
+@pytest.mark.parametrize('estimator', [
+    RandomForestClassifier(n_estimators=5, max_depth=4, random_state=0),
+    GradientBoostingClassifier(n_estimators=5, max_depth=3, random_state=0),
+], ids=['random_forest', 'gradient_boosting'])
+def test_tree_shap_matches_brute_force(estimator, data):
+    X, y = data
+    forest = CompiledForest.from_sklearn(estimator.fit(X, y))
+    shap = TreeShap(forest)
+    rows = X[:8]
+    phi = shap.explain(rows)
+    for row, row_phi in zip(rows, phi):
+        np.testing.assert_allclose(row_phi, brute_force_shapley(forest, row), rtol=0, atol=1e-12)
+    assert shap.expected_value == pytest.approx(forest_expectation(forest, rows[0], set()), abs=1e-12)
+    raw = np.array([forest_expectation(forest, row, set(range(N_FEATURES))) for row in rows])
+    np.testing.assert_allclose(shap.expected_value + phi.sum(axis=1), raw, rtol=0, atol=1e-12)
+
+
+@pytest.fixture(scope='module')
+def bundle():
+    import main
+
+    return main.build_bundle(main.MODELS_DIR, 'test')
+
+
+@pytest.mark.parametrize('link', ['identity', 'logistic'])
+def test_contributions_add_up_to_the_ensemble_probability(bundle, heart_split, link):
+    import main
+    from ensemble import Blend
+
+    blend = Blend(weights=dict(main.ENSEMBLE_WEIGHTS), link=link, intercept=0.0 if link == 'identity' else -2.0)
+    ensemble = main.build_ensemble(bundle.models, blend, bundle.scaler, bundle.explainer.background)
+    explainer = EnsembleExplainer(ensemble, bundle.explainer.background, main.FEATURE_NAMES, budget_seconds=60)
+    X = heart_split['raw_test'][:32]
+    scored = ensemble.predict(X)
+    base, contributions = explainer.contributions(X, scored.per_model)
+    np.testing.assert_allclose(base + contributions.sum(axis=1), scored.ensemble, rtol=0, atol=1e-12)
+
+    # the response rounds each of the 14 numbers to 4 decimals
+    for explanation, p in zip(explainer.explain(X, scored.per_model), scored.ensemble):
+        total = explanation['base_value'] + sum(explanation['contributions'].values())
+        assert abs(total - p) <= 14 * 5e-5 + 1e-12
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+import main
+from cascade import risk_bands
+from ensemble import CompiledEnsemble
+
+
+@pytest.fixture(scope='module')
+def bundle():
+    return main.build_bundle(main.MODELS_DIR, 'test')
+
+
+@pytest.fixture
+def float32_default(monkeypatch):
+    monkeypatch.setattr(main, 'FEATURE_DTYPE', 'float32')
+
+
+def build(bundle):
+    return main.build_ensemble(bundle.models, bundle.ensemble.blend, bundle.scaler, bundle.explainer.background)
+
+
+def probe_scores(bundle):
+    probe = main.float32_probe(bundle.explainer.background)
+    scores = {}
+    for dtype in (np.float32, np.float64):
+        ensemble = CompiledEnsemble(bundle.models, bundle.ensemble.blend, bundle.scaler, input_dtype=dtype)
+        scores[dtype] = ensemble.predict(probe).ensemble.copy()
+    return scores[np.float32], scores[np.float64]
+
+
+def test_float32_stays_within_tolerance_on_heart_csv(bundle, heart_split, float32_default):
+    ensemble = build(bundle)
+    assert ensemble.input_dtype == np.float32
+    exact = CompiledEnsemble(bundle.models, bundle.ensemble.blend, bundle.scaler, input_dtype=np.float64)
+    X = np.vstack([heart_split['raw_train'], heart_split['raw_test']])
+    p32, p64 = ensemble.predict(X).ensemble, exact.predict(X).ensemble
+    assert np.abs(p32 - p64).max() <= main.FLOAT32_TOLERANCE
+    np.testing.assert_array_equal(risk_bands(p32, main.RISK_BOUNDARIES), risk_bands(p64, main.RISK_BOUNDARIES))
+
+
+def test_tolerance_breach_falls_back_to_float64(bundle, float32_default, monkeypatch):
+    p32, p64 = probe_scores(bundle)
+    deviation = np.abs(p32 - p64).max()
+    assert deviation > 0
+    monkeypatch.setattr(main, 'FLOAT32_TOLERANCE', deviation / 2)
+    assert build(bundle).input_dtype == np.float64
+
+
+def test_risk_level_change_falls_back_to_float64(bundle, float32_default, monkeypatch):
+    p32, p64 = probe_scores(bundle)
+    row = int(np.argmax(np.abs(p32 - p64)))
+    # a band boundary between the two scores of one probe patient; the tolerance alone would pass
+    boundary = (p32[row] + p64[row]) / 2
+    monkeypatch.setattr(main, 'RISK_BOUNDARIES', (boundary, 0.999))
+    monkeypatch.setattr(main, 'FLOAT32_TOLERANCE', 1.0)
+    assert build(bundle).input_dtype == np.float64
+
+
+def test_float64_setting_skips_the_probe(bundle, monkeypatch):
+    monkeypatch.setattr(main, 'FEATURE_DTYPE', 'float64')
+    monkeypatch.setattr(main, 'float32_probe', None)
+    assert build(bundle).input_dtype == np.float64
@@ -0,0 +1,43 @@
+import shutil
+
+import joblib
+import numpy as np
+import pytest
+
+pytest.importorskip('tensorflow')
+
+import main
+from export_numpy_artifacts import export_artifacts
+from model_fitting import fit_random_forest, fit_svm
+from registry import ModelRegistry
+
+
+@pytest.fixture
+def models_dir(tmp_path, monkeypatch):
+    """A copy of the shipped models with their NumPy exports, served memory-mapped"""
+    monkeypatch.setattr(main, 'MMAP_MODELS', True)
+    directory = tmp_path / 'models'
+    shutil.copytree(main.MODELS_DIR, directory, ignore=shutil.ignore_patterns('*.png', '.*'))
+    export_artifacts(directory)
+    return directory
+
+
+def test_reexport_does_not_touch_the_live_version(models_dir, heart_split):
+    registry = ModelRegistry(models_dir, build=main.build_bundle)
+    old = registry.load()
+    X = np.vstack([heart_split['raw_test'], heart_split['raw_train']])
+    before = old.ensemble.predict(X)
+    expected_per_model, expected = before.per_model.copy(), before.ensemble.copy()
+
+    # retrain into the served directory: smaller models, so in-place rewrites would truncate mapped files
+    joblib.dump(fit_random_forest(heart_split['train'], heart_split['y_train'], n_estimators=5),
+                models_dir / 'rf_model.pkl')
+    joblib.dump(fit_svm(heart_split['train'][:60], heart_split['y_train'][:60]), models_dir / 'svm_model.pkl')
+    export_artifacts(models_dir)
+    new = registry.load(force=False)
+
+    assert new is not old and new.version != old.version
+    after = old.ensemble.predict(X)
+    np.testing.assert_array_equal(after.per_model, expected_per_model)
+    np.testing.assert_array_equal(after.ensemble, expected)
+    assert not np.array_equal(new.ensemble.predict(X).per_model, expected_per_model)
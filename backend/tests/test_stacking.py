@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+import main
+from config import ENSEMBLE_WEIGHTS
+from ensemble import Blend, CompiledEnsemble
+from stacking import fit_blend
+
+NAMES = ['svm', 'random_forest', 'gradient_boosting', 'neural_network']
+
+
+@pytest.fixture(scope='module')
+def oof():
+    """Out-of-fold-like probabilities: four noisy views of the label, of different quality"""
+    rng = np.random.default_rng(0)
+    y = rng.integers(0, 2, 500)
+    noise = rng.normal(size=(500, len(NAMES))) * np.array([0.3, 0.5, 0.8, 1.5])
+    return 1 / (1 + np.exp(-(2 * y[:, None] - 1 + noise))), y
+
+
+def test_nnls_weights_are_a_weighted_average(oof):
+    probabilities, y = oof
+    blend = fit_blend(probabilities, y, NAMES, method='nnls')
+    weights = np.array([blend.weights[name] for name in NAMES])
+    assert blend.link == 'identity' and blend.intercept == 0.0
+    assert (weights >= 0).all()
+    assert weights.sum() == pytest.approx(1.0, abs=1e-12)
+    # the least noisy model gets the most weight
+    assert weights.argmax() == 0
+
+
+def test_logistic_blend_round_trips_through_ensemble_json(oof, tmp_path, heart_split):
+    probabilities, y = oof
+    blend = fit_blend(probabilities, y, NAMES, method='logistic', folds=5)
+    path = tmp_path / 'ensemble.json'
+    blend.save(path)
+    loaded = main.load_blend(path)
+    assert loaded == blend
+    np.testing.assert_array_equal(loaded.combine(probabilities, NAMES), blend.combine(probabilities, NAMES))
+
+    # the API scores the shipped models with the reloaded blend exactly as with the fitted one
+    bundle = main.build_bundle(main.MODELS_DIR, 'test')
+    X = heart_split['raw_test']
+    fitted = CompiledEnsemble(bundle.models, blend, bundle.scaler).predict(X)
+    reloaded = CompiledEnsemble(bundle.models, loaded, bundle.scaler).predict(X)
+    np.testing.assert_array_equal(reloaded.ensemble, fitted.ensemble)
+    assert ((0 < reloaded.ensemble) & (reloaded.ensemble < 1)).all()
+
+
+@pytest.mark.parametrize('contents', [None, '{"weights": '], ids=['missing', 'corrupt'])
+def test_unusable_ensemble_json_falls_back_to_the_fixed_weights(tmp_path, contents):
+    path = tmp_path / 'ensemble.json'
+    if contents is not None:
+        path.write_text(contents)
+    blend = main.load_blend(path)
+    assert blend == Blend(weights=dict(ENSEMBLE_WEIGHTS), info={'method': 'fixed'})
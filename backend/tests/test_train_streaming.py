@@ -0,0 +1,42 @@
+import logging
+
+import numpy as np
+import pytest
+
+pytest.importorskip('tensorflow')
+
+from compiled_models import NumpySVM
+from train_streaming import StreamingCVDTrainer
+
+
+@pytest.fixture(scope='module')
+def trainer(heart_csv):
+    trainer = StreamingCVDTrainer(str(heart_csv), chunk_rows=100)
+    trainer.load_data()
+    return trainer
+
+
+def test_svm_probabilities_are_calibrated(trainer):
+    from sklearn.metrics import brier_score_loss, roc_auc_score
+
+    svm = trainer._fit_svm()
+    proba = svm.predict_proba(trainer.X_test)[:, 1]
+    assert roc_auc_score(trainer.y_test, proba) > 0.8
+    assert np.mean((proba > 0.5) == trainer.y_test) > 0.7
+    # a constant base-rate prediction scores ~0.25 here
+    assert brier_score_loss(trainer.y_test, proba) < 0.2
+    assert abs(proba.mean() - trainer.y_test.mean()) < 0.15
+
+    exported = NumpySVM.from_sklearn(svm)
+    np.testing.assert_allclose(exported.predict_proba(trainer.X_test), svm.predict_proba(trainer.X_test),
+                               rtol=0, atol=1e-12)
+
+
+def test_train_parallel_falls_back_to_sequential(trainer, monkeypatch, caplog):
+    trained = []
+    for name in ('svm', 'random_forest', 'gradient_boosting', 'neural_network'):
+        monkeypatch.setattr(trainer, f'train_{name}', lambda name=name: trained.append(name))
+    with caplog.at_level(logging.WARNING, logger='train_streaming'):
+        trainer.train_parallel()
+    assert trained == ['svm', 'random_forest', 'gradient_boosting', 'neural_network']
+    assert 'sequentially' in caplog.text
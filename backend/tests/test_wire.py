@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from config import FEATURE_NAMES
+from wire import WireFormatError, decode_packed, encode_packed_features
+
+
+@pytest.fixture
+def features():
+    rng = np.random.default_rng(0)
+    return np.round(rng.uniform(0, 300, size=(64, len(FEATURE_NAMES))), 1)
+
+
+def test_float64_bodies_decode_without_a_copy(features):
+    body = encode_packed_features(features, dtype=np.float64)
+    X = decode_packed(body)
+    np.testing.assert_array_equal(X, features)
+    assert not X.flags.writeable
+
+
+def test_float32_bodies_widen_exactly(features):
+    X = decode_packed(encode_packed_features(features, dtype=np.float32))
+    assert X.dtype == np.float64
+    np.testing.assert_array_equal(X, features.astype(np.float32).astype(np.float64))
+
+
+def test_truncated_body_is_rejected(features):
+    with pytest.raises(WireFormatError):
+        decode_packed(encode_packed_features(features)[:-4])
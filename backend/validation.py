@@ -0,0 +1,97 @@
+"""Columnar input validation against config.FEATURE_SCHEMA"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Mapping, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from config import FEATURE_NAMES, FEATURE_SCHEMA
+
+
+@dataclass
+class ColumnarValidation:
+    """Result of validating a block of rows column by column.
+
+    ``features`` is the (n, 13) float matrix in model column order (invalid
+    rows are left as-is, including NaN), ``valid`` the per-row boolean mask
+    and ``errors`` one ``{'row': i, 'errors': [...]}`` entry per invalid row.
+    """
+    features: np.ndarray
+    valid: np.ndarray
+    errors: List[Dict] = field(default_factory=list)
+
+    @property
+    def all_valid(self) -> bool:
+        return bool(self.valid.all())
+
+
+def validate_columns(data: Union[pd.DataFrame, Mapping[str, object]]) -> ColumnarValidation:
+    """Apply the FEATURE_SCHEMA bounds to whole columns at once.
+
+    Accepts a DataFrame or a mapping of column name to array-like. Extra
+    columns are ignored. Each check is one vectorized comparison per column;
+    error messages are only built for the rows that actually failed.
+    """
+    if not isinstance(data, pd.DataFrame):
+        data = pd.DataFrame({k: np.asarray(v).reshape(-1) for k, v in data.items()})
+    n = len(data)
+    features = np.empty((n, len(FEATURE_NAMES)), dtype=float)
+    failures = []  # (mask, message) per failed check
+
+    for j, name in enumerate(FEATURE_NAMES):
+        if name not in data.columns:
+            features[:, j] = np.nan
+            failures.append((np.ones(n, dtype=bool), f"{name}: field required"))
+            continue
+        features[:, j] = pd.to_numeric(data[name], errors='coerce').to_numpy(dtype=float)
+        failures += _column_failures(name, features[:, j])
+    return _collect(features, failures)
+
+
+def validate_matrix(features: np.ndarray) -> ColumnarValidation:
+    """``validate_columns`` for an (n, 13) matrix already in FEATURE_NAMES order.
+
+    ``features`` is checked in place and returned as is (any float dtype,
+    read-only views included), so binary request bodies are never copied.
+    """
+    failures = []
+    for j, name in enumerate(FEATURE_NAMES):
+        failures += _column_failures(name, features[:, j])
+    return _collect(features, failures)
+
+
+def _column_failures(name: str, col: np.ndarray) -> List[Tuple[np.ndarray, str]]:
+    spec = FEATURE_SCHEMA[name]
+    bad_number = ~np.isfinite(col)
+    failures = [(bad_number, f"{name}: must be a finite number")]
+    with np.errstate(invalid='ignore'):
+        out_of_range = ~bad_number & ((col < spec['ge']) | (col > spec['le']))
+        failures.append((out_of_range, f"{name}: must be between {spec['ge']} and {spec['le']}"))
+        if spec['type'] is int:
+            failures.append((~bad_number & (col != np.floor(col)), f"{name}: must be an integer"))
+    return failures
+
+
+def _collect(features: np.ndarray, failures: List[Tuple[np.ndarray, str]]) -> ColumnarValidation:
+    valid = np.ones(features.shape[0], dtype=bool)
+    for mask, _ in failures:
+        valid &= ~mask
+
+    errors = []
+    invalid_rows = np.flatnonzero(~valid)
+    if invalid_rows.size:
+        per_row: Dict[int, List[str]] = {int(i): [] for i in invalid_rows}
+        for mask, message in failures:
+            for i in np.flatnonzero(mask):
+                per_row[int(i)].append(message)
+        errors = [{'row': i, 'errors': msgs} for i, msgs in per_row.items()]
+
+    return ColumnarValidation(features=features, valid=valid, errors=errors)
+
+
+def validate_record(record: Mapping[str, object]) -> List[str]:
+    """Validate a single patient dict; returns human-readable error messages."""
+    result = validate_columns(pd.DataFrame({name: [record[name]] for name in FEATURE_NAMES if name in record},
+                                           index=[0]))
+    return result.errors[0]['errors'] if result.errors else []
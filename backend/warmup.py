@@ -0,0 +1,43 @@
+"""Warm-up pass that runs synthetic batches through a freshly loaded ensemble"""
+
+import time
+from typing import Dict, Sequence
+
+import numpy as np
+
+from config import FEATURE_SCHEMA
+
+
+def synthetic_features(n: int, seed: int = 0) -> np.ndarray:
+    """(n, 13) raw feature matrix drawn uniformly inside FEATURE_SCHEMA's bounds."""
+    rng = np.random.default_rng(seed)
+    columns = []
+    for spec in FEATURE_SCHEMA.values():
+        if spec['type'] is int:
+            columns.append(rng.integers(spec['ge'], spec['le'], endpoint=True, size=n).astype(float))
+        else:
+            columns.append(rng.uniform(spec['ge'], spec['le'], size=n))
+    return np.column_stack(columns) if n else np.empty((0, len(FEATURE_SCHEMA)))
+
+
+def warm_up(ensemble, batch_sizes: Sequence[int], rounds: int = 2) -> Dict:
+    """Score every batch size ``rounds`` times; returns per-size timings in ms.
+
+    The first round pays for lazy initialisation (TensorFlow tracing when
+    the Keras model is served, BLAS thread pools, first-touch page faults on
+    memory-mapped arrays); later rounds show the steady state the first real
+    request will see.
+    """
+    started = time.perf_counter()
+    timings = {}
+    for size in batch_sizes:
+        X = synthetic_features(size, seed=size)
+        out = ensemble.allocate(size)
+        per_round = []
+        for _ in range(max(rounds, 1)):
+            t0 = time.perf_counter()
+            ensemble.predict(X, out=out)
+            per_round.append((time.perf_counter() - t0) * 1000.0)
+        timings[str(size)] = {"first_ms": round(per_round[0], 3), "last_ms": round(per_round[-1], 3)}
+    return {"batch_sizes": list(batch_sizes), "rounds": max(rounds, 1), "timings": timings,
+            "total_seconds": round(time.perf_counter() - started, 3)}